@@ -4,41 +4,65 @@ Email Automation Tool - Land Jobs, Marketing & Cold Emails
 Multi-user platform for automated email campaigns to help you land jobs, grow your network, and automate cold emails
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response
+from flask.wrappers import Request
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, func, or_, tuple_
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
 import json
 import csv
-from datetime import datetime
-from typing import Dict, List
+import base64
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import threading
 import time
 import sys
 import logging
 
-# Configure logging to stdout so it appears in Railway logs
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from log_config import configure_logging
+from migrations import migrate, pending_versions
+from template_engine import validate_template, TemplateError
+from progress_events import ChangeFeed
+from metrics import (CAMPAIGNS, CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, authorized as metrics_authorized,
+                     observe_stage, time_stage)
+
 logger = logging.getLogger(__name__)
 
-# Import the email automation class
-from email_automation import EmailAutomation
+# Recipient list uploads are streamed to disk in chunks of this size
+LIST_UPLOAD_CHUNK = 1024 * 1024
+
+# Campaigns in these states will still send
+UNFINISHED_CAMPAIGN_STATUSES = ('pending', 'running', 'paused')
+
+# Sending limits for users who have not changed them in their settings
+DEFAULT_MAX_EMAILS_PER_DAY = 50
+DEFAULT_DELAY_BETWEEN_EMAILS = 5  # seconds
+
+
+class AppRequest(Request):
+    """Request whose body limit is raised for recipient list uploads (they go straight to disk)"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'recipient_lists' and self.method == 'POST':
+            return app.config['MAX_LIST_UPLOAD_LENGTH']
+        return super().max_content_length
+
 
 app = Flask(__name__)
+app.request_class = AppRequest
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 # Use DATABASE_URL if provided (for production), otherwise SQLite
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
 database_url = os.environ.get('DATABASE_URL')
 if not database_url:
     # For Railway, use PostgreSQL if available, otherwise fallback to SQLite with proper path
-    database_url = 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'email_automation.db')
+    database_url = 'sqlite:///' + os.path.join(INSTANCE_DIR, 'email_automation.db')
 else:
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
@@ -46,11 +70,8 @@ app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'user_templates'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs('user_data', exist_ok=True)
-os.makedirs('instance', exist_ok=True)  # For SQLite database
+app.config['LIST_FOLDER'] = 'user_lists'
+app.config['MAX_LIST_UPLOAD_LENGTH'] = int(os.environ.get('MAX_LIST_UPLOAD_MB', 500)) * 1024 * 1024
 
 db = SQLAlchemy(app)
 login_manager = LoginManager()
@@ -75,9 +96,29 @@ class User(UserMixin, db.Model):
     email_provider = db.Column(db.String(20), default='gmail')  # 'gmail' or 'sendgrid'
     sendgrid_api_key = db.Column(db.String(200), nullable=True)
     
+    # Sending limits for the user's campaigns (enforced per sender account, see rate_limiter.py)
+    max_emails_per_day = db.Column(db.Integer, default=DEFAULT_MAX_EMAILS_PER_DAY)  # 0 = no daily cap
+    delay_between_emails = db.Column(db.Integer, default=DEFAULT_DELAY_BETWEEN_EMAILS)  # Seconds between sends
+    
     # Relationships
     templates = db.relationship('EmailTemplate', backref='user', lazy=True, cascade='all, delete-orphan')
     campaigns = db.relationship('Campaign', backref='user', lazy=True, cascade='all, delete-orphan')
+    sender_identities = db.relationship('SenderIdentity', backref='user', lazy=True, cascade='all, delete-orphan')
+
+class SenderIdentity(db.Model):
+    """Extra SMTP accounts a user's campaigns rotate across, next to the one in their settings"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    smtp_password = db.Column(db.String(255), nullable=False)  # App password (encrypted in production)
+    smtp_server = db.Column(db.String(100), default='smtp.gmail.com')
+    smtp_port = db.Column(db.Integer, default=587)
+    sender_name = db.Column(db.String(100), nullable=True)
+    daily_limit = db.Column(db.Integer, default=0)  # 0 = the campaign default
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'email', name='uq_sender_identity_user_email'),)
 
 class EmailTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -87,23 +128,137 @@ class EmailTemplate(db.Model):
     subject_template = db.Column(db.String(200), nullable=False)
     is_default = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_email_template_user_created', 'user_id', 'created_at'),)
 
 class Campaign(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
-    email_list_type = db.Column(db.String(50), nullable=False)  # 'yc_startups', 'business_emails', 'gr'
+    email_list_type = db.Column(db.String(50), nullable=False)  # 'yc_startups', 'business_emails', 'gr', 'uploaded'
+    recipient_list_id = db.Column(db.Integer, db.ForeignKey('recipient_list.id'), nullable=True)  # For 'uploaded'
     template_id = db.Column(db.Integer, db.ForeignKey('email_template.id'), nullable=True)
     custom_template_content = db.Column(db.Text, nullable=True)  # For directly written templates
     custom_subject_template = db.Column(db.String(200), nullable=True)
     email_limit = db.Column(db.Integer, default=0)  # 0 means no limit
-    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    status = db.Column(db.String(20), default='pending')  # pending, running, paused, completed, failed
     total_emails = db.Column(db.Integer, default=0)
     sent_emails = db.Column(db.Integer, default=0)
     failed_emails = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
+    # Checkpoint for resuming after a worker restart
+    checkpoint_offset = db.Column(db.Integer, default=0)  # Companies before this offset are done
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Refreshed while a worker is running it
+    lease_owner = db.Column(db.String(100), nullable=True)  # Worker that leased the campaign
+    resume_at = db.Column(db.DateTime, nullable=True)  # A 'paused' campaign (sending limit reached) resumes after this
+    error = db.Column(db.String(500), nullable=True)  # Why a 'failed' campaign stopped, shown to the user
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Drives live updates
+    
+    deliveries = db.relationship('CampaignDelivery', backref='campaign', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (db.Index('ix_campaign_user_created', 'user_id', 'created_at'),)
+
+class RecipientList(db.Model):
+    """A recipient CSV uploaded by a user; a worker parses it into the recipient cache"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='uploaded')  # uploaded, parsing, ready, failed
+    size_bytes = db.Column(db.BigInteger, default=0)
+    parsed_bytes = db.Column(db.BigInteger, default=0)
+    valid_rows = db.Column(db.Integer, default=0)  # Rows a campaign can send to
+    skipped_rows = db.Column(db.Integer, default=0)  # Inactive, or missing an email or company name
+    error = db.Column(db.String(500), nullable=True)
+    lease_owner = db.Column(db.String(100), nullable=True)  # Worker parsing the list
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_recipient_list_user_created', 'user_id', 'created_at'),)
+
+class CampaignDelivery(db.Model):
+    """Recipients a campaign has already delivered to (its checkpointed sent set)"""
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
+    email = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('campaign_id', 'email', name='uq_campaign_delivery_email'),)
+
+def check_templates(*sources) -> str:
+    """Return an error message if any template uses unknown placeholders, else an empty string"""
+    try:
+        for source in sources:
+            if source:
+                validate_template(source)
+    except TemplateError as e:
+        return str(e)
+    return ''
+
+# List endpoints return one page at a time, newest first
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+TEMPLATE_LIST_FIELDS = ('id', 'name', 'subject_template', 'template_content', 'is_default', 'created_at')
+CAMPAIGN_LIST_FIELDS = ('id', 'name', 'email_list_type', 'recipient_list_id', 'status', 'total_emails',
+                        'sent_emails', 'failed_emails', 'created_at', 'resume_at', 'error')
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a malformed cursor"""
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def requested_fields(allowed: Tuple[str, ...]) -> List[str]:
+    """Fields named in ?fields=a,b (all allowed fields if omitted). Raises ValueError for unknown ones."""
+    param = request.args.get('fields', '').strip()
+    if not param:
+        return list(allowed)
+    fields = [field.strip() for field in param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return fields
+
+def paginate_user_rows(model, allowed_fields: Tuple[str, ...]) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of the current user's rows, newest first, using the (user_id, created_at) index
+
+    Reads ?limit=, ?cursor= and ?fields= from the request. Only the selected columns are loaded.
+
+    Returns:
+        tuple: (rows as dicts, cursor for the next page or None on the last page)
+
+    Raises:
+        ValueError: for a bad limit, cursor or field name
+    """
+    fields = requested_fields(allowed_fields)
+    limit = min(max(int(request.args.get('limit', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+
+    query = model.query.filter(model.user_id == current_user.id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    columns = list(dict.fromkeys(fields + ['id', 'created_at']))  # id and created_at build the next cursor
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).with_entities(
+        *[getattr(model, column) for column in columns]
+    ).limit(limit + 1).all()
+
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    items = []
+    for row in rows[:limit]:
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            item[field] = value.isoformat() if isinstance(value, datetime) else value
+        items.append(item)
+    return items, next_cursor
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -200,24 +355,24 @@ def logout():
 @login_required
 def dashboard():
     campaigns = Campaign.query.filter_by(user_id=current_user.id).order_by(Campaign.created_at.desc()).limit(10).all()
-    templates = EmailTemplate.query.filter_by(user_id=current_user.id).all()
+    templates = EmailTemplate.query.filter_by(user_id=current_user.id).options(
+        db.defer(EmailTemplate.template_content)
+    ).order_by(EmailTemplate.created_at.desc()).all()
     return render_template('dashboard.html', campaigns=campaigns, templates=templates)
 
 @app.route('/api/templates', methods=['GET', 'POST'])
 @login_required
 def templates():
     if request.method == 'GET':
-        templates = EmailTemplate.query.filter_by(user_id=current_user.id).all()
+        # Pass ?fields=id,name,... to leave out template_content in list views
+        try:
+            templates, next_cursor = paginate_user_rows(EmailTemplate, TEMPLATE_LIST_FIELDS)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'Invalid request: {e}'}), 400
         return jsonify({
             'success': True,
-            'templates': [{
-                'id': t.id,
-                'name': t.name,
-                'subject_template': t.subject_template,
-                'template_content': t.template_content,
-                'is_default': t.is_default,
-                'created_at': t.created_at.isoformat()
-            } for t in templates]
+            'templates': templates,
+            'next_cursor': next_cursor
         })
     
     elif request.method == 'POST':
@@ -229,6 +384,10 @@ def templates():
         if not template_content:
             return jsonify({'success': False, 'message': 'Template content is required'}), 400
         
+        error = check_templates(template_content, subject_template)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
         template = EmailTemplate(
             user_id=current_user.id,
             name=name,
@@ -244,7 +403,7 @@ def templates():
             'template_id': template.id
         })
 
-@app.route('/api/templates/<int:template_id>', methods=['PUT', 'DELETE'])
+@app.route('/api/templates/<int:template_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def template_detail(template_id):
     template = EmailTemplate.query.get_or_404(template_id)
@@ -252,8 +411,24 @@ def template_detail(template_id):
     if template.user_id != current_user.id:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
     
-    if request.method == 'PUT':
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'template': {
+                'id': template.id,
+                'name': template.name,
+                'subject_template': template.subject_template,
+                'template_content': template.template_content,
+                'is_default': template.is_default,
+                'created_at': template.created_at.isoformat()
+            }
+        })
+    
+    elif request.method == 'PUT':
         data = request.get_json()
+        error = check_templates(data.get('template_content'), data.get('subject_template'))
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
         template.name = data.get('name', template.name)
         template.template_content = data.get('template_content', template.template_content)
         template.subject_template = data.get('subject_template', template.subject_template)
@@ -293,6 +468,11 @@ def upload_template():
                 subject_template = subject_line
             content = lines[1] if len(lines) > 1 else content
         
+        error = check_templates(content, subject_template)
+        if error:
+            os.remove(filepath)
+            return jsonify({'success': False, 'message': error}), 400
+        
         # Save template to database
         template = EmailTemplate(
             user_id=current_user.id,
@@ -312,11 +492,101 @@ def upload_template():
             'template_id': template.id
         })
 
+def recipient_list_dict(recipient_list: RecipientList) -> Dict:
+    return {
+        'id': recipient_list.id,
+        'name': recipient_list.name,
+        'status': recipient_list.status,
+        'size_bytes': recipient_list.size_bytes or 0,
+        'parsed_bytes': recipient_list.parsed_bytes or 0,
+        'valid_rows': recipient_list.valid_rows or 0,
+        'skipped_rows': recipient_list.skipped_rows or 0,
+        'error': recipient_list.error,
+        'created_at': recipient_list.created_at.isoformat() if recipient_list.created_at else None,
+    }
+
+@app.route('/api/lists', methods=['GET', 'POST'])
+@login_required
+def recipient_lists():
+    """
+    List or upload recipient CSVs. Uploads are streamed to disk (up to MAX_LIST_UPLOAD_MB) as a raw body
+    with ?filename=... or as a multipart 'file' field; a worker then parses them in the background.
+    """
+    if request.method == 'GET':
+        lists = RecipientList.query.filter_by(user_id=current_user.id).order_by(RecipientList.created_at.desc()).all()
+        return jsonify({'success': True, 'lists': [recipient_list_dict(recipient_list) for recipient_list in lists]})
+    
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    filename = secure_filename((upload.filename if upload else request.args.get('filename')) or '')
+    if not filename:
+        return jsonify({'success': False, 'message': 'No file provided'}), 400
+    if not filename.lower().endswith('.csv'):
+        return jsonify({'success': False, 'message': 'Recipient lists must be CSV files'}), 400
+    
+    path = os.path.join(app.config['LIST_FOLDER'], f"{current_user.id}_{uuid.uuid4().hex[:12]}_{filename}")
+    try:
+        if upload:
+            upload.save(path, buffer_size=LIST_UPLOAD_CHUNK)
+        else:
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(request.stream, out, LIST_UPLOAD_CHUNK)
+    except Exception:
+        # Client went away mid-upload (or the disk is full): don't keep a truncated list
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    
+    size = os.path.getsize(path)
+    if not size:
+        os.remove(path)
+        return jsonify({'success': False, 'message': 'Uploaded file is empty'}), 400
+    
+    recipient_list = RecipientList(user_id=current_user.id, name=filename[:200], path=path,
+                                   status='uploaded', size_bytes=size)
+    db.session.add(recipient_list)
+    db.session.commit()
+    logger.info(f"📥 Recipient list {recipient_list.id} uploaded by user {current_user.id}: {filename} ({size} bytes)")
+    return jsonify({'success': True, 'message': 'List uploaded; parsing will start shortly',
+                    'list': recipient_list_dict(recipient_list)})
+
+@app.route('/api/lists/<int:list_id>', methods=['GET', 'DELETE'])
+@login_required
+def recipient_list_detail(list_id):
+    recipient_list = RecipientList.query.get_or_404(list_id)
+    if recipient_list.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, 'list': recipient_list_dict(recipient_list)})
+    
+    if recipient_list.status == 'parsing':
+        return jsonify({'success': False, 'message': 'List is still being parsed'}), 409
+    in_use = Campaign.query.filter(Campaign.recipient_list_id == list_id,
+                                   Campaign.status.in_(UNFINISHED_CAMPAIGN_STATUSES)).count()
+    if in_use:
+        return jsonify({'success': False, 'message': 'List is used by a campaign that has not finished'}), 409
+    Campaign.query.filter_by(recipient_list_id=list_id).update({'recipient_list_id': None}, synchronize_session=False)
+    db.session.delete(recipient_list)
+    db.session.commit()
+    
+    try:
+        from recipient_cache import DEFAULT_CACHE_PATH, RecipientCache
+        cache = RecipientCache(DEFAULT_CACHE_PATH)
+        try:
+            cache.drop(recipient_list.path)
+        finally:
+            cache.close()
+        if os.path.exists(recipient_list.path):
+            os.remove(recipient_list.path)
+    except Exception as e:
+        logger.warning(f"Could not clean up recipient list file {recipient_list.path}: {e}")
+    return jsonify({'success': True, 'message': 'List deleted'})
+
 @app.route('/api/campaigns', methods=['POST'])
 @login_required
 def create_campaign():
     data = request.get_json()
-    email_list_type = data.get('email_list_type')  # 'yc_startups', 'business_emails', 'gr'
+    email_list_type = data.get('email_list_type')  # 'yc_startups', 'business_emails', 'gr' or 'list:<id>'
     template_id = data.get('template_id')
     custom_template = data.get('custom_template')  # Directly written template
     custom_subject = data.get('custom_subject', 'Partnership Opportunity - {company_name}')
@@ -326,6 +596,17 @@ def create_campaign():
     if not email_list_type:
         return jsonify({'success': False, 'message': 'Email list type is required'}), 400
     
+    # Uploaded list: the campaign may start while it is still being parsed
+    recipient_list = None
+    if email_list_type.startswith('list:'):
+        list_id = email_list_type.split(':', 1)[1]
+        recipient_list = RecipientList.query.get(int(list_id)) if list_id.isdigit() else None
+        if not recipient_list or recipient_list.user_id != current_user.id:
+            return jsonify({'success': False, 'message': 'Recipient list not found'}), 404
+        if recipient_list.status == 'failed':
+            return jsonify({'success': False, 'message': f'Recipient list could not be parsed: {recipient_list.error}'}), 400
+        email_list_type = 'uploaded'
+    
     # Handle custom template (directly written)
     template = None
     custom_template_content = None
@@ -336,6 +617,10 @@ def create_campaign():
         custom_template_content = custom_template.strip()
         custom_subject_template = custom_subject
         
+        error = check_templates(custom_template_content, custom_subject_template)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
         # Optionally save to database
         if save_template:
             template = EmailTemplate(
@@ -361,8 +646,9 @@ def create_campaign():
     # Create campaign
     campaign = Campaign(
         user_id=current_user.id,
-        name=f"Campaign - {email_list_type} - {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        name=f"Campaign - {recipient_list.name[:50] if recipient_list else email_list_type} - {datetime.now().strftime('%Y-%m-%d %H:%M')}",
         email_list_type=email_list_type,
+        recipient_list_id=recipient_list.id if recipient_list else None,
         template_id=template.id if template else None,
         custom_template_content=custom_template_content,
         custom_subject_template=custom_subject_template,
@@ -376,20 +662,12 @@ def create_campaign():
     logger.info(f"   Email list: {email_list_type}, Limit: {email_limit}")
     logger.info(f"   User SMTP: {current_user.smtp_email}, Has password: {bool(current_user.smtp_password)}")
     
-    # Start campaign in background thread
-    try:
-        thread = threading.Thread(target=run_campaign, args=(campaign.id,))
-        thread.daemon = True
-        thread.start()
-        logger.info(f"✅ Background thread started for campaign {campaign.id}")
-    except Exception as e:
-        logger.error(f"❌ Failed to start background thread: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+    # Queued: a worker process (python -m worker) leases and runs it
+    logger.info(f"📥 Campaign {campaign.id} queued for a worker")
     
     return jsonify({
         'success': True,
-        'message': 'Campaign started',
+        'message': 'Campaign queued',
         'campaign_id': campaign.id
     })
 
@@ -407,13 +685,16 @@ def get_campaign(campaign_id):
             'id': campaign.id,
             'name': campaign.name,
             'email_list_type': campaign.email_list_type,
+            'recipient_list_id': campaign.recipient_list_id,
             'status': campaign.status,
             'total_emails': campaign.total_emails,
             'sent_emails': campaign.sent_emails,
             'failed_emails': campaign.failed_emails,
             'created_at': campaign.created_at.isoformat(),
             'started_at': campaign.started_at.isoformat() if campaign.started_at else None,
-            'completed_at': campaign.completed_at.isoformat() if campaign.completed_at else None
+            'completed_at': campaign.completed_at.isoformat() if campaign.completed_at else None,
+            'resume_at': campaign.resume_at.isoformat() if campaign.resume_at else None,
+            'error': campaign.error
         }
     })
 
@@ -462,21 +743,89 @@ def debug_csv_check():
 @app.route('/api/campaigns', methods=['GET'])
 @login_required
 def list_campaigns():
-    campaigns = Campaign.query.filter_by(user_id=current_user.id).order_by(Campaign.created_at.desc()).all()
+    try:
+        campaigns, next_cursor = paginate_user_rows(Campaign, CAMPAIGN_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid request: {e}'}), 400
     return jsonify({
         'success': True,
-        'campaigns': [{
-            'id': c.id,
-            'name': c.name,
-            'email_list_type': c.email_list_type,
-            'status': c.status,
-            'total_emails': c.total_emails,
-            'sent_emails': c.sent_emails,
-            'failed_emails': c.failed_emails,
-            'created_at': c.created_at.isoformat()
-        } for c in campaigns]
+        'campaigns': campaigns,
+        'next_cursor': next_cursor
     })
 
+@app.route('/api/campaigns/summary', methods=['GET'])
+@login_required
+def campaign_summary():
+    """Totals across all of the user's campaigns without listing them"""
+    total_sent, active = db.session.query(
+        func.coalesce(func.sum(Campaign.sent_emails), 0),
+        func.count(Campaign.id).filter(Campaign.status == 'running')
+    ).filter(Campaign.user_id == current_user.id).one()
+    return jsonify({'success': True, 'total_sent': int(total_sent or 0), 'active_campaigns': active})
+
+def fetch_campaign_changes(since: datetime) -> List[Dict]:
+    """Campaign rows changed at or after `since` (feeds the live progress updates)"""
+    with app.app_context():
+        rows = Campaign.query.filter(Campaign.updated_at >= since).order_by(Campaign.updated_at).with_entities(
+            Campaign.id, Campaign.user_id, Campaign.status, Campaign.total_emails,
+            Campaign.sent_emails, Campaign.failed_emails, Campaign.updated_at
+        ).limit(1000).all()
+        return [dict(row._mapping) for row in rows]
+
+# One shared poller per process, however many dashboards are open. Idle dashboards poll once a minute
+# (see dashboard.html), so the feed keeps polling for a while after the last read instead of missing their changes
+campaign_feed = ChangeFeed(fetch_campaign_changes, start_from=datetime.utcnow, interval=1.0, idle_after=120)
+
+def campaign_progress_snapshot(user_id: int, since: datetime) -> Dict:
+    """Totals plus the user's unfinished campaigns (and any changed since `since`), for a dashboard without a cursor"""
+    total_sent = db.session.query(func.coalesce(func.sum(Campaign.sent_emails), 0)).filter(
+        Campaign.user_id == user_id
+    ).scalar()
+    campaigns = Campaign.query.filter(
+        Campaign.user_id == user_id,
+        or_(Campaign.status.in_(UNFINISHED_CAMPAIGN_STATUSES), Campaign.updated_at >= since)
+    ).with_entities(
+        Campaign.id, Campaign.status, Campaign.total_emails, Campaign.sent_emails, Campaign.failed_emails
+    ).all()
+    return {'total_sent': int(total_sent or 0), 'campaigns': [dict(row._mapping) for row in campaigns]}
+
+@app.route('/api/campaigns/progress', methods=['GET'])
+@login_required
+def campaign_progress():
+    """
+    Campaign progress for the dashboard's polling: a snapshot when called without a cursor (or with
+    one older than the shared feed's history), otherwise only the user's campaigns changed since it.
+    Reads the process's ChangeFeed and returns immediately.
+    """
+    try:
+        since = datetime.fromisoformat(request.args['cursor'])
+    except (KeyError, ValueError):
+        since = None
+    cursor, changes = campaign_feed.changes(since)
+    response = {'success': True, 'cursor': cursor.isoformat()}
+    if changes is None:
+        response['snapshot'] = campaign_progress_snapshot(current_user.id, cursor)
+    else:
+        latest = {change['id']: change for change in changes if change['user_id'] == current_user.id}
+        response['campaigns'] = [
+            {key: value for key, value in change.items() if key not in ('user_id', 'updated_at')}
+            for change in latest.values()
+        ]
+    return jsonify(response)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus metrics for this web process (campaigns run in the worker, which serves its own port).
+    The web app is public, so this is off unless METRICS_TOKEN is set, and scrapes must send the token.
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        return Response('Metrics are disabled: set METRICS_TOKEN to enable them\n', status=404, mimetype='text/plain')
+    if not metrics_authorized(token, request.headers.get('Authorization'), request.args.get('token')):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(REGISTRY.render(), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 @login_required
 def email_settings():
@@ -489,7 +838,11 @@ def email_settings():
                 'smtp_server': current_user.smtp_server or 'smtp.gmail.com',
                 'smtp_port': current_user.smtp_port or 587,
                 'sender_name': current_user.sender_name or current_user.username,
-                'has_password': bool(current_user.smtp_password)
+                'has_password': bool(current_user.smtp_password),
+                'max_emails_per_day': current_user.max_emails_per_day if current_user.max_emails_per_day is not None
+                else DEFAULT_MAX_EMAILS_PER_DAY,
+                'delay_between_emails': current_user.delay_between_emails if current_user.delay_between_emails is not None
+                else DEFAULT_DELAY_BETWEEN_EMAILS
             }
         })
     
@@ -505,6 +858,13 @@ def email_settings():
         smtp_server = data.get('smtp_server', 'smtp.gmail.com').strip()
         smtp_port = data.get('smtp_port', 587)
         sender_name = data.get('sender_name', current_user.username).strip()
+        try:
+            max_per_day = int(data.get('max_emails_per_day', current_user.max_emails_per_day or 0))
+            delay = int(data.get('delay_between_emails', current_user.delay_between_emails or 0))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Daily limit and delay must be whole numbers'}), 400
+        if max_per_day < 0 or delay < 0:
+            return jsonify({'success': False, 'message': 'Daily limit and delay cannot be negative'}), 400
         
         # Update fields
         if smtp_email:
@@ -518,6 +878,8 @@ def email_settings():
             current_user.smtp_port = 587
         if sender_name:
             current_user.sender_name = sender_name
+        current_user.max_emails_per_day = max_per_day
+        current_user.delay_between_emails = delay
         
         try:
             db.session.commit()
@@ -536,6 +898,62 @@ def email_settings():
                 'message': f'Error saving settings: {error_msg}'
             }), 500
 
+def sender_identity_dict(identity: SenderIdentity) -> Dict:
+    return {
+        'id': identity.id,
+        'email': identity.email,
+        'smtp_server': identity.smtp_server or 'smtp.gmail.com',
+        'smtp_port': identity.smtp_port or 587,
+        'sender_name': identity.sender_name or '',
+        'daily_limit': identity.daily_limit or 0,
+        'is_active': identity.is_active,
+    }
+
+@app.route('/api/senders', methods=['GET', 'POST'])
+@login_required
+def sender_identities():
+    """List or add (update, for a known address) the extra sender accounts campaigns rotate across"""
+    if request.method == 'GET':
+        identities = SenderIdentity.query.filter_by(user_id=current_user.id).order_by(SenderIdentity.id).all()
+        return jsonify({'success': True, 'senders': [sender_identity_dict(identity) for identity in identities]})
+    
+    data = request.get_json() or {}
+    email = (data.get('email') or '').strip()
+    password = (data.get('smtp_password') or '').strip()
+    if not email:
+        return jsonify({'success': False, 'message': 'Email address is required'}), 400
+    try:
+        smtp_port = int(data.get('smtp_port') or 587)
+        daily_limit = max(0, int(data.get('daily_limit') or 0))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Port and daily limit must be numbers'}), 400
+    
+    identity = SenderIdentity.query.filter_by(user_id=current_user.id, email=email).first()
+    if identity is None:
+        if not password:
+            return jsonify({'success': False, 'message': 'App password is required'}), 400
+        identity = SenderIdentity(user_id=current_user.id, email=email)
+        db.session.add(identity)
+    if password:
+        identity.smtp_password = password
+    identity.smtp_server = (data.get('smtp_server') or 'smtp.gmail.com').strip()
+    identity.smtp_port = smtp_port
+    identity.sender_name = (data.get('sender_name') or '').strip() or None
+    identity.daily_limit = daily_limit
+    identity.is_active = bool(data.get('is_active', True))
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Sender account saved', 'sender': sender_identity_dict(identity)})
+
+@app.route('/api/senders/<int:sender_id>', methods=['DELETE'])
+@login_required
+def delete_sender_identity(sender_id):
+    identity = SenderIdentity.query.get_or_404(sender_id)
+    if identity.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    db.session.delete(identity)
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Sender account removed'})
+
 def get_email_list_path(email_list_type: str) -> str:
     """Get the CSV file path for the selected email list type"""
     mapping = {
@@ -545,10 +963,50 @@ def get_email_list_path(email_list_type: str) -> str:
     }
     return mapping.get(email_list_type, 'companies.csv')
 
-def run_campaign(campaign_id: int):
-    """Run email campaign in background thread"""
+def wait_for_recipient_list(list_id: int, poll_interval: float = 2.0,
+                            stop: Optional[threading.Event] = None) -> Optional[str]:
+    """Path of an uploaded list once it has parsed rows to send to (None if parsing failed, it is gone or stop is set)"""
+    while stop is None or not stop.is_set():
+        row = db.session.query(RecipientList.status, RecipientList.valid_rows, RecipientList.path) \
+            .filter(RecipientList.id == list_id).first()
+        db.session.commit()  # End the read transaction so the next poll sees the parser's progress
+        if row is None or row.status == 'failed':
+            return None
+        if row.status == 'ready' or row.valid_rows:
+            return row.path
+        if stop is not None:
+            stop.wait(poll_interval)
+        else:
+            time.sleep(poll_interval)
+    return None
+
+def hand_over_campaign(campaign: Campaign, automation=None):
+    """Leave a campaign stopped by a worker shutdown for the next worker, which resumes it from its checkpoint"""
+    if automation is not None:
+        campaign.sent_emails, campaign.failed_emails, campaign.checkpoint_offset = automation.checkpoint_counts()
+    campaign.heartbeat_at = None
+    db.session.commit()
+    logger.info(f"⏸️ Campaign {campaign.id}: Stopped for shutdown at offset {campaign.checkpoint_offset}; it will resume on another worker")
+
+def pause_campaign(campaign: Campaign, automation):
+    """Leave a campaign stopped by a sending limit 'paused' at its checkpoint until the limit lifts (then a worker resumes it)"""
+    campaign.sent_emails, campaign.failed_emails, campaign.checkpoint_offset = automation.checkpoint_counts()
+    campaign.status = 'paused'
+    campaign.resume_at = datetime.utcnow() + timedelta(seconds=max(automation.resume_in or 0, CAMPAIGN_PAUSE_MIN))
+    campaign.heartbeat_at = None
+    db.session.commit()
+    logger.info(f"⏸️ Campaign {campaign.id}: Sending limit reached at offset {campaign.checkpoint_offset}; "
+                f"paused until {campaign.resume_at:%Y-%m-%d %H:%M} UTC")
+
+def run_campaign(campaign_id: int, resume: bool = False, stop: Optional[threading.Event] = None):
+    """
+    Run email campaign on a worker thread (resume=True continues from its checkpoint).
+    Once stop is set, sends already under way finish, progress is written and the campaign is handed over.
+    """
+    progress = None
+    started = time.perf_counter()
     try:
-        logger.info(f"🚀 run_campaign() called for campaign {campaign_id}")
+        logger.info(f"🚀 run_campaign() called for campaign {campaign_id}" + (" (resuming)" if resume else ""))
         logger.info(f"   Thread ID: {threading.current_thread().ident}")
         
         # IMPORTANT: Keep app context for entire function
@@ -571,8 +1029,11 @@ def run_campaign(campaign_id: int):
             logger.info(f"✅ User {user.id} ({user.email}) found for campaign {campaign_id}")
             
             campaign.status = 'running'
-            campaign.started_at = datetime.utcnow()
+            if not resume or not campaign.started_at:
+                campaign.started_at = datetime.utcnow()
+            campaign.heartbeat_at = datetime.utcnow()
             db.session.commit()
+            progress = CampaignProgressWriter(campaign_id).start()
             
             logger.info(f"🏃 Campaign {campaign_id}: Status set to 'running'")
             logger.info(f"   User: {user.username}")
@@ -597,8 +1058,22 @@ def run_campaign(campaign_id: int):
                     template_content = template.template_content
                     subject_template = template.subject_template
                 
-                # Get email list file
-                csv_file = get_email_list_path(campaign.email_list_type)
+                # Get email list file (an uploaded list is used as soon as its first rows are parsed)
+                if campaign.recipient_list_id:
+                    csv_file = wait_for_recipient_list(campaign.recipient_list_id, stop=stop)
+                    if csv_file is None and stop is not None and stop.is_set():
+                        progress.close()
+                        hand_over_campaign(campaign)
+                        return
+                    if csv_file is None:
+                        campaign.status = 'failed'
+                        campaign.failed_emails = 1
+                        campaign.error = 'The recipient list could not be parsed'
+                        db.session.commit()
+                        logger.error(f"❌ Campaign {campaign_id} failed: recipient list {campaign.recipient_list_id} could not be parsed")
+                        return
+                else:
+                    csv_file = get_email_list_path(campaign.email_list_type)
                 logger.info(f"📄 Campaign {campaign_id}: Using CSV file: {csv_file}")
                 logger.info(f"   Current directory: {os.getcwd()}")
                 logger.info(f"   CSV exists: {os.path.exists(csv_file)}")
@@ -607,6 +1082,7 @@ def run_campaign(campaign_id: int):
                 if not os.path.exists(csv_file):
                     campaign.status = 'failed'
                     campaign.failed_emails = 1
+                    campaign.error = 'The email list file was not found'
                     db.session.commit()
                     logger.error(f"❌ Campaign {campaign_id} failed: CSV file not found: {csv_file}")
                     logger.error(f"   Files in directory: {os.listdir('.')}")
@@ -617,6 +1093,7 @@ def run_campaign(campaign_id: int):
                     if not user.sendgrid_api_key or not user.smtp_email:
                         campaign.status = 'failed'
                         campaign.failed_emails = 1
+                        campaign.error = 'SendGrid is not configured in your email settings'
                         db.session.commit()
                         logger.error(f"❌ Campaign {campaign_id} failed: User has not configured SendGrid credentials")
                         return
@@ -624,6 +1101,7 @@ def run_campaign(campaign_id: int):
                     if not user.smtp_email or not user.smtp_password:
                         campaign.status = 'failed'
                         campaign.failed_emails = 1
+                        campaign.error = 'SMTP email and app password are not configured in your email settings'
                         db.session.commit()
                         logger.error(f"❌ Campaign {campaign_id} failed: User has not configured SMTP credentials")
                         return
@@ -639,12 +1117,30 @@ def run_campaign(campaign_id: int):
                     'sender_password': user.smtp_password,  # User's app password
                     'sendgrid_api_key': user.sendgrid_api_key,
                     'sender_name': user.sender_name or user.username,
-                    'delay_between_emails': 5,
-                    'max_emails_per_day': 50,
+                    'delay_between_emails': user.delay_between_emails if user.delay_between_emails is not None
+                    else DEFAULT_DELAY_BETWEEN_EMAILS,
+                    'max_emails_per_day': user.max_emails_per_day if user.max_emails_per_day is not None
+                    else DEFAULT_MAX_EMAILS_PER_DAY,
                     'email_subject_template': subject_template,
                     'csv_file': csv_file
                 }
                 
+                # Extra sender accounts: recipients are spread across them and the main account by remaining quota
+                identities = [] if user.email_provider == 'sendgrid' else \
+                    SenderIdentity.query.filter_by(user_id=user.id, is_active=True).all()
+                if identities:
+                    user_config['sender_accounts'] = [{'sender_email': user.smtp_email, 'sender_password': user.smtp_password}] + [
+                        dict({
+                            'sender_email': identity.email,
+                            'sender_password': identity.smtp_password,
+                            'smtp_server': identity.smtp_server or 'smtp.gmail.com',
+                            'smtp_port': identity.smtp_port or 587,
+                            'sender_name': identity.sender_name or user_config['sender_name'],
+                        }, **({'max_emails_per_day': identity.daily_limit} if identity.daily_limit else {}))
+                        for identity in identities
+                    ]
+                    logger.info(f"   Rotating across {len(user_config['sender_accounts'])} sender accounts")
+                
                 # Save user config
                 config_file = f'user_data/user_{campaign.user_id}_config.json'
                 with open(config_file, 'w') as f:
@@ -655,8 +1151,11 @@ def run_campaign(campaign_id: int):
                 with open(template_file, 'w', encoding='utf-8') as f:
                     f.write(template_content)
                 
-                # Initialize email automation with the config file
+                # Initialize email automation with the config file (imported here so the web process never loads the send stack)
+                from email_automation import EmailAutomation
                 automation = EmailAutomation(config_file=config_file)
+                if stop is not None:
+                    automation.stop_event = stop
                 
                 # Reload config to ensure it has the latest SMTP credentials
                 automation.config = user_config
@@ -664,62 +1163,90 @@ def run_campaign(campaign_id: int):
                 # Override template loading
                 automation.load_email_template = lambda: open(template_file, 'r', encoding='utf-8').read()
                 
-                # Load companies - don't skip dry_run emails for new campaigns
-                # Only skip actually sent emails
-                companies = automation.load_companies_from_csv(csv_file, skip_sent=False, include_dry_run=False)
-                
-                # Apply email limit if set
-                if campaign.email_limit and campaign.email_limit > 0:
-                    companies = companies[:campaign.email_limit]
+                # Count companies from the recipient cache (the list is imported on first use) - don't skip
+                # dry_run emails for new campaigns. Only skip actually sent emails
+                email_limit = campaign.email_limit if campaign.email_limit and campaign.email_limit > 0 else 0
+                with time_stage('campaign_count'):
+                    total_companies = automation.count_companies(csv_file, email_limit)
                 
-                if not companies:
+                if not total_companies:
                     campaign.status = 'failed'
                     campaign.failed_emails = 1
+                    campaign.error = 'The email list has no recipients to send to'
                     db.session.commit()
                     logger.error(f"❌ Campaign {campaign_id} failed: No companies to process")
                     return
                 
-                campaign.total_emails = len(companies)
+                campaign.total_emails = total_companies
                 db.session.commit()
                 
                 # Log that we're about to send emails
-                logger.info(f"📧 Campaign {campaign_id}: Starting to send {len(companies)} emails")
+                logger.info(f"📧 Campaign {campaign_id}: Starting to send {total_companies} emails")
                 logger.info(f"   Using email: {user.smtp_email}")
                 logger.info(f"   SMTP server: {user.smtp_server}:{user.smtp_port}")
                 logger.info(f"   CSV file: {csv_file}")
-                logger.info(f"   Companies loaded: {len(companies)}")
+                logger.info(f"   Companies found: {total_companies}")
                 logger.info(f"   DRY RUN = False (will actually send emails)")
                 
                 # Run automation with user's SMTP credentials (actual sending)
                 # Set include_dry_run=False so we process all emails, not just new ones
                 logger.info(f"🎯 Campaign {campaign_id}: Calling automation.run()...")
                 
-                # Progress callback to update campaign counts live
+                # Pick up where a previous attempt stopped: skip delivered recipients and keep counters
+                start_offset = 0
+                delivered = set()
+                if resume:
+                    start_offset = campaign.checkpoint_offset or 0
+                    delivered = {d.email for d in CampaignDelivery.query.filter_by(campaign_id=campaign_id)}
+                    automation.sent_count = campaign.sent_emails or 0
+                    automation.failed_count = campaign.failed_emails or 0
+                    logger.info(f"⏩ Campaign {campaign_id}: Resuming at offset {start_offset}, {len(delivered)} already delivered")
+                
+                # Checkpoint each delivered recipient together with the next progress write
+                def on_result(result: dict):
+                    if result['status'] == 'sent':
+                        email = result['email'].lower()
+                        if email not in delivered:
+                            delivered.add(email)
+                            progress.add_delivery(email)
+                
+                # Progress callback: buffered in memory, written every 2 seconds or 50 sends. Counters match the
+                # checkpoint, so a resume after a crash doesn't count failures past it twice
                 def on_progress(sent_count: int, failed_count: int, company: dict):
-                    try:
-                        campaign.sent_emails = sent_count
-                        campaign.failed_emails = failed_count
-                        db.session.commit()
-                        logger.info(f"📊 Campaign {campaign_id}: Progress - Sent: {sent_count}, Failed: {failed_count}")
-                    except Exception as e:
-                        logger.error(f"❌ Progress update failed: {e}")
-                        db.session.rollback()
-                
-                automation.run(
-                    csv_file=csv_file,
-                    dry_run=False,
-                    skip_sent=False,
-                    include_dry_run=False,
-                    on_progress=on_progress
-                )
+                    progress.update(*automation.checkpoint_counts())
+                
+                with time_stage('campaign_send'):
+                    automation.run(
+                        csv_file=csv_file,
+                        dry_run=False,
+                        skip_sent=False,
+                        include_dry_run=False,
+                        on_progress=on_progress,
+                        limit=email_limit,
+                        start_offset=start_offset,
+                        skip_emails=delivered,
+                        on_result=on_result
+                    )
                 
                 logger.info(f"✅ Campaign {campaign_id}: Automation completed")
                 logger.info(f"   Sent count: {automation.sent_count}")
                 logger.info(f"   Failed count: {automation.failed_count}")
+                if automation.rate_limited:
+                    logger.warning(f"⚠️ Campaign {campaign_id}: Stopped early - sending limit for {user.smtp_email} reached")
                 
-                # Update campaign status
+                # Write the last buffered progress, then update campaign status
+                progress.close()
+                if automation.stop_event.is_set():
+                    hand_over_campaign(campaign, automation)
+                    return
+                if automation.rate_limited:
+                    pause_campaign(campaign, automation)
+                    return
+                # The list may have still been importing when the total was first counted
+                campaign.total_emails = automation.count_companies(csv_file, email_limit)
                 campaign.sent_emails = automation.sent_count
                 campaign.failed_emails = automation.failed_count
+                campaign.checkpoint_offset = automation.checkpoint_offset
                 
                 # Save results to CSV for tracking
                 if automation.results:
@@ -740,6 +1267,17 @@ def run_campaign(campaign_id: int):
                 
                 campaign.completed_at = datetime.utcnow()
                 db.session.commit()
+                CAMPAIGNS.inc(status=campaign.status)
+                
+            except TemplateError as e:
+                # Raised before anything is sent: nothing was attempted, so nothing counts as failed
+                progress.close()
+                db.session.rollback()
+                campaign.status = 'failed'
+                campaign.error = f"Invalid email template: {e}"[:500]
+                db.session.commit()
+                CAMPAIGNS.inc(status='failed')
+                logger.error(f"❌ Campaign {campaign_id} failed: {campaign.error}")
                 
             except Exception as e:
                 import traceback
@@ -748,9 +1286,13 @@ def run_campaign(campaign_id: int):
                 logger.error(f"❌❌❌ Campaign {campaign_id} EXCEPTION: {error_msg}")
                 logger.error(traceback_str)
                 
+                progress.close()
+                db.session.rollback()
                 campaign.status = 'failed'
                 campaign.failed_emails = campaign.total_emails if campaign.total_emails > 0 else 1
+                campaign.error = (error_msg or type(e).__name__)[:500]
                 db.session.commit()
+                CAMPAIGNS.inc(status='failed')
                 
                 # Log error to file for debugging
                 try:
@@ -765,6 +1307,234 @@ def run_campaign(campaign_id: int):
         import traceback
         logger.error(f"❌❌❌ THREAD EXCEPTION for campaign {campaign_id}: {e}")
         logger.error(traceback.format_exc())
+    finally:
+        if progress is not None:
+            progress.close()
+        observe_stage('campaign_total', time.perf_counter() - started)
+
+# A running campaign whose heartbeat is older than this is considered orphaned
+CAMPAIGN_HEARTBEAT_INTERVAL = 30  # seconds
+CAMPAIGN_STALE_AFTER = 90  # seconds
+# A campaign paused by a sending limit waits at least this long before a worker tries it again
+CAMPAIGN_PAUSE_MIN = 60  # seconds
+
+class CampaignProgressWriter:
+    """
+    Buffers a running campaign's progress in memory and writes it in one small transaction
+    every `interval` seconds or every `max_pending` updates, whichever comes first.
+    The same background thread keeps heartbeat_at fresh while the campaign is idle (e.g. rate limited).
+    """
+    
+    def __init__(self, campaign_id: int, interval: float = 2.0, max_pending: int = 50,
+                 heartbeat_interval: float = CAMPAIGN_HEARTBEAT_INTERVAL):
+        self.campaign_id = campaign_id
+        self.interval = interval
+        self.max_pending = max_pending
+        self.heartbeat_interval = heartbeat_interval
+        self.engine = db.engine  # Core statements: safe to use from the writer thread
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._counters = None
+        self._deliveries = []
+        self._pending = 0
+        self._last_write = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f'campaign-{campaign_id}-progress')
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def update(self, sent_count: int, failed_count: int, checkpoint_offset: int):
+        """Record the latest counters (cheap, no DB access)"""
+        with self._lock:
+            self._counters = (sent_count, failed_count, checkpoint_offset)
+            self._pending += 1
+            if self._pending >= self.max_pending:
+                self._wake.set()
+    
+    def add_delivery(self, email: str):
+        """Queue a delivered recipient for the checkpointed sent set"""
+        with self._lock:
+            self._deliveries.append(email)
+    
+    def flush(self, heartbeat: bool = False):
+        """Write buffered progress (and a heartbeat) in one transaction"""
+        with self._lock:
+            counters, self._counters = self._counters, None
+            deliveries, self._deliveries = self._deliveries, []
+            self._pending = 0
+        if counters is None and not deliveries and not heartbeat:
+            return
+        now = datetime.utcnow()
+        values = {'heartbeat_at': now}
+        if counters is not None:
+            values.update(sent_emails=counters[0], failed_emails=counters[1], checkpoint_offset=counters[2])
+        try:
+            with time_stage('progress_flush'), self.engine.begin() as conn:
+                if deliveries:
+                    conn.execute(CampaignDelivery.__table__.insert(), [
+                        {'campaign_id': self.campaign_id, 'email': email, 'created_at': now} for email in deliveries
+                    ])
+                conn.execute(
+                    Campaign.__table__.update()
+                    .where(Campaign.__table__.c.id == self.campaign_id, Campaign.__table__.c.status == 'running')
+                    .values(**values)
+                )
+            self._last_write = time.monotonic()
+            if counters is not None:
+                logger.info(f"📊 Campaign {self.campaign_id}: Progress - Sent: {counters[0]}, Failed: {counters[1]}")
+        except Exception as e:
+            logger.error(f"❌ Progress update failed for campaign {self.campaign_id}: {e}")
+            # Put the data back so the next flush retries it
+            with self._lock:
+                if self._counters is None:
+                    self._counters = counters
+                self._deliveries = deliveries + self._deliveries
+    
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.flush(heartbeat=time.monotonic() - self._last_write >= self.heartbeat_interval)
+    
+    def close(self):
+        """Stop the writer thread and write everything still buffered"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+def claim_next_campaign(worker_id: str) -> Optional[Tuple[int, bool]]:
+    """
+    Lease the next campaign for a worker: an orphaned 'running' campaign first, then a 'paused' one whose
+    sending limit has lifted, else the oldest 'pending' one
+    
+    Returns:
+        tuple: (campaign_id, resume) or None if there is nothing to run
+    """
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=CAMPAIGN_STALE_AFTER)
+        orphaned = and_(
+            Campaign.status == 'running',
+            or_(Campaign.heartbeat_at.is_(None), Campaign.heartbeat_at < cutoff)
+        )
+        paused = and_(Campaign.status == 'paused', Campaign.resume_at <= datetime.utcnow())
+        queued = Campaign.status == 'pending'
+        for condition, resume, order in ((orphaned, True, Campaign.id), (paused, True, Campaign.resume_at),
+                                         (queued, False, Campaign.created_at)):
+            candidates = Campaign.query.filter(condition).order_by(order).with_entities(Campaign.id).limit(5).all()
+            for (campaign_id,) in candidates:
+                # Conditional update so only one worker wins each campaign
+                claimed = Campaign.query.filter(Campaign.id == campaign_id, condition).update({
+                    'status': 'running',
+                    'lease_owner': worker_id,
+                    'heartbeat_at': datetime.utcnow(),
+                    'resume_at': None
+                }, synchronize_session=False)
+                db.session.commit()
+                if claimed:
+                    return campaign_id, resume
+    return None
+
+def release_campaign_leases(worker_id: str):
+    """Let other workers pick up this worker's running campaigns and lists immediately (used on shutdown)"""
+    with app.app_context():
+        Campaign.query.filter_by(lease_owner=worker_id, status='running').update(
+            {'heartbeat_at': None}, synchronize_session=False
+        )
+        RecipientList.query.filter_by(lease_owner=worker_id, status='parsing').update(
+            {'heartbeat_at': None}, synchronize_session=False
+        )
+        db.session.commit()
+
+# Progress of a list being parsed is written at most this often (it doubles as the parser's heartbeat)
+LIST_PROGRESS_INTERVAL = 1.0  # seconds
+
+def claim_next_recipient_list(worker_id: str) -> Optional[int]:
+    """Lease the next uploaded list to parse: an orphaned 'parsing' one first, else the oldest 'uploaded' one"""
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=CAMPAIGN_STALE_AFTER)
+        orphaned = and_(
+            RecipientList.status == 'parsing',
+            or_(RecipientList.heartbeat_at.is_(None), RecipientList.heartbeat_at < cutoff)
+        )
+        queued = RecipientList.status == 'uploaded'
+        for condition in (orphaned, queued):
+            candidates = RecipientList.query.filter(condition).order_by(RecipientList.id) \
+                .with_entities(RecipientList.id).limit(5).all()
+            for (list_id,) in candidates:
+                claimed = RecipientList.query.filter(RecipientList.id == list_id, condition).update({
+                    'status': 'parsing',
+                    'lease_owner': worker_id,
+                    'heartbeat_at': datetime.utcnow()
+                }, synchronize_session=False)
+                db.session.commit()
+                if claimed:
+                    return list_id
+    return None
+
+def parse_recipient_list(list_id: int):
+    """
+    Validate and parse an uploaded list into the recipient cache (runs on a worker). Rows are committed
+    in chunks, so campaigns using the list send to the first rows while the rest is still being parsed.
+    """
+    from email_automation import parse_companies, resolve_column_mapping
+    from recipient_cache import DEFAULT_CACHE_PATH, RecipientCache, open_hashed
+    
+    with app.app_context():
+        recipient_list = RecipientList.query.get(list_id)
+        if not recipient_list:
+            return
+        path = recipient_list.path
+        db.session.commit()
+        table = RecipientList.__table__
+        
+        def report(**values):
+            now = datetime.utcnow()
+            with db.engine.begin() as conn:
+                conn.execute(table.update().where(table.c.id == list_id).values(heartbeat_at=now, updated_at=now, **values))
+        
+        started = time.perf_counter()
+        counts = {'rows': 0}
+        cache = None
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                mapping = resolve_column_mapping(next(csv.reader(f), None) or [])
+            if not mapping['founder_email'] or not mapping['company_name']:
+                raise ValueError('The header needs an email column and a company name column')
+            
+            cache = RecipientCache(DEFAULT_CACHE_PATH)
+            with open(path, 'rb') as f:
+                text, reader = open_hashed(f)
+                last_report = 0.0
+                
+                def on_chunk(valid_rows: int):
+                    nonlocal last_report
+                    if time.monotonic() - last_report >= LIST_PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        report(parsed_bytes=reader.bytes_read, valid_rows=valid_rows,
+                               skipped_rows=counts['rows'] - valid_rows)
+                
+                valid_rows = cache.import_stream(path, parse_companies(text, counts), reader, on_chunk=on_chunk)
+            report(status='ready', parsed_bytes=os.path.getsize(path), valid_rows=valid_rows,
+                   skipped_rows=counts['rows'] - valid_rows, error=None, lease_owner=None)
+            logger.info(f"✅ Recipient list {list_id} parsed: {valid_rows} valid, "
+                        f"{counts['rows'] - valid_rows} skipped in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            error = 'The file is not UTF-8 text' if isinstance(e, UnicodeDecodeError) else str(e)
+            logger.error(f"❌ Recipient list {list_id} failed to parse: {error}")
+            try:
+                report(status='failed', error=error[:500], lease_owner=None)
+            except Exception as report_error:
+                logger.error(f"❌ Could not record the failure of recipient list {list_id}: {report_error}")
+        finally:
+            if cache is not None:
+                cache.close()
 
 def get_default_template() -> str:
     """Get default email template"""
@@ -785,77 +1555,64 @@ Best regards,
 {sender_name}
 """
 
-# Initialize database and handle schema updates
-def init_database():
-    """Initialize database and handle schema updates"""
+def init_database(migrate_schema: bool = False):
+    """
+    Check the schema version, or bring the schema up to date when migrate_schema is set (see migrations.py).
+    Web workers only check: migrations run once per deploy, not once per gunicorn worker.
+    """
     with app.app_context():
         try:
-            # Create all tables (only creates if they don't exist)
-            # This will NOT error if tables already exist
-            db.create_all()
-            
-            # For existing databases, try to add new columns if they don't exist
-            # SQLite supports ALTER TABLE ADD COLUMN, but we need to check if column exists first
-            try:
-                from sqlalchemy import text, inspect
-                inspector = inspect(db.engine)
-                
-                # Check if user table exists
-                if 'user' in inspector.get_table_names():
-                    columns = [col['name'] for col in inspector.get_columns('user')]
-                    
-                    # Check if new columns exist, if not add them
-                    with db.engine.connect() as conn:
-                        if 'smtp_email' not in columns:
-                            try:
-                                conn.execute(text("ALTER TABLE user ADD COLUMN smtp_email VARCHAR(120)"))
-                                conn.commit()
-                            except Exception as e:
-                                print(f"Note: Could not add smtp_email column: {e}")
-                        
-                        if 'smtp_password' not in columns:
-                            try:
-                                conn.execute(text("ALTER TABLE user ADD COLUMN smtp_password VARCHAR(255)"))
-                                conn.commit()
-                            except Exception as e:
-                                print(f"Note: Could not add smtp_password column: {e}")
-                        
-                        if 'smtp_server' not in columns:
-                            try:
-                                conn.execute(text("ALTER TABLE user ADD COLUMN smtp_server VARCHAR(100) DEFAULT 'smtp.gmail.com'"))
-                                conn.commit()
-                            except Exception as e:
-                                print(f"Note: Could not add smtp_server column: {e}")
-                        
-                        if 'smtp_port' not in columns:
-                            try:
-                                conn.execute(text("ALTER TABLE user ADD COLUMN smtp_port INTEGER DEFAULT 587"))
-                                conn.commit()
-                            except Exception as e:
-                                print(f"Note: Could not add smtp_port column: {e}")
-                        
-                        if 'sender_name' not in columns:
-                            try:
-                                conn.execute(text("ALTER TABLE user ADD COLUMN sender_name VARCHAR(100)"))
-                                conn.commit()
-                            except Exception as e:
-                                print(f"Note: Could not add sender_name column: {e}")
-                else:
-                    # Table doesn't exist, db.create_all() will create it with all columns
-                    pass
-            except Exception as e:
-                # Columns might already exist or database might not support ALTER
-                print(f"Note: Could not check/add columns (this is usually fine): {e}")
-                # Continue anyway - db.create_all() should handle it
+            if migrate_schema:
+                migrate(db.engine, db.metadata)
+            else:
+                pending = pending_versions(db.engine)
+                if pending:
+                    logger.warning(f"Database migrations {pending} are pending; run `python migrations.py`")
         except Exception as e:
-            # Only print error if it's not about table already existing
-            if "already exists" not in str(e).lower():
-                print(f"Database initialization warning: {e}")
-            # Continue anyway - tables might already exist which is fine
+            # Keep serving: the deploy's `python migrations.py` step reports the failure
+            logger.error(f"Database {'migration' if migrate_schema else 'version check'} failed: {e}")
+
+
+def create_directories():
+    """Ensure upload, user data and SQLite directories exist"""
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['LIST_FOLDER'], exist_ok=True)
+    os.makedirs('user_data', exist_ok=True)
+    os.makedirs(INSTANCE_DIR, exist_ok=True)  # For SQLite database
+
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def init_app(migrate_schema: bool = False):
+    """
+    One-time startup work: logging, data directories and the database schema version check.
+    Importing this module does none of it; the gunicorn post_worker_init hook, the worker and
+    `python app.py` call this explicitly, and the first request does as a fallback.
+    The worker and `python app.py` pass migrate_schema=True to apply pending migrations as well.
+    """
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        # Configure logging to stdout so it appears in Railway logs (LOG_FORMAT=json for one JSON object per line)
+        configure_logging(stream=sys.stdout, text_format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        create_directories()
+        init_database(migrate_schema)
+        _initialized = True
+
+
+@app.before_request
+def ensure_initialized():
+    if not _initialized:
+        init_app()
 
-init_database()
 
 if __name__ == '__main__':
+    init_app(migrate_schema=True)
     # Get port from environment variable (for production) or default to 5000
     port = int(os.environ.get('PORT', 5000))
     # Only run in debug mode if not in production
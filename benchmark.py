@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Throughput of the send pipeline, stage by stage and end to end
+Generates a synthetic list shaped like ycombinatoremails.csv and delivers to a local sink
+(no network, no credentials), then compares the numbers with a stored baseline.
+
+Usage:
+    python benchmark.py                          # 10k rows, compared with benchmark_baseline.json
+    python benchmark.py --rows 1000000
+    python benchmark.py --transport mbox --stages load,dedup,end_to_end
+    python benchmark.py --save-baseline          # store this run as the new baseline
+"""
+
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional
+
+from email_automation import EmailAutomation
+from log_config import configure_logging
+from template_engine import compile_template
+from transports import MessageBuilder, create_transport
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+STAGES = ('load', 'dedup', 'personalize', 'mime', 'deliver', 'end_to_end')
+YC_HEADER = ['Organization Name', 'Batch', 'Status', 'First Name', 'Last Name', 'Email',
+             'Organization Domain', 'Unique ID', 'Full Name']
+STATUSES = ['ACTIVE'] * 7 + ['ACQUIRED', 'INACTIVE', 'PUBLIC']
+FIRST_NAMES = ['Alex', 'Priya', 'Chen', 'Maria', 'Daniel', 'Aisha', 'Lukas', 'Sofía', 'Kenji', 'Olu']
+LAST_NAMES = ['Smith', 'Patel', 'Wang', 'García', 'Jones', 'Khan', 'Müller', 'Rossi', 'Tanaka', 'Adeyemi']
+SUBJECT_TEMPLATE = 'Partnership Opportunity - {company_name}'
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def generate_csv(path: str, rows: int, seed: int = 42) -> Iterator[str]:
+    """
+    Write a synthetic YC-style list and yield every email address written
+
+    Roughly 70% of rows are ACTIVE; about 1% have a TBD email and are skipped by the loader.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(YC_HEADER)
+        for n in range(rows):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            company = f"Startup{n}"
+            email = 'TBD' if rng.random() < 0.01 else f"founder{n}@startup{n}.com"
+            writer.writerow([company, f"{rng.choice('SW')}{rng.randint(10, 25)}", rng.choice(STATUSES),
+                             first, last, email, f"https://startup{n}.com", f"{first}_{last}_{company}",
+                             f"{first} {last}"])
+            yield email
+
+
+class StageTimer:
+    """Accumulates time spent in one stage, excluding the work done between its calls"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    @contextlib.contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        yield
+        self.seconds += time.perf_counter() - start
+        self.items += 1
+
+    def result(self) -> Dict:
+        return {
+            'items': self.items,
+            'seconds': round(self.seconds, 4),
+            'per_second': round(self.items / self.seconds, 1) if self.seconds else None,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+
+def bench_config(workdir: str, csv_file: str, transport: str) -> Dict:
+    """Automation config that sends as fast as the pipeline allows, entirely inside workdir"""
+    return {
+        'transport': transport,
+        'sink_path': os.path.join(workdir, 'sink.mbox'),
+        'sender_email': 'bench@localhost',
+        'sender_name': 'Benchmark',
+        'email_subject_template': SUBJECT_TEMPLATE,
+        'csv_file': csv_file,
+        'sent_index_db': os.path.join(workdir, 'sent_emails.db'),
+        'recipient_cache_db': os.path.join(workdir, 'recipients.db'),
+        'journal_dir': os.path.join(workdir, 'journal'),
+        'max_emails_per_second': 1e9,
+        'max_emails_per_day': 0,
+    }
+
+
+def run_stages(automation: EmailAutomation, csv_file: str, template: str, stages: List[str]) -> Dict[str, Dict]:
+    """Time each per-recipient stage in isolation over the whole list"""
+    results = {}
+    config = automation.config
+    index = automation.get_sent_index()
+    body_template, subject_template = compile_template(template), compile_template(SUBJECT_TEMPLATE)
+
+    if 'load' in stages:
+        timer = StageTimer('load')
+        companies = automation.iter_companies_from_csv(csv_file, skip_sent=False)
+        while True:
+            with timer.measure():
+                company = next(companies, None)
+            if company is None:
+                timer.items -= 1
+                break
+        results['load'] = timer.result()
+
+    per_company = [name for name in ('dedup', 'personalize', 'mime', 'deliver') if name in stages]
+    if per_company:
+        timers = {name: StageTimer(name) for name in per_company}
+        transport = create_transport(config) if 'deliver' in timers else None
+        builder = MessageBuilder(config) if 'mime' in timers else None
+        for company in automation.iter_companies_from_csv(csv_file, skip_sent=False):
+            if 'dedup' in timers:
+                with timers['dedup'].measure():
+                    index.contains(company['founder_email'])
+            if 'personalize' in timers:
+                with timers['personalize'].measure():
+                    values = automation.template_values(company, config)
+                    body, subject = body_template.render(values), subject_template.render(values)
+            else:
+                values = automation.template_values(company, config)
+                body, subject = body_template.render(values), subject_template.render(values)
+            if 'mime' in timers:
+                with timers['mime'].measure():
+                    builder.build(company['founder_email'], subject, body)
+            if transport is not None:
+                with timers['deliver'].measure():
+                    transport.send(company['founder_email'], subject, body)
+        if transport is not None:
+            transport.close()
+        for name, timer in timers.items():
+            results[name] = timer.result()
+    return results
+
+
+def run_end_to_end(automation: EmailAutomation, csv_file: str) -> Dict:
+    """EmailAutomation.run() over the whole list; per_second counts messages actually delivered"""
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        automation.run(csv_file=csv_file)
+    seconds = time.perf_counter() - start
+    return {
+        'items': automation.sent_count,
+        'seconds': round(seconds, 4),
+        'per_second': round(automation.sent_count / seconds, 1) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Stages that got slower (or, end to end, hungrier) than the baseline allows"""
+    regressions = []
+    for name, result in report['stages'].items():
+        previous = baseline.get('stages', {}).get(name)
+        if not previous or not previous.get('per_second') or not result.get('per_second'):
+            continue
+        if result['per_second'] < previous['per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {result['per_second']:.0f}/s vs baseline {previous['per_second']:.0f}/s")
+    final, previous = report['stages'].get('end_to_end'), baseline.get('stages', {}).get('end_to_end')
+    if final and previous and final.get('peak_rss_mb') and previous.get('peak_rss_mb') \
+            and final['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+        regressions.append(f"end_to_end peak RSS: {final['peak_rss_mb']} MB vs baseline {previous['peak_rss_mb']} MB")
+    return regressions
+
+
+def print_report(report: Dict, baseline: Optional[Dict]):
+    print(f"\nPipeline benchmark: {report['rows']} rows via '{report['transport']}' transport")
+    print(f"{'stage':<12} {'items':>9} {'seconds':>9} {'per second':>12} {'peak RSS MB':>12} {'vs baseline':>12}")
+    for name, result in report['stages'].items():
+        change = ''
+        previous = (baseline or {}).get('stages', {}).get(name)
+        if previous and previous.get('per_second') and result.get('per_second'):
+            change = f"{(result['per_second'] / previous['per_second'] - 1) * 100:+.1f}%"
+        per_second = f"{result['per_second']:.0f}" if result.get('per_second') else '-'
+        rss = result['peak_rss_mb'] if result.get('peak_rss_mb') is not None else '-'
+        print(f"{name:<12} {result['items']:>9} {result['seconds']:>9.3f} {per_second:>12} {rss:>12} {change:>12}")
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Send pipeline benchmark')
+    parser.add_argument('--rows', type=int, default=10000, help='Rows in the synthetic list')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic list')
+    parser.add_argument('--sent-fraction', type=float, default=0.1,
+                        help='Share of addresses marked as already sent, to exercise dedup')
+    parser.add_argument('--transport', type=str, default='local_smtp', choices=['local_smtp', 'mbox'],
+                        help='Local transport to deliver to')
+    parser.add_argument('--stages', type=str, default=','.join(STAGES), help=f"Comma-separated subset of {', '.join(STAGES)}")
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a stage counts as a regression')
+    parser.add_argument('--json', type=str, default=None, help='Also write the report to this file')
+    parser.add_argument('--log-level', type=str, default='WARNING', help='Log level while benchmarking')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary working directory')
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(unknown)}")
+    configure_logging(level=args.log_level)
+
+    baseline_path = os.path.abspath(args.baseline)
+    template_path = os.path.abspath('email_template.txt')
+    workdir = tempfile.mkdtemp(prefix='email_bench_')
+    original_dir = os.getcwd()
+    try:
+        os.chdir(workdir)  # Results files, logs and the template live in the scratch directory
+        if os.path.exists(template_path):
+            shutil.copy(template_path, 'email_template.txt')
+        csv_file = os.path.join(workdir, 'companies.csv')
+        print(f"Generating {args.rows} rows in {workdir}...")
+        rng = random.Random(args.seed)
+        already_sent = [email for email in generate_csv(csv_file, args.rows, args.seed)
+                        if email != 'TBD' and rng.random() < args.sent_fraction]
+
+        config = bench_config(workdir, csv_file, args.transport)
+        config_file = os.path.join(workdir, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+        automation = EmailAutomation(config_file)
+        index = automation.get_sent_index()
+        index.add_many((email, 'sent') for email in already_sent)
+
+        report = {
+            'rows': args.rows,
+            'transport': args.transport,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'stages': run_stages(automation, csv_file, automation.load_email_template(), stages),
+        }
+        if 'end_to_end' in stages:
+            report['stages']['end_to_end'] = run_end_to_end(automation, csv_file)
+        index.close()
+    finally:
+        os.chdir(original_dir)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return
+
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path} (run with --save-baseline to create one)")
+        return
+    if baseline.get('platform') != report['platform']:
+        print(f"\nNote: baseline was recorded on {baseline.get('platform')}; numbers may not be comparable")
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ No stage regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
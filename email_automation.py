@@ -6,24 +6,160 @@ Reads company data from CSV and sends personalized cold emails
 
 import csv
 import smtplib
-import time
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from datetime import datetime
 import os
-from typing import List, Dict, Optional, Callable
+from typing import IO, List, Dict, Optional, Callable, Iterator, Tuple
 import json
+from itertools import chain, islice
+
+from sent_index import SentEmailIndex
+from recipient_cache import DEFAULT_CACHE_PATH, RecipientCache
+from rate_limiter import get_rate_limiter
+from template_engine import compile_template, TemplateError
+from send_journal import SendJournal
+from transports import Transport, TransportError, create_transport, transport_name
+from sender_accounts import SenderAccount, create_rotation
+from retry_queue import RetryQueue, TRANSIENT, classify_failure
+from metrics import CSV_ROWS, MESSAGES, RETRIES, time_stage, observe_stage, REGISTRY, summarize, format_summary
+from log_config import configure_logging, structured_logging
+
+# Per-row CSV stages are cheap enough that timing every row would be noticeable, so 1 row in N is timed
+CSV_METRICS_SAMPLE_EVERY = 64
+
+# Parallel sends allowed per provider (overridable with max_concurrent_sends in config)
+PROVIDER_CONCURRENCY = {
+    'gmail': 2,
+    'smtp': 4,
+    'sendgrid': 8,
+    'local': 8,
+}
+
+
+def get_provider(config: Dict) -> str:
+    """Classify the delivery provider: 'sendgrid', 'gmail', generic 'smtp' or a 'local' sink"""
+    if config.get('transport') in ('mbox', 'local_smtp'):
+        return 'local'
+    if transport_name(config) == 'sendgrid':
+        return 'sendgrid'
+    if 'gmail' in config.get('smtp_server', 'smtp.gmail.com').lower():
+        return 'gmail'
+    return 'smtp'
+
+# Candidate CSV header names per field, in priority order (YC CSV names first)
+COLUMN_CANDIDATES = {
+    'company_name': ['Organization Name', 'organization_name', 'organization name',
+                     'company_name', 'Company', 'company', 'Company Name'],
+    'founder_email': ['Email', 'email', 'founder_email', 'Founder Email',
+                      'contact_email', 'Contact Email'],
+    'founder_name': ['Full Name', 'full_name', 'full name', 'founder_name', 'Founder Name',
+                     'Name', 'name'],
+    'first_name': ['First Name', 'first_name', 'First_Name', 'First name'],
+    'last_name': ['Last Name', 'last_name', 'Last_Name', 'Last name'],
+    'website': ['Organization Domain', 'organization_domain', 'organization domain',
+                'website', 'Website', 'domain', 'Domain', 'url', 'URL'],
+    'industry': ['industry', 'Industry', 'sector', 'Sector', 'category', 'Category'],
+    'notes': ['Batch', 'batch', 'notes', 'Notes', 'description', 'Description'],
+    'status': ['Status', 'status', 'STATUS'],
+}
+
+
+def resolve_column_mapping(fieldnames: List[str]) -> Dict[str, List[int]]:
+    """Map each field to the indices of the header columns that can supply it, in priority order"""
+    positions = {}
+    for index, name in enumerate(fieldnames):
+        # Like csv.DictReader, a duplicated header name refers to its last column
+        positions[name] = index
+    return {
+        field: [positions[name] for name in candidates if name in positions]
+        for field, candidates in COLUMN_CANDIDATES.items()
+    }
+
+def read_companies(csv_file: str) -> Iterator[Dict]:
+    """
+    Company records of a CSV file in order, resolving the column mapping once from the header.
+    Rows that are not ACTIVE or lack an email or company name are left out; read errors are raised.
+    """
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        yield from parse_companies(f)
+
+
+def parse_companies(f: IO[str], counts: Optional[Dict[str, int]] = None) -> Iterator[Dict]:
+    """read_companies for an open text file; counts['rows'], when given, tracks the data rows read so far"""
+    reader = csv.reader(f)
+    header = next(reader, None) or []
+    mapping = resolve_column_mapping(header)
+    
+    def get_value(row, field):
+        """First non-empty, non-TBD value among the columns mapped to field"""
+        for index in mapping[field]:
+            if index < len(row):
+                value = row[index].strip()
+                if value and value.upper() != 'TBD':
+                    return value
+        return ''
+    
+    def parse_row(row) -> Optional[Dict]:
+        """Company record for one CSV row, or None if the row is filtered out"""
+        company_name = get_value(row, 'company_name')
+        founder_email = get_value(row, 'founder_email')
+        founder_name = get_value(row, 'founder_name')
+        
+        # If Full Name not found, try combining First Name + Last Name (YC CSV format)
+        if not founder_name:
+            first_name = get_value(row, 'first_name')
+            last_name = get_value(row, 'last_name')
+            if first_name or last_name:
+                founder_name = f"{first_name} {last_name}".strip()
+        
+        # Filter: Only include ACTIVE companies if status column exists
+        # If no status column, include all companies
+        status = get_value(row, 'status')
+        if status and status.upper() != 'ACTIVE':
+            logging.debug(f"Skipping {company_name} - Status is {status}, not ACTIVE")
+            return None
+        
+        # Validate required fields
+        if not (founder_email and '@' in founder_email and company_name):
+            logging.debug(f"Skipping row - missing email or company name: {company_name[:50] if company_name else 'N/A'}")
+            return None
+        
+        return {
+            'company_name': company_name,
+            'founder_email': founder_email,
+            'founder_name': founder_name,
+            'website': get_value(row, 'website'),
+            'industry': get_value(row, 'industry') or 'Technology',
+            'notes': get_value(row, 'notes')
+        }
+    
+    rows = 0
+    try:
+        for row in reader:
+            rows += 1
+            if counts is not None:
+                counts['rows'] = rows
+            sampled = rows % CSV_METRICS_SAMPLE_EVERY == 0
+            started = time.perf_counter() if sampled else 0.0
+            company = parse_row(row)
+            if sampled:
+                observe_stage('csv_parse', time.perf_counter() - started)
+            if company is not None:
+                yield company
+    finally:
+        CSV_ROWS.inc(rows)
+
+
+def format_position(n: int, total: Optional[int]) -> str:
+    """'n/total' when the total is known, otherwise just 'n'"""
+    return f"{n}/{total}" if total else str(n)
+
+class RunStopped(Exception):
+    """Raised inside run() to abandon a rate-limit wait once stop_event is set"""
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('email_automation.log'),
-        logging.StreamHandler()
-    ]
-)
 
 class EmailAutomation:
     def __init__(self, config_file='config.json'):
@@ -32,6 +168,23 @@ class EmailAutomation:
         self.sent_count = 0
         self.failed_count = 0
         self.results = []
+        self._sent_index = None
+        self._journal = None
+        self._transport = None
+        self._recipient_cache = None
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{id(self):x}"
+        self._lock = threading.Lock()
+        self.rate_limited = False
+        self.resume_in: Optional[float] = None  # After a run stopped by a sending limit: seconds until it lifts
+        self.checkpoint_offset = 0  # Companies before this offset have all been processed
+        self._completed_offsets = set()
+        self._failed_past_checkpoint = set()  # Offsets counted in failed_count that a resume would try again
+        # Lower-cased addresses handed to a worker during run(), so a repeated row is not sent again while the
+        # first send is still in flight (the sent index only learns about it once that send is recorded)
+        self._claimed_emails = set()
+        self._retries: Optional[RetryQueue] = None  # Recipients waiting for another attempt during run()
+        # Set (e.g. by a worker shutting down) to make run() finish in-flight sends and return early
+        self.stop_event = threading.Event()
         
     def load_config(self, config_file: str) -> Dict:
         """Load configuration from JSON file"""
@@ -56,137 +209,114 @@ class EmailAutomation:
             logging.warning(f"Created default config file: {config_file}. Please update it with your details.")
             return default_config
     
+    def get_sent_index(self) -> SentEmailIndex:
+        """Open the persistent sent-recipient index, importing any new results files once"""
+        if self._sent_index is None:
+            self._sent_index = SentEmailIndex(self.config.get('sent_index_db', 'sent_emails.db'))
+            self._sent_index.import_results_files()
+        return self._sent_index
+    
+    def get_journal(self) -> SendJournal:
+        """Open the append-only send journal"""
+        if self._journal is None:
+            self._journal = SendJournal(
+                self.config.get('journal_dir', 'journal'),
+                max_bytes=int(self.config.get('journal_max_bytes', 10 * 1024 * 1024))
+            )
+        return self._journal
+    
+    def get_transport(self) -> Transport:
+        """Delivery backend selected by the `transport` config key (see transports.py)"""
+        with self._lock:
+            if self._transport is None:
+                self._transport = create_transport(self.config)
+            return self._transport
+    
     def load_sent_emails(self, include_dry_run: bool = True) -> set:
         """Load list of already sent emails to avoid duplicates"""
-        sent_emails = set()
-        import glob
-        result_files = glob.glob('results_*.csv')
-        
-        for file in result_files:
-            try:
-                with open(file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        status = row.get('status', '').lower()
-                        # Include both 'sent' and 'dry_run' emails only if include_dry_run is True
-                        if status == 'sent' or (include_dry_run and status == 'dry_run'):
-                            email = row.get('email', '').strip()
-                            if email:
-                                sent_emails.add(email.lower())
-            except Exception as e:
-                logging.debug(f"Error reading result file {file}: {e}")
-                pass
+        with time_stage('load_sent_emails'):
+            return self.get_sent_index().emails(include_dry_run=include_dry_run)
+    
+    def get_recipient_cache(self) -> Optional[RecipientCache]:
+        """The parsed recipient list cache (None when recipient_cache_db is set to an empty value)"""
+        path = self.config.get('recipient_cache_db', DEFAULT_CACHE_PATH)
+        if self._recipient_cache is None and path:
+            self._recipient_cache = RecipientCache(path)
+        return self._recipient_cache
+    
+    def _cached_list(self, csv_file: str) -> Optional[int]:
+        """Id of csv_file in the recipient cache, or None to read the CSV directly"""
+        cache = self.get_recipient_cache()
+        if cache is None:
+            return None
+        try:
+            with time_stage('list_import'):
+                return cache.get_list(csv_file, parse_companies)
+        except FileNotFoundError:
+            return None  # Reported by iter_companies_from_csv
+        except Exception as e:
+            logging.warning(f"Recipient cache unavailable for {csv_file}, reading the CSV instead: {e}")
+            return None
+    
+    def iter_companies(self, csv_file: str, skip_sent: bool = True, include_dry_run: bool = True,
+                       offset: int = 0, limit: int = 0) -> Iterator[Dict]:
+        """
+        Companies [offset, limit) of a list (limit 0 = to the end), from the recipient cache when possible
         
-        return sent_emails
+        Args:
+            skip_sent: Leave out addresses in the sent index (before offset and limit apply)
+        """
+        list_id = self._cached_list(csv_file)
+        if list_id is None:
+            companies = self.iter_companies_from_csv(csv_file, skip_sent=skip_sent, include_dry_run=include_dry_run)
+            return islice(companies, offset, limit if limit and limit > 0 else None)
+        sent_index = self.get_sent_index() if skip_sent else None
+        if sent_index is not None:
+            logging.info(f"Sent index holds {sent_index.count()} already processed emails. Will skip them.")
+        return self.get_recipient_cache().iter_companies(
+            list_id, offset, limit, exclude_db=sent_index.db_path if sent_index is not None else None,
+            include_dry_run=include_dry_run
+        )
     
-    def load_companies_from_csv(self, csv_file: str, skip_sent: bool = True, include_dry_run: bool = True) -> List[Dict]:
-        """Load company data from CSV file with flexible column mapping"""
-        companies = []
-        sent_emails = self.load_sent_emails(include_dry_run=include_dry_run) if skip_sent else set()
+    def count_companies(self, csv_file: str, limit: int = 0) -> int:
+        """Companies in a list (at most limit), including ones already sent to"""
+        list_id = self._cached_list(csv_file)
+        if list_id is None:
+            companies = self.iter_companies_from_csv(csv_file, skip_sent=False)
+            return sum(1 for _ in islice(companies, limit if limit and limit > 0 else None))
+        return self.get_recipient_cache().count(list_id, limit)
+    
+    def iter_companies_from_csv(self, csv_file: str, skip_sent: bool = True, include_dry_run: bool = True) -> Iterator[Dict]:
+        """Stream company records straight from a CSV file (see iter_companies for the cached path)"""
+        sent_index = self.get_sent_index() if skip_sent else None
         
-        if skip_sent and sent_emails:
-            logging.info(f"Found {len(sent_emails)} already processed emails (including dry runs). Will skip them.")
+        if sent_index is not None:
+            logging.info(f"Sent index holds {sent_index.count()} already processed emails. Will skip them.")
         
         try:
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                # Get all available column names
-                available_columns = reader.fieldnames or []
-                
-                # Flexible column mapping - try multiple possible column names
-                def get_column_value(row, possible_names):
-                    """Try to get value from row using multiple possible column names"""
-                    for name in possible_names:
-                        if name in row:
-                            value = row.get(name, '').strip()
-                            if value and value.upper() != 'TBD':
-                                return value
-                    return ''
+            for n, company in enumerate(read_companies(csv_file), 1):
+                # Skip if already sent
+                if sent_index is not None:
+                    sampled = n % CSV_METRICS_SAMPLE_EVERY == 0
+                    started = time.perf_counter() if sampled else 0.0
+                    already_sent = sent_index.contains(company['founder_email'], include_dry_run=include_dry_run)
+                    if sampled:
+                        observe_stage('dedup', time.perf_counter() - started)
+                    if already_sent:
+                        logging.debug(f"Skipping {company['company_name']} - already sent to {company['founder_email']}")
+                        continue
                 
-                for row in reader:
-                    # Map company name (try multiple variations - YC CSV uses "Organization Name")
-                    company_name = get_column_value(row, [
-                        'Organization Name', 'organization_name', 'organization name',
-                        'company_name', 'Company', 'company', 'Company Name'
-                    ])
-                    
-                    # Map email (try multiple variations - YC CSV uses "Email")
-                    founder_email = get_column_value(row, [
-                        'Email', 'email',
-                        'founder_email', 'Founder Email',
-                        'contact_email', 'Contact Email'
-                    ])
-                    
-                    # Map founder name (try multiple variations - YC CSV uses "Full Name")
-                    founder_name = get_column_value(row, [
-                        'Full Name', 'full_name', 'full name',
-                        'founder_name', 'Founder Name',
-                        'Name', 'name'
-                    ])
-                    
-                    # If Full Name not found, try combining First Name + Last Name (YC CSV format)
-                    if not founder_name:
-                        first_name = get_column_value(row, ['First Name', 'first_name', 'First_Name', 'First name'])
-                        last_name = get_column_value(row, ['Last Name', 'last_name', 'Last_Name', 'Last name'])
-                        if first_name or last_name:
-                            founder_name = f"{first_name} {last_name}".strip()
-                    
-                    # Map website (try multiple variations - YC CSV uses "Organization Domain")
-                    website = get_column_value(row, [
-                        'Organization Domain', 'organization_domain', 'organization domain',
-                        'website', 'Website', 'domain', 'Domain', 'url', 'URL'
-                    ])
-                    
-                    # Map industry (optional)
-                    industry = get_column_value(row, [
-                        'industry', 'Industry', 'sector', 'Sector', 'category', 'Category'
-                    ]) or 'Technology'
-                    
-                    # Map notes (optional - YC CSV uses "Batch")
-                    notes = get_column_value(row, [
-                        'Batch', 'batch',
-                        'notes', 'Notes', 'description', 'Description'
-                    ])
-                    
-                    # Map status (for filtering) - YC CSV uses "Status" column
-                    status = get_column_value(row, [
-                        'Status', 'status', 'STATUS'
-                    ])
-                    
-                    # Filter: Only include ACTIVE companies if status column exists
-                    # If no status column, include all companies
-                    if status:
-                        if status.upper() != 'ACTIVE':
-                            logging.debug(f"Skipping {company_name} - Status is {status}, not ACTIVE")
-                            continue
-                    
-                    # Validate required fields
-                    if founder_email and '@' in founder_email and company_name:
-                        # Skip if already sent
-                        if skip_sent and founder_email.lower() in sent_emails:
-                            logging.debug(f"Skipping {company_name} - already sent to {founder_email}")
-                            continue
-                        
-                        company_data = {
-                            'company_name': company_name,
-                            'founder_email': founder_email,
-                            'founder_name': founder_name,
-                            'website': website,
-                            'industry': industry,
-                            'notes': notes
-                        }
-                        companies.append(company_data)
-                    else:
-                        logging.debug(f"Skipping row - missing email or company name: {company_name[:50] if company_name else 'N/A'}")
-            
-            logging.info(f"Loaded {len(companies)} companies from {csv_file}")
-            return companies
+                yield company
         except FileNotFoundError:
             logging.error(f"CSV file not found: {csv_file}")
-            return []
         except Exception as e:
             logging.error(f"Error reading CSV file: {e}")
-            return []
+    
+    def load_companies_from_csv(self, csv_file: str, skip_sent: bool = True, include_dry_run: bool = True) -> List[Dict]:
+        """Load company data from CSV file with flexible column mapping"""
+        companies = list(self.iter_companies(csv_file, skip_sent=skip_sent, include_dry_run=include_dry_run))
+        logging.info(f"Loaded {len(companies)} companies from {csv_file}")
+        return companies
     
     def load_email_template(self, template_file: str = 'email_template.txt') -> str:
         """Load email template from file"""
@@ -216,98 +346,282 @@ This email was sent via automated cold email tool.
             logging.info(f"Created default email template: {template_file}")
             return default_template
     
-    def personalize_email(self, template: str, company_data: Dict, config: Dict) -> str:
-        """Personalize email template with company data"""
+    def template_values(self, company_data: Dict, config: Dict) -> Dict[str, str]:
+        """Placeholder values for one recipient"""
         founder_name = company_data.get('founder_name', 'Founder')
         if not founder_name:
             founder_name = company_data.get('company_name', 'there')
         
-        replacements = {
-            'company_name': company_data.get('company_name', ''),
-            'founder_name': founder_name,
-            'founder_email': company_data.get('founder_email', ''),
-            'website': company_data.get('website', ''),
-            'industry': company_data.get('industry', 'Technology'),
-            'sender_name': config.get('sender_name', 'Your Name'),
-            'github_profile': config.get('github_profile', 'https://github.com/yourusername')
+        return {
+            'company_name': str(company_data.get('company_name', '')),
+            'founder_name': str(founder_name),
+            'founder_email': str(company_data.get('founder_email', '')),
+            'website': str(company_data.get('website', '')),
+            'industry': str(company_data.get('industry', 'Technology')),
+            'sender_name': str(config.get('sender_name', 'Your Name')),
+            'github_profile': str(config.get('github_profile', 'https://github.com/yourusername'))
         }
-        
-        personalized = template
-        for key, value in replacements.items():
-            personalized = personalized.replace(f'{{{key}}}', str(value))
-        
-        return personalized
     
-    def send_email(self, to_email: str, subject: str, body: str, config: Dict) -> bool:
-        """Send email via SMTP"""
+    def personalize_email(self, template: str, company_data: Dict, config: Dict, values: Optional[Dict[str, str]] = None) -> str:
+        """Personalize email template with company data"""
+        if values is None:
+            values = self.template_values(company_data, config)
+        return compile_template(template).render(values)
+    
+    def send_email(self, to_email: str, subject: str, body: str, config: Dict,
+                   account: Optional[SenderAccount] = None) -> bool:
+        """Send email through the configured transport, or through account's when rotating senders"""
+        return self.deliver_email(to_email, subject, body, config, account) is None
+    
+    def deliver_email(self, to_email: str, subject: str, body: str, config: Dict,
+                      account: Optional[SenderAccount] = None) -> Optional[Exception]:
+        """Like send_email, but returns the error that stopped the send (None once it was sent)"""
+        if account is not None:
+            config = account.config
         try:
-            # Validate config has required fields
-            if not config.get('sender_email'):
-                logging.error("Missing sender_email in config")
-                return False
-            if not config.get('sender_password'):
-                logging.error("Missing sender_password in config")
-                return False
-            
-            # Create message
-            msg = MIMEMultipart()
-            sender_name = config.get('sender_name', '')
-            sender_email = config['sender_email']
-            msg['From'] = f"{sender_name} <{sender_email}>" if sender_name else sender_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body to email
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Connect to SMTP server
-            smtp_server = config.get('smtp_server', 'smtp.gmail.com')
-            smtp_port = int(config.get('smtp_port', 587))
-            
-            logging.info(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
-            
-            # Use SSL (port 465) or TLS (port 587) based on port
-            if smtp_port == 465:
-                # Use SMTP_SSL for port 465
-                import smtplib
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
-                logging.info(f"✅ Connected to SMTP server using SSL (port 465)")
-            else:
-                # Use SMTP with STARTTLS for port 587
-                server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
-                logging.info(f"✅ Connected to SMTP server")
-                logging.info(f"Starting TLS...")
-                server.starttls()
-                logging.info(f"✅ TLS started")
-            
-            logging.info(f"Logging in as {sender_email}")
-            server.login(sender_email, config['sender_password'])
-            logging.info(f"✅ Login successful!")
-            
-            # Send email
-            text = msg.as_string()
-            logging.info(f"Sending email to {to_email}")
-            server.sendmail(sender_email, to_email, text)
-            server.quit()
-            
-            logging.info(f"✅ Email sent successfully to {to_email}")
-            return True
+            with time_stage('deliver'):
+                (account or self.get_transport()).send(to_email, subject, body)
+            if not structured_logging():  # The send_result line covers it
+                logging.info(f"✅ Email sent successfully to {to_email}")
+            return None
             
+        except TransportError as e:
+            logging.error(f"❌ {e}")
+            return e
         except smtplib.SMTPAuthenticationError as e:
             logging.error(f"❌ SMTP Authentication failed for {config.get('sender_email', 'unknown')}: {e}")
             logging.error("Check your email and app password. Make sure you're using a Gmail App Password, not your regular password.")
-            return False
+            return e
         except smtplib.SMTPException as e:
             logging.error(f"❌ SMTP error sending email to {to_email}: {e}")
-            return False
+            return e
         except Exception as e:
             logging.error(f"❌ Error sending email to {to_email}: {e}")
             import traceback
             logging.error(traceback.format_exc())
-            return False
+            return e
+    
+    def get_send_concurrency(self, config: Dict) -> int:
+        """Number of parallel sends allowed for the configured provider (per sender account)"""
+        if config.get('max_concurrent_sends'):
+            return max(1, int(config['max_concurrent_sends']))
+        accounts = sum(1 for entry in config.get('sender_accounts') or [] if entry.get('sender_email'))
+        return PROVIDER_CONCURRENCY.get(get_provider(config), 1) * max(1, accounts)
+    
+    def process_company(self, i: int, total: Optional[int], company: Dict, template: str, dry_run: bool,
+                        skip_sent: bool, include_dry_run: bool, account: Optional[SenderAccount] = None) -> Dict:
+        """Personalize and send (or dry-run) one email. Runs on a worker thread."""
+        # Double-check: Verify email hasn't been sent before (real-time check)
+        # Only check if skip_sent is True
+        if skip_sent:
+            with time_stage('dedup'):
+                already_sent = self.get_sent_index().contains(company['founder_email'], include_dry_run=include_dry_run)
+            if already_sent:
+                logging.warning(f"Skipping {company['company_name']} - Email {company['founder_email']} was already sent (duplicate detected)")
+                return {'status': 'skipped_duplicate'}
+        
+        # Personalize email (values are shared by body and subject)
+        with time_stage('personalize'):
+            values = self.template_values(company, self.config)
+            email_body = self.personalize_email(template, company, self.config, values)
+            subject = self.personalize_email(
+                self.config.get('email_subject_template', 'Partnership Opportunity - {company_name}'),
+                company,
+                self.config,
+                values
+            )
+        
+        if dry_run:
+            if not structured_logging():
+                logging.info(f"[DRY RUN] Would send email {format_position(i, total)}:")
+                logging.info(f"  To: {company['founder_email']}")
+                logging.info(f"  Subject: {subject}")
+                logging.info(f"  Company: {company['company_name']}")
+            return {'status': 'dry_run', 'subject': subject}
+        
+        # Send email
+        error = self.deliver_email(
+            company['founder_email'],
+            subject,
+            email_body,
+            self.config,
+            account
+        )
+        if error is None:
+            return {'status': 'sent', 'subject': subject}
+        # Temporary failures may be retried later in the run (see _record_outcome)
+        return {'status': 'failed', 'subject': subject, 'retry': classify_failure(error) == TRANSIENT}
+    
+    def process_batch(self, batch: List, template: str, skip_sent: bool, include_dry_run: bool) -> List[Dict]:
+        """
+        Send one templated message to a batch of (i, company) pairs with a single transport call.
+        Runs on a worker thread and returns one outcome per company, in order.
+        """
+        subject_template = self.config.get('email_subject_template', 'Partnership Opportunity - {company_name}')
+        used = compile_template(template).placeholders | compile_template(subject_template).placeholders
+        outcomes: List[Optional[Dict]] = [None] * len(batch)
+        recipients, positions = [], []
+        for position, (i, company) in enumerate(batch):
+            if skip_sent:
+                with time_stage('dedup'):
+                    already_sent = self.get_sent_index().contains(company['founder_email'], include_dry_run=include_dry_run)
+                if already_sent:
+                    logging.warning(f"Skipping {company['company_name']} - Email {company['founder_email']} was already sent (duplicate detected)")
+                    outcomes[position] = {'status': 'skipped_duplicate'}
+                    continue
+            with time_stage('personalize'):
+                values = self.template_values(company, self.config)
+                outcomes[position] = {'subject': self.personalize_email(subject_template, company, self.config, values)}
+                recipients.append((company['founder_email'], {f'{{{name}}}': values[name] for name in used}))
+            positions.append(position)
+        
+        if recipients:
+            try:
+                with time_stage('deliver_batch'):
+                    accepted = self.get_transport().send_batch(recipients, subject_template, template)
+            except TransportError as e:
+                logging.error(f"❌ {e}")
+                accepted = [False] * len(recipients)
+            for position, ok in zip(positions, accepted):
+                outcomes[position]['status'] = 'sent' if ok else 'failed'
+        return outcomes
+    
+    def record_result(self, company: Dict, status: str) -> Dict:
+        """Append a result and update counters. Safe to call from several threads."""
+        result = {
+            'company': company['company_name'],
+            'email': company['founder_email'],
+            'status': status,
+            'timestamp': datetime.now().isoformat()
+        }
+        with self._lock:
+            if status == 'sent':
+                self.sent_count += 1
+            elif status in ('failed', 'skipped_duplicate'):
+                self.failed_count += 1
+            self.results.append(result)
+        MESSAGES.inc(status=status)
+        with time_stage('record'):
+            self.get_journal().append(dict(result, run_id=self.run_id))
+            if status in ('sent', 'dry_run'):
+                self.get_sent_index().add(company['founder_email'], status)
+        return result
+    
+    def _mark_completed(self, offset: int, failed: bool = False):
+        """Advance checkpoint_offset past every company that has finished, in order"""
+        with self._lock:
+            self._completed_offsets.add(offset)
+            if failed:
+                self._failed_past_checkpoint.add(offset)
+            while self.checkpoint_offset in self._completed_offsets:
+                self._completed_offsets.remove(self.checkpoint_offset)
+                self._failed_past_checkpoint.discard(self.checkpoint_offset)
+                self.checkpoint_offset += 1
+    
+    def checkpoint_counts(self) -> Tuple[int, int, int]:
+        """
+        (sent, failed, checkpoint_offset) to save for a resume from checkpoint_offset.
+        Failures past the checkpoint are left out, since the resume tries those companies again; sends
+        past it are kept, since the resume skips their recipients (skip_emails).
+        """
+        with self._lock:
+            return self.sent_count, self.failed_count - len(self._failed_past_checkpoint), self.checkpoint_offset
     
-    def run(self, csv_file: str = None, dry_run: bool = False, skip_sent: bool = True, include_dry_run: bool = None, on_progress: Optional[Callable[[int, int, Dict], None]] = None):
-        """Run the email automation"""
+    def _handle_outcome(self, future, i: int, company: Dict, total: Optional[int], dry_run: bool,
+                        on_progress: Optional[Callable[[int, int, Dict], None]],
+                        on_result: Optional[Callable[[Dict], None]] = None):
+        """Record a finished send and notify the caller (runs on the dispatching thread)"""
+        try:
+            outcome = future.result()
+        except Exception as e:
+            logging.error(f"Error processing company {company['company_name']}: {e}")
+            # Recorded like any failed send so the result, journal and checkpoint stay complete
+            outcome = {'status': 'failed'}
+        self._record_outcome(outcome, i, company, total, dry_run, on_progress, on_result)
+    
+    def _handle_batch_outcome(self, future, batch: List, total: Optional[int], dry_run: bool,
+                              on_progress: Optional[Callable[[int, int, Dict], None]],
+                              on_result: Optional[Callable[[Dict], None]] = None):
+        """Record every recipient of a finished batch send (runs on the dispatching thread)"""
+        try:
+            outcomes = future.result()
+        except Exception as e:
+            logging.error(f"Error processing batch of {len(batch)} companies: {e}")
+            outcomes = [{'status': 'failed'}] * len(batch)
+        for (i, company), outcome in zip(batch, outcomes):
+            self._record_outcome(outcome, i, company, total, dry_run, on_progress, on_result)
+    
+    def _record_outcome(self, outcome: Dict, i: int, company: Dict, total: Optional[int], dry_run: bool,
+                        on_progress: Optional[Callable[[int, int, Dict], None]],
+                        on_result: Optional[Callable[[Dict], None]] = None):
+        status = outcome['status']
+        if outcome.get('retry') and self._retries is not None:
+            delay = self._retries.schedule(i, (i, company))
+            if delay is not None:
+                RETRIES.inc()
+                logging.warning(f"Temporary failure sending to {company['founder_email']}; attempt "
+                                f"{self._retries.attempts(i)} of {self._retries.max_attempts} in {delay:.0f}s")
+                return
+        result = self.record_result(company, status)
+        if status == 'failed':
+            # A later row with the same address gets its own attempt
+            self._claimed_emails.discard(company['founder_email'].lower())
+        self._mark_completed(i - 1, failed=status in ('failed', 'skipped_duplicate'))
+        if on_result is not None:
+            try:
+                on_result(result)
+            except Exception as e:
+                logging.error(f"Result callback failed for {company['founder_email']}: {e}")
+        structured = structured_logging()
+        if structured:
+            # One machine-readable line per recipient instead of the banners below
+            logging.info('send_result', extra={
+                'event': 'send_result', 'run_id': self.run_id, 'status': status,
+                'email': company['founder_email'], 'company': company['company_name'],
+                'subject': outcome.get('subject'), 'position': i,
+            })
+        if status == 'skipped_duplicate' or dry_run:
+            return
+        
+        if not structured and status == 'sent':
+            # Notify user after each email is sent
+            print(f"\n{'='*60}")
+            print(f"✅ EMAIL SENT SUCCESSFULLY!")
+            print(f"   Email #{format_position(self.sent_count, total)}")
+            print(f"   To: {company['founder_email']}")
+            print(f"   Company: {company['company_name']}")
+            print(f"   Subject: {outcome['subject'][:50]}...")
+            print(f"{'='*60}\n")
+        elif not structured:
+            # Notify user about failed email
+            print(f"\n{'='*60}")
+            print(f"❌ EMAIL FAILED!")
+            print(f"   Email #{format_position(i, total)}")
+            print(f"   To: {company['founder_email']}")
+            print(f"   Company: {company['company_name']}")
+            print(f"{'='*60}\n")
+        
+        # Progress callback for realtime UI updates
+        if on_progress is not None:
+            try:
+                on_progress(self.sent_count, self.failed_count, company)
+            except Exception as _:
+                pass
+    
+    def run(self, csv_file: str = None, dry_run: bool = False, skip_sent: bool = True, include_dry_run: bool = None, on_progress: Optional[Callable[[int, int, Dict], None]] = None, limit: int = 0,
+            start_offset: int = 0, skip_emails: Optional[set] = None, on_result: Optional[Callable[[Dict], None]] = None):
+        """
+        Run the email automation, sending while the CSV is still being read
+        
+        Args:
+            limit: Process at most this many companies in total (0 = no limit)
+            start_offset: Resume from this company offset (see checkpoint_offset)
+            skip_emails: Lower-cased addresses already delivered by an earlier attempt of the same run
+            on_result: Called on the dispatching thread with each recorded result
+        
+        Raises:
+            TemplateError: The body or subject template has unknown placeholders (raised before anything is sent)
+        """
         csv_file = csv_file or self.config.get('csv_file', 'companies.csv')
         template = self.load_email_template()
         
@@ -317,127 +631,237 @@ This email was sent via automated cold email tool.
         if include_dry_run is None:
             include_dry_run = True  # Skip dry_run emails to prevent duplicates
         
-        companies = self.load_companies_from_csv(csv_file, skip_sent=skip_sent, include_dry_run=include_dry_run)
+        # Compile templates up front so unknown placeholders stop the run before anything is sent
+        try:
+            compile_template(template)
+            compile_template(self.config.get('email_subject_template', 'Partnership Opportunity - {company_name}'))
+        except TemplateError as e:
+            logging.error(f"Invalid email template: {e}")
+            raise
+        
+        companies = self.iter_companies(csv_file, skip_sent=skip_sent, include_dry_run=include_dry_run,
+                                        offset=start_offset, limit=limit)
+        skip_emails = skip_emails or set()
+        self.checkpoint_offset = start_offset
+        self._completed_offsets = set()
+        self._failed_past_checkpoint = set()
+        self._claimed_emails = set()
         
-        if not companies:
+        first = next(companies, None)
+        if first is None:
             logging.error("No companies to process. Please check your CSV file.")
             return
+        companies = chain([first], companies)
         
         logging.info(f"Starting email automation. Dry run: {dry_run}")
-        logging.info(f"Will process {len(companies)} companies")
+        logging.info(f"Streaming companies from {csv_file}" + (f" (limit {limit})" if limit else ""))
+        if start_offset or skip_emails:
+            logging.info(f"Resuming at company #{start_offset + 1}, skipping {len(skip_emails)} already delivered")
         
         if dry_run:
             logging.info("DRY RUN MODE - No emails will be sent")
         
-        for i, company in enumerate(companies, 1):
+        max_workers = 1 if dry_run else self.get_send_concurrency(self.config)
+        logging.info(f"Sending with up to {max_workers} parallel worker(s)")
+        # Keep one pooled SMTP session per worker unless configured otherwise
+        self.config.setdefault('smtp_pool_size', max_workers)
+        
+        batch_size = 0  # Recipients per transport call when the transport supports batches
+        # Several sender accounts: each recipient goes to whichever account has budget (see sender_accounts.py)
+        senders = None if dry_run else create_rotation(self.config)
+        if senders is not None:
+            logging.info(f"Rotating across {len(senders.accounts)} sender account(s) via the "
+                         f"'{transport_name(self.config)}' transport")
+        elif not dry_run:
+            logging.info(f"Delivering via the '{transport_name(self.config)}' transport")
             try:
-                # Personalize email
-                email_body = self.personalize_email(template, company, self.config)
-                subject = self.personalize_email(
-                    self.config.get('email_subject_template', 'Partnership Opportunity - {company_name}'),
-                    company,
-                    self.config
-                )
-                
-                # Double-check: Verify email hasn't been sent before (real-time check)
-                # Only check if skip_sent is True
-                if skip_sent:
-                    current_sent_emails = self.load_sent_emails(include_dry_run=include_dry_run if include_dry_run is not None else True)
-                    if company['founder_email'].lower() in current_sent_emails:
-                        logging.warning(f"Skipping {company['company_name']} - Email {company['founder_email']} was already sent (duplicate detected)")
-                        self.failed_count += 1
-                        self.results.append({
-                            'company': company['company_name'],
-                            'email': company['founder_email'],
-                            'status': 'skipped_duplicate',
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        continue
-                
-                if dry_run:
-                    logging.info(f"[DRY RUN] Would send email {i}/{len(companies)}:")
-                    logging.info(f"  To: {company['founder_email']}")
-                    logging.info(f"  Subject: {subject}")
-                    logging.info(f"  Company: {company['company_name']}")
-                    self.results.append({
-                        'company': company['company_name'],
-                        'email': company['founder_email'],
-                        'status': 'dry_run',
-                        'timestamp': datetime.now().isoformat()
-                    })
+                batch_size = self.get_transport().batch_size
+            except TransportError as e:
+                logging.error(f"❌ {e}")
+        # A partly filled batch goes out once its oldest recipient has waited this long
+        batch_max_wait = float(self.config.get('sendgrid_batch_max_wait', 2.0))
+        if batch_size:
+            logging.info(f"Sending in batches of up to {batch_size} recipients")
+        
+        # Pace sends with token buckets shared by every campaign using this sender account
+        rate_limiter = None if dry_run or senders is not None else get_rate_limiter(self.config)
+        max_wait = float(self.config.get('max_rate_limit_wait', 600))
+        self.rate_limited = False
+        self.resume_in = None
+        # Temporary failures are retried later in this run while the loop carries on
+        self._retries = None if dry_run else RetryQueue.from_config(self.config)
+        retries = self._retries
+        
+        total = None  # Unknown while the CSV is still being streamed
+        processed = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='email-send') as executor:
+            pending = {}  # future -> (i, company), or a list of them for a batch send
+            batch = []
+            batch_started = 0.0
+            
+            def handle(finished):
+                job = pending.pop(finished)
+                if isinstance(job, list):
+                    self._handle_batch_outcome(finished, job, total, dry_run, on_progress, on_result)
                 else:
-                    # Send email
-                    success = self.send_email(
-                        company['founder_email'],
-                        subject,
-                        email_body,
-                        self.config
-                    )
-                    
-                    if success:
-                        self.sent_count += 1
-                        self.results.append({
-                            'company': company['company_name'],
-                            'email': company['founder_email'],
-                            'status': 'sent',
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        # Notify user after each email is sent
-                        print(f"\n{'='*60}")
-                        print(f"✅ EMAIL SENT SUCCESSFULLY!")
-                        print(f"   Email #{self.sent_count}/{len(companies)}")
-                        print(f"   To: {company['founder_email']}")
-                        print(f"   Company: {company['company_name']}")
-                        print(f"   Subject: {subject[:50]}...")
-                        print(f"{'='*60}\n")
+                    self._handle_outcome(finished, *job, total, dry_run, on_progress, on_result)
+            
+            def submit_batch():
+                if batch:
+                    future = executor.submit(self.process_batch, batch.copy(), template, skip_sent, include_dry_run)
+                    pending[future] = batch.copy()
+                    batch.clear()
+            
+            def wait_for_budget(seconds: float):
+                """Record finished sends while waiting for rate-limit budget"""
+                if self.stop_event.is_set():
+                    raise RunStopped()
+                if batch and time.monotonic() + seconds - batch_started >= batch_max_wait:
+                    submit_batch()
+                if not pending:
+                    time.sleep(seconds)
+                    return
+                done, _ = wait(pending, timeout=seconds, return_when=FIRST_COMPLETED)
+                for finished in done:
+                    handle(finished)
+            
+            def dispatch(i: int, company: Dict, retry: bool = False) -> bool:
+                """Wait for sending budget and hand company to a worker; False once the limit is reached"""
+                nonlocal processed, batch_started
+                if self.stop_event.is_set():
+                    return False
+                if not retry and company['founder_email'].lower() in self._claimed_emails:
+                    logging.warning(f"Skipping {company['company_name']} - Email {company['founder_email']} "
+                                    "appears earlier in this run (duplicate detected)")
+                    self._record_outcome({'status': 'skipped_duplicate'}, i, company, total, dry_run,
+                                         on_progress, on_result)
+                    return True
+                account = None
+                try:
+                    if senders is not None:
+                        waited_from = time.perf_counter()
+                        account = senders.acquire(max_wait=max_wait, wait_fn=wait_for_budget)
+                        observe_stage('rate_limit_wait', time.perf_counter() - waited_from)
+                        acquired = account is not None
+                    elif rate_limiter is not None:
+                        waited_from = time.perf_counter()
+                        acquired = rate_limiter.acquire(max_wait=max_wait, wait_fn=wait_for_budget)
+                        observe_stage('rate_limit_wait', time.perf_counter() - waited_from)
                     else:
-                        self.failed_count += 1
-                        self.results.append({
-                            'company': company['company_name'],
-                            'email': company['founder_email'],
-                            'status': 'failed',
-                            'timestamp': datetime.now().isoformat()
-                        })
-                        # Notify user about failed email
-                        print(f"\n{'='*60}")
-                        print(f"❌ EMAIL FAILED!")
-                        print(f"   Email #{i}/{len(companies)}")
-                        print(f"   To: {company['founder_email']}")
-                        print(f"   Company: {company['company_name']}")
-                        print(f"{'='*60}\n")
-                
-                # Progress callback for realtime UI updates
-                if on_progress is not None and not dry_run:
-                    try:
-                        on_progress(self.sent_count, self.failed_count, company)
-                    except Exception as _:
-                        pass
-
-                # Delay between emails to avoid rate limiting
-                if i < len(companies) and not dry_run:
-                    delay = self.config.get('delay_between_emails', 30)
-                    logging.info(f"Waiting {delay} seconds before next email...")
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                logging.error(f"Error processing company {company['company_name']}: {e}")
-                self.failed_count += 1
+                        acquired = True
+                except RunStopped:
+                    return False
+                if not acquired:
+                    self.rate_limited = True
+                    self.resume_in = (senders or rate_limiter).next_send_in()
+                    logging.warning(f"Sending limit reached - stopping after {processed} companies "
+                                    f"(next send allowed in {self.resume_in:.0f}s)")
+                    # A refused retry is recorded as failed with the other leftovers below, or now if it has
+                    # no attempts left to be queued with
+                    if retry and retries.schedule(i, (i, company)) is None:
+                        self._record_outcome({'status': 'failed'}, i, company, total, dry_run, on_progress, on_result)
+                    return False
+                if not retry:
+                    processed += 1
+                    self._claimed_emails.add(company['founder_email'].lower())
+                if batch_size:
+                    if not batch:
+                        batch_started = time.monotonic()
+                    batch.append((i, company))
+                    if len(batch) < batch_size and time.monotonic() - batch_started < batch_max_wait:
+                        return True
+                    submit_batch()
+                else:
+                    future = executor.submit(
+                        self.process_company, i, total, company, template, dry_run, skip_sent, include_dry_run, account
+                    )
+                    pending[future] = (i, company)
+                # Keep a bounded number of messages (or batches) in flight
+                if len(pending) >= max_workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for finished in done:
+                        handle(finished)
+                return True
+            
+            def dispatch_due_retries() -> bool:
+                while retries is not None:
+                    job = retries.pop_due()
+                    if job is None:
+                        break
+                    if not dispatch(*job, retry=True):
+                        return False
+                return True
+            
+            stopped = False
+            for i, company in enumerate(companies, start_offset + 1):
+                if self.stop_event.is_set():
+                    stopped = True
+                    break
+                if company['founder_email'].lower() in skip_emails:
+                    self._mark_completed(i - 1)
+                    continue
+                if not dispatch_due_retries() or not dispatch(i, company):
+                    stopped = True
+                    break
+            submit_batch()
+            # The list is done: keep going until no retry is waiting or in flight
+            while not stopped and retries is not None and (len(retries) or pending):
+                if not dispatch_due_retries():
+                    break
+                next_due = retries.next_due_in()
+                if pending:
+                    done, _ = wait(pending, timeout=next_due, return_when=FIRST_COMPLETED)
+                    for finished in done:
+                        handle(finished)
+                elif next_due and self.stop_event.wait(next_due):
+                    break
+            # Messages already handed to workers are always finished and recorded
+            submit_batch()
+            for finished in as_completed(list(pending)):
+                handle(finished)
+        
+        if retries is not None:
+            self._retries = None
+            leftovers = retries.drain()
+            if self.stop_event.is_set():
+                # Not recorded: the checkpoint stays before them, so resuming the run sends them again
+                if leftovers:
+                    logging.info(f"Stopped with {len(leftovers)} retries pending; they are picked up on resume")
+            else:
+                # Retries still waiting when the run stopped early count as failed
+                for i, company in leftovers:
+                    self._record_outcome({'status': 'failed'}, i, company, total, dry_run, on_progress, on_result)
+        
+        # Release pooled sessions / open files held by the transport(s)
+        if senders is not None:
+            logging.info(f"Sender accounts: {senders.get_stats()}")
+            senders.close()
+        if self._transport is not None:
+            logging.info(f"Transport '{self._transport.name}': {self._transport.get_stats()}")
+            self._transport.close()
+            self._transport = None
         
-        # Save results
-        self.save_results()
+        # Save results, then mark the run as finished in the journal
+        results_file = self.save_results()
+        journal = self.get_journal()
+        if results_file:
+            journal.append({'event': 'run_end', 'run_id': self.run_id, 'results_file': results_file})
+        journal.close()
+        self._journal = None
         
         # Print summary
         logging.info("\n" + "="*50)
         logging.info("Email Automation Summary")
         logging.info("="*50)
-        logging.info(f"Total companies processed: {len(companies)}")
+        logging.info(f"Total companies processed: {processed}")
         if not dry_run:
             logging.info(f"Emails sent successfully: {self.sent_count}")
             logging.info(f"Emails failed: {self.failed_count}")
         logging.info("="*50)
+        logging.info("Stage timings (this process so far):\n" + format_summary(summarize(REGISTRY.render())))
     
-    def save_results(self):
-        """Save results to CSV file"""
+    def save_results(self) -> Optional[str]:
+        """Save results to CSV file and return its name (None on error)"""
         results_file = f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         try:
             with open(results_file, 'w', newline='', encoding='utf-8') as f:
@@ -446,8 +870,10 @@ This email was sent via automated cold email tool.
                     writer.writeheader()
                     writer.writerows(self.results)
             logging.info(f"Results saved to {results_file}")
+            return results_file
         except Exception as e:
             logging.error(f"Error saving results: {e}")
+            return None
 
 
 def main():
@@ -458,11 +884,17 @@ def main():
     parser.add_argument('--csv', type=str, help='Path to CSV file with company data')
     parser.add_argument('--config', type=str, default='config.json', help='Path to config file')
     parser.add_argument('--dry-run', action='store_true', help='Dry run mode (no emails sent)')
+    parser.add_argument('--log-format', type=str, choices=['text', 'json'], default=None,
+                        help='Log format (default: LOG_FORMAT or text); json logs one line per recipient')
     
     args = parser.parse_args()
+    configure_logging(fmt=args.log_format, log_file='email_automation.log')
     
     automation = EmailAutomation(args.config)
-    automation.run(csv_file=args.csv, dry_run=args.dry_run)
+    try:
+        automation.run(csv_file=args.csv, dry_run=args.dry_run)
+    except TemplateError:
+        raise SystemExit(1)  # Already logged
 
 
 if __name__ == '__main__':
@@ -7,9 +7,11 @@ Shows email sending statistics and generates lists for resending
 import csv
 import os
 import glob
-from collections import defaultdict
 from datetime import datetime
 
+from send_journal import load_unfinished_results
+from stats_store import DEFAULT_STATS_PATH, StatsStore
+
 def load_all_results():
     """Load all results from result CSV files"""
     all_results = []
@@ -25,60 +27,38 @@ def load_all_results():
         except Exception as e:
             print(f"Error reading {file}: {e}")
     
+    # Runs that were interrupted before writing a results file only exist in the send journal
+    for row in load_unfinished_results():
+        row['source_file'] = 'journal'
+        all_results.append(row)
+    
     return all_results
 
-def get_statistics():
-    """Get email sending statistics"""
-    results = load_all_results()
-    
-    if not results:
-        print("No results found. No emails have been sent yet.")
-        return
-    
-    stats = {
-        'total': len(results),
-        'sent': 0,
-        'failed': 0,
-        'dry_run': 0,
-        'unique_emails': set(),
-        'unique_companies': set(),
-        'by_date': defaultdict(lambda: {'sent': 0, 'failed': 0})
-    }
-    
-    for result in results:
-        status = result.get('status', '').lower()
-        email = result.get('email', '')
-        company = result.get('company', '')
-        timestamp = result.get('timestamp', '')
-        
-        if status == 'sent':
-            stats['sent'] += 1
-        elif status == 'failed':
-            stats['failed'] += 1
-        elif status == 'dry_run':
-            stats['dry_run'] += 1
-        
-        if email:
-            stats['unique_emails'].add(email)
-        if company:
-            stats['unique_companies'].add(company)
-        
-        # Group by date
-        if timestamp:
-            try:
-                date_str = timestamp.split('T')[0]  # Get date part
-                if status == 'sent':
-                    stats['by_date'][date_str]['sent'] += 1
-                elif status == 'failed':
-                    stats['by_date'][date_str]['failed'] += 1
-            except:
-                pass
-    
-    return stats
+def get_statistics(db_path=DEFAULT_STATS_PATH):
+    """Get email sending statistics from the aggregate store, after counting anything new"""
+    store = StatsStore(db_path)
+    try:
+        store.refresh()
+        totals = store.totals()
+        if not totals.get('total'):
+            print("No results found. No emails have been sent yet.")
+            return
+        return {
+            'total': totals.get('total', 0),
+            'sent': totals.get('status:sent', 0),
+            'failed': totals.get('status:failed', 0),
+            'dry_run': totals.get('status:dry_run', 0),
+            'unique_emails': totals.get('unique_emails', 0),
+            'unique_companies': totals.get('unique_companies', 0),
+            'by_date': store.by_date(),
+            'by_run': store.by_source(),
+        }
+    finally:
+        store.close()
 
-def print_statistics():
+def print_statistics(db_path=DEFAULT_STATS_PATH, by_run=False):
     """Print email statistics"""
-    stats = get_statistics()
+    stats = get_statistics(db_path)
     
     if not stats:
         return
@@ -90,8 +70,8 @@ def print_statistics():
     print(f"  [SUCCESS] Successfully sent: {stats['sent']}")
     print(f"  [FAILED] Failed: {stats['failed']}")
     print(f"  [TEST] Dry run (test): {stats['dry_run']}")
-    print(f"\nUnique companies: {len(stats['unique_companies'])}")
-    print(f"Unique emails: {len(stats['unique_emails'])}")
+    print(f"\nUnique companies: {stats['unique_companies']}")
+    print(f"Unique emails: {stats['unique_emails']}")
     
     if stats['by_date']:
         print("\nBreakdown by Date:")
@@ -100,6 +80,13 @@ def print_statistics():
             failed = stats['by_date'][date]['failed']
             print(f"  {date}: {sent} sent, {failed} failed")
     
+    if by_run and stats['by_run']:
+        print("\nBreakdown by Run:")
+        for run in sorted(stats['by_run'].keys(), reverse=True):
+            counts = stats['by_run'][run]
+            print(f"  {run}: {counts.get('sent', 0)} sent, {counts.get('failed', 0)} failed, "
+                  f"{counts.get('dry_run', 0)} dry run")
+    
     print("="*70 + "\n")
 
 def create_resend_list(output_file='emails_to_resend.csv'):
@@ -187,11 +174,19 @@ def main():
     parser.add_argument('--resend', action='store_true', help='Create list of failed emails to resend')
     parser.add_argument('--sent', action='store_true', help='Create list of successfully sent emails')
     parser.add_argument('--all', action='store_true', help='Show stats and create all lists')
+    parser.add_argument('--by-run', action='store_true', help='Also break statistics down per run')
+    parser.add_argument('--db', type=str, default=DEFAULT_STATS_PATH, help='Aggregate statistics database')
+    parser.add_argument('--rebuild', action='store_true', help='Recount statistics from all results and journal files')
     
     args = parser.parse_args()
     
-    if args.all or args.stats:
-        print_statistics()
+    if args.rebuild:
+        for path in (args.db, args.db + '-wal', args.db + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    if args.all or args.stats or args.by_run:
+        print_statistics(args.db, by_run=args.by_run)
     
     if args.all or args.resend:
         create_resend_list()
@@ -199,11 +194,12 @@ def main():
     if args.all or args.sent:
         create_sent_list()
     
-    if not any([args.stats, args.resend, args.sent, args.all]):
+    if not any([args.stats, args.resend, args.sent, args.all, args.by_run]):
         # Default: show stats
-        print_statistics()
+        print_statistics(args.db)
         print("\nUsage:")
         print("  python email_stats.py --stats    # Show statistics")
+        print("  python email_stats.py --by-run   # Show statistics per run")
         print("  python email_stats.py --resend   # Create resend list")
         print("  python email_stats.py --sent     # Create sent emails list")
         print("  python email_stats.py --all      # Do everything\n")
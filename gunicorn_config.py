@@ -8,7 +8,9 @@ backlog = 2048
 
 # Worker processes - Reduced for Railway free tier
 workers = 2  # Reduced from cpu_count * 2 + 1 to prevent OOM
-worker_class = "sync"
+# Threaded workers so a slow request (e.g. a large list upload) doesn't block a whole worker process
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -29,3 +31,8 @@ user = None
 group = None
 tmp_upload_dir = None
 
+
+def post_worker_init(worker):
+    """Create directories and check the schema version before the worker accepts requests (migrations run once per deploy)"""
+    from app import init_app
+    init_app()
@@ -0,0 +1,127 @@
+"""
+Log Config - Logging setup shared by the CLI, web app and worker
+Handlers run on a background QueueListener so a slow disk or pipe never blocks the send loop.
+
+Environment:
+    LOG_FORMAT        'text' (default) or 'json' (one JSON object per line, one line per message sent)
+    LOG_LEVEL         Root log level (default INFO)
+    LOG_SAMPLE_EVERY  Keep 1 in N info/debug records from connection-level loggers
+                      (default 1 for text, 100 for json); warnings and errors are always kept
+"""
+
+import atexit
+import copy
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Sequence
+
+DEFAULT_TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Loggers that report per-connection / per-request chatter (SMTP sessions, SendGrid calls, the sink)
+SAMPLED_LOGGERS = ('smtp_pool', 'sendgrid_email', 'smtp_sink')
+
+_STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+_format = 'text'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed with extra={...} become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:  # Already rendered by TracebackQueueHandler
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through 1 in `every` info/debug records from the given loggers (and all other records)"""
+
+    def __init__(self, every: int, loggers: Sequence[str] = SAMPLED_LOGGERS):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.loggers = tuple(loggers)
+        self._seen = itertools.count()  # next() is atomic, so threads logging at once can't skew the ratio
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every == 1 or record.levelno >= logging.WARNING or not record.name.startswith(self.loggers):
+            return True
+        return next(self._seen) % self.every == 0
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the traceback for the formatters on the listener thread.
+    The stock prepare() merges it into the message and clears exc_info, so JSON lines lost their 'exc' field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Rendered here, while the traceback is still alive; the formatters read exc_text
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def structured_logging() -> bool:
+    """True when logs are JSON lines (callers then skip human-oriented banners and duplicate lines)"""
+    return _format == 'json'
+
+
+def configure_logging(fmt: Optional[str] = None, level: Optional[str] = None, log_file: Optional[str] = None,
+                      stream=None, text_format: str = DEFAULT_TEXT_FORMAT, sample_every: Optional[int] = None):
+    """
+    Route the root logger through a queue to stream (and file) handlers. Only the first call has an effect.
+
+    Args:
+        fmt: 'text' or 'json' (default: LOG_FORMAT or 'text')
+        level: Root level name (default: LOG_LEVEL or INFO)
+        log_file: Also append to this file
+        stream: Console stream (default: stderr)
+        text_format: Format string for text mode
+        sample_every: See LOG_SAMPLE_EVERY
+    """
+    global _listener, _format
+    if _listener is not None:
+        return
+    _format = (fmt or os.environ.get('LOG_FORMAT') or 'text').lower()
+    formatter = JsonFormatter() if _format == 'json' else logging.Formatter(text_format)
+    if sample_every is None:
+        sample_every = int(os.environ.get('LOG_SAMPLE_EVERY', 100 if _format == 'json' else 1))
+
+    handlers = [logging.StreamHandler(stream or sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = TracebackQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_every))
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel((level or os.environ.get('LOG_LEVEL') or 'INFO').upper())
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Metrics - Lightweight counters and timing histograms for the send pipeline
+Rendered in Prometheus text format by GET /metrics (web app) and the worker's metrics port,
+and readable from the command line:
+
+    python metrics.py http://localhost:9101/metrics
+    python metrics.py https://<app>/metrics --token <METRICS_TOKEN>
+"""
+
+import hmac
+import logging
+import re
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond rendering up to slow SMTP logins
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+            for key, child in children:
+                lines.extend(self._render_child(dict(zip(self.labelnames, key)), child))
+        return lines
+
+    def _render_child(self, labels: Dict[str, str], child) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def _render_child(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    """One labelled series of a histogram"""
+
+    __slots__ = ('buckets', 'lock', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...], lock: threading.Lock):
+        self.buckets = buckets
+        self.lock = lock
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Timer:
+    """Context manager that observes the elapsed time into a histogram series"""
+
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (durations in seconds) over fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def labels(self, **labels) -> _HistogramChild:
+        """The series for these label values (look it up once and reuse it on hot paths)"""
+        key = self._key(labels)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = _HistogramChild(self.buckets, self._lock)
+            return child
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels) -> _Timer:
+        """with histogram.time(stage='mime'): ..."""
+        return _Timer(self.labels(**labels))
+
+    def _render_child(self, labels, child):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {child.count}")
+        return lines
+
+
+class Registry:
+    """All metrics of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'email_stage_seconds', 'Time spent per call in each stage of sending and running campaigns', ['stage']
+)
+MESSAGES = REGISTRY.counter('email_messages_total', 'Recipients processed, by outcome', ['status'])
+CSV_ROWS = REGISTRY.counter('email_csv_rows_total', 'Recipient list rows read')
+CAMPAIGNS = REGISTRY.counter('email_campaigns_total', 'Campaign runs finished, by final status', ['status'])
+RETRIES = REGISTRY.counter('email_retries_total', 'Sends queued for another attempt after a temporary failure')
+
+
+_stage_series: Dict[str, _HistogramChild] = {}
+
+
+def stage_series(stage: str) -> _HistogramChild:
+    series = _stage_series.get(stage)
+    if series is None:
+        series = _stage_series[stage] = STAGE_SECONDS.labels(stage=stage)
+    return series
+
+
+def time_stage(stage: str) -> _Timer:
+    """with time_stage('personalize'): ..."""
+    return _Timer(_stage_series.get(stage) or stage_series(stage))
+
+
+def observe_stage(stage: str, seconds: float):
+    stage_series(stage).observe(seconds)
+
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def summarize(text: str) -> List[Dict]:
+    """
+    Per-series summary of Prometheus text: counters give 'value', histograms give
+    'count', 'sum', 'mean' and bucket-based 'p50' / 'p95' upper bounds
+    """
+    kinds, series = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ', 3)
+            kinds[name] = kind
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, raw_labels, value = match.groups()
+        labels = dict(_LABEL.findall(raw_labels or ''))
+        base, part = name, 'value'
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and kinds.get(name[:-len(suffix)]) == 'histogram':
+                base, part = name[:-len(suffix)], suffix[1:]
+        le = labels.pop('le', None)
+        entry = series.setdefault((base, tuple(sorted(labels.items()))), {'buckets': []})
+        if part == 'bucket':
+            entry['buckets'].append((float(le), float(value)))
+        else:
+            entry[part] = float(value)
+
+    rows = []
+    for (name, labels), entry in series.items():
+        row = {'metric': name, 'labels': dict(labels)}
+        if kinds.get(name) == 'histogram':
+            count = entry.get('count', 0)
+            row.update(count=int(count), sum=entry.get('sum', 0.0),
+                       mean=entry.get('sum', 0.0) / count if count else None,
+                       p50=_quantile(entry['buckets'], count, 0.5), p95=_quantile(entry['buckets'], count, 0.95))
+        else:
+            row['value'] = entry.get('value', 0)
+        rows.append(row)
+    return rows
+
+
+def _quantile(buckets: List[Tuple[float, float]], count: float, q: float) -> Optional[float]:
+    for bound, cumulative in sorted(buckets):
+        if count and cumulative >= q * count:
+            return bound
+    return None
+
+
+def format_summary(rows: List[Dict]) -> str:
+    """Human-readable table of summarize() output"""
+    def ms(seconds):
+        if seconds is None:
+            return '-'
+        return '>60000' if seconds == float('inf') else f"{seconds * 1000:.2f}"
+
+    lines = [f"{'histogram':<34} {'count':>9} {'total s':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}"]
+    for row in sorted((r for r in rows if 'count' in r), key=lambda r: -r['sum']):
+        label = ','.join(row['labels'].values())
+        name = f"{row['metric']}[{label}]" if label else row['metric']
+        lines.append(f"{name:<34} {row['count']:>9} {row['sum']:>10.3f} {ms(row['mean']):>9} "
+                     f"{ms(row['p50']):>9} {ms(row['p95']):>9}")
+    counters = [r for r in rows if 'value' in r]
+    if counters:
+        lines.append('')
+        lines.append(f"{'counter':<34} {'value':>9}")
+        for row in counters:
+            label = ','.join(row['labels'].values())
+            name = f"{row['metric']}[{label}]" if label else row['metric']
+            lines.append(f"{name:<34} {row['value']:>9g}")
+    return '\n'.join(lines)
+
+
+def authorized(token: Optional[str], authorization: Optional[str], query_token: Optional[str]) -> bool:
+    """Whether a scrape carries `token`, as `Authorization: Bearer <token>` or `?token=`"""
+    if not token:
+        return False
+    return (hmac.compare_digest(authorization or '', f'Bearer {token}')
+            or hmac.compare_digest(query_token or '', token))
+
+
+def start_http_server(port: int, host: str = '127.0.0.1', token: Optional[str] = None):
+    """
+    Serve this process's metrics on a background thread (for processes without a web app).
+    Bound to localhost by default; with a token, scrapes must send it (see authorized()).
+    """
+    # Imported here: only the worker serves metrics itself, so the CLI and web app skip http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query_token = parse_qs(urlsplit(self.path).query).get('token', [None])[0]
+            if token and not authorized(token, self.headers.get('Authorization'), query_token):
+                status, content_type, body = 401, 'text/plain', b'Unauthorized\n'
+            else:
+                status, content_type, body = 200, CONTENT_TYPE, REGISTRY.render().encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Could not start metrics server on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-http').start()
+    logger.info(f"📈 Metrics available at http://{host}:{port}/metrics")
+    if not token and host not in ('127.0.0.1', 'localhost', '::1'):
+        logger.warning(f"Metrics on {host}:{port} are served to anyone who can reach it; set METRICS_TOKEN "
+                       "or bind to 127.0.0.1")
+    return server
+
+
+def main():
+    """Main function"""
+    import argparse
+    import os
+    from urllib.request import Request, urlopen
+
+    parser = argparse.ArgumentParser(description='Show send pipeline metrics')
+    parser.add_argument('url', nargs='?', default='http://localhost:9101/metrics',
+                        help='Metrics endpoint (worker metrics port or the web app /metrics)')
+    parser.add_argument('--raw', action='store_true', help='Print the raw Prometheus text')
+    parser.add_argument('--token', default=os.environ.get('METRICS_TOKEN'),
+                        help='Bearer token the endpoint requires (default: METRICS_TOKEN)')
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    with urlopen(Request(args.url, headers=headers), timeout=10) as response:
+        text = response.read().decode()
+    print(text if args.raw else format_summary(summarize(text)))
+
+
+if __name__ == '__main__':
+    main()
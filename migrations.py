@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Migrations - Versioned schema changes for the web app database
+Applied versions are recorded in the schema_version table, so a database is only inspected and altered
+when it is behind. Run once per deploy (processes started later find nothing to do):
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending versions
+
+A new database gets the tables straight from the models and is stamped with every version. Databases
+created before versioning replay all migrations, so each one must be idempotent: use add_column() /
+create_index() rather than bare DDL.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, List, Set, Tuple
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = 'schema_version'
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column exists (ddl is the type and default)"""
+    if column in {col['name'] for col in inspect(conn).get_columns(table)}:
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    conn.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} {ddl}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Tuple[str, ...]):
+    quote = conn.dialect.identifier_preparer.quote
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} "
+                      f"({', '.join(quote(column) for column in columns)})"))
+
+
+def _create_tables(conn: Connection, metadata: MetaData):
+    metadata.create_all(conn)
+
+
+def _user_mail_settings(conn: Connection, metadata: MetaData):
+    add_column(conn, 'user', 'smtp_email', 'VARCHAR(120)')
+    add_column(conn, 'user', 'smtp_password', 'VARCHAR(255)')
+    add_column(conn, 'user', 'smtp_server', "VARCHAR(100) DEFAULT 'smtp.gmail.com'")
+    add_column(conn, 'user', 'smtp_port', 'INTEGER DEFAULT 587')
+    add_column(conn, 'user', 'sender_name', 'VARCHAR(100)')
+    add_column(conn, 'user', 'email_provider', "VARCHAR(20) DEFAULT 'gmail'")
+    add_column(conn, 'user', 'sendgrid_api_key', 'VARCHAR(200)')
+
+
+def _campaign_checkpoints(conn: Connection, metadata: MetaData):
+    add_column(conn, 'campaign', 'checkpoint_offset', 'INTEGER DEFAULT 0')
+    add_column(conn, 'campaign', 'heartbeat_at', 'TIMESTAMP')
+    add_column(conn, 'campaign', 'lease_owner', 'VARCHAR(100)')
+    add_column(conn, 'campaign', 'updated_at', 'TIMESTAMP')
+    create_index(conn, 'ix_campaign_updated_at', 'campaign', ('updated_at',))
+
+
+def _list_indexes(conn: Connection, metadata: MetaData):
+    create_index(conn, 'ix_campaign_user_created', 'campaign', ('user_id', 'created_at'))
+    create_index(conn, 'ix_email_template_user_created', 'email_template', ('user_id', 'created_at'))
+
+
+def _sender_identities(conn: Connection, metadata: MetaData):
+    metadata.tables['sender_identity'].create(conn, checkfirst=True)
+
+
+def _recipient_lists(conn: Connection, metadata: MetaData):
+    metadata.tables['recipient_list'].create(conn, checkfirst=True)
+    add_column(conn, 'campaign', 'recipient_list_id', 'INTEGER REFERENCES recipient_list (id)')
+
+
+def _sending_limits(conn: Connection, metadata: MetaData):
+    add_column(conn, 'user', 'max_emails_per_day', 'INTEGER DEFAULT 50')
+    add_column(conn, 'user', 'delay_between_emails', 'INTEGER DEFAULT 5')
+    add_column(conn, 'campaign', 'resume_at', 'TIMESTAMP')
+
+
+def _campaign_errors(conn: Connection, metadata: MetaData):
+    add_column(conn, 'campaign', 'error', 'VARCHAR(500)')
+
+
+# (version, name, apply(conn, metadata)) - append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection, MetaData], None]]] = [
+    (1, 'create tables', _create_tables),
+    (2, 'user mail settings columns', _user_mail_settings),
+    (3, 'campaign checkpoint and lease columns', _campaign_checkpoints),
+    (4, 'list pagination indexes', _list_indexes),
+    (5, 'sender identities', _sender_identities),
+    (6, 'uploaded recipient lists', _recipient_lists),
+    (7, 'user sending limits and paused campaigns', _sending_limits),
+    (8, 'campaign error message', _campaign_errors),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def applied_versions(engine: Engine) -> Set[int]:
+    """Versions recorded in schema_version (empty if the table does not exist yet)"""
+    try:
+        with engine.connect() as conn:
+            return {row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE}"))}
+    except SQLAlchemyError:
+        return set()
+
+
+def pending_versions(engine: Engine) -> List[int]:
+    """Versions not yet recorded in schema_version (a single query; applies nothing)"""
+    applied = applied_versions(engine)
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def _record(conn: Connection, version: int, name: str):
+    conn.execute(text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                 {'version': version, 'name': name, 'applied_at': datetime.utcnow()})
+
+
+def _lock(conn: Connection):
+    """Serialize concurrent runners on PostgreSQL (SQLite serializes writers itself)"""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {'key': VERSION_TABLE})
+
+
+def migrate(engine: Engine, metadata: MetaData) -> List[int]:
+    """
+    Apply pending migrations, each in its own transaction together with its schema_version row
+
+    Returns:
+        Versions applied by this call (empty when the schema was already current)
+    """
+    applied = applied_versions(engine)
+    if applied >= {version for version, _, _ in MIGRATIONS}:
+        return []
+
+    try:
+        with engine.begin() as conn:
+            _lock(conn)
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                              "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP)"))
+            if not applied and not set(metadata.tables) & set(inspect(conn).get_table_names()):
+                # Fresh database: the models already describe the latest schema
+                metadata.create_all(conn)
+                for version, name, _ in MIGRATIONS:
+                    _record(conn, version, name)
+                logger.info(f"Created database schema at version {LATEST_VERSION}")
+                return [version for version, _, _ in MIGRATIONS]
+    except (IntegrityError, OperationalError):
+        # A concurrent runner can also get "table already exists" instead of a duplicate version row
+        if not applied_versions(engine):
+            raise
+        logger.info("Database schema was created by another process")
+        return []
+
+    done = []
+    for version, name, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                _lock(conn)
+                if conn.execute(text(f"SELECT 1 FROM {VERSION_TABLE} WHERE version = :version"),
+                                {'version': version}).first():
+                    continue
+                apply(conn, metadata)
+                _record(conn, version, name)
+        except (IntegrityError, OperationalError):
+            if version not in applied_versions(engine):
+                raise
+            logger.info(f"Migration {version} was applied by another process")
+            continue
+        logger.info(f"Applied migration {version}: {name}")
+        done.append(version)
+    return done
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Apply web app database migrations')
+    parser.add_argument('--status', action='store_true', help='Only list applied and pending migrations')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from app import app, create_directories, db
+
+    create_directories()
+    with app.app_context():
+        if args.status:
+            applied = applied_versions(db.engine)
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in applied else 'pending':<8} {name}")
+            return
+        done = migrate(db.engine, db.metadata)
+    print(f"Applied {len(done)} migration(s); schema is at version {LATEST_VERSION}" if done
+          else f"Schema is up to date (version {LATEST_VERSION})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Progress Events - One shared change feed per process for live campaign updates
+A single poller reads changed rows from the database into a short history that
+progress requests read without querying or waiting, so DB reads don't grow with
+the number of open dashboards and no request holds a worker thread.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeed:
+    """Polls `fetch_changes(since)` while anyone has read recently and keeps a short history of changes"""
+
+    def __init__(self, fetch_changes: Callable[[object], List[Dict]], start_from: Callable[[], object],
+                 interval: float = 1.0, history: int = 1000, change_key: str = 'updated_at',
+                 idle_after: float = 30.0):
+        """
+        Args:
+            fetch_changes: Returns rows whose change_key is at or after `since`, oldest first
+            start_from: Returns the initial `since` (e.g. the current time)
+            interval: Seconds between polls
+            history: Number of recent changes kept for slow readers
+            change_key: Row field that orders changes
+            idle_after: Seconds without a read after which polling pauses
+        """
+        self.fetch_changes = fetch_changes
+        self.start_from = start_from
+        self.interval = interval
+        self.change_key = change_key
+        self.idle_after = idle_after
+        self._changes = deque(maxlen=history)
+        self._covered_from = None  # Every change at or after this is in the history...
+        self._evicted = None  # ...except at or before the newest change dropped from it
+        self._since = None
+        self._seen_at_since = set()
+        self._last_read = None
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='change-feed')
+            self._thread.start()
+
+    def _poll(self):
+        with self._condition:
+            if self._since is None:
+                self._since = self._covered_from = self.start_from()
+            since = self._since
+        rows = self.fetch_changes(since)
+        with self._condition:
+            fresh = []
+            for row in rows:
+                key = (row.get('id'), row.get(self.change_key))
+                if row.get(self.change_key) == self._since and key in self._seen_at_since:
+                    continue
+                fresh.append(row)
+            if rows:
+                newest = max(row[self.change_key] for row in rows)
+                if newest != self._since:
+                    self._since = newest
+                    self._seen_at_since = set()
+                self._seen_at_since.update(
+                    (row.get('id'), row[self.change_key]) for row in rows if row[self.change_key] == newest
+                )
+            for row in fresh:
+                if len(self._changes) == self._changes.maxlen:
+                    self._evicted = self._changes[0][self.change_key]
+                self._changes.append(row)
+
+    def _idle(self) -> bool:
+        return self._last_read is None or time.monotonic() - self._last_read > self.idle_after
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self._idle():
+                    self._condition.wait()
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"Change feed poll failed: {e}")
+            time.sleep(self.interval)
+
+    def changes(self, since) -> Tuple[object, Optional[List[Dict]]]:
+        """
+        Changes at or after `since` (a change_key value from an earlier call), without waiting.
+        Reading (re)starts polling if the feed was idle.
+
+        Returns:
+            tuple: (next since, changed rows) - rows is None if `since` is missing or older than
+                the history, and the caller should send a full snapshot instead. Rows can repeat
+                across calls, so applying them must be idempotent.
+        """
+        with self._condition:
+            self._last_read = time.monotonic()
+            self._condition.notify_all()
+            self._ensure_started()
+            if self._since is None:
+                self._since = self._covered_from = self.start_from()
+            if since is None or since < self._covered_from or (self._evicted is not None and since <= self._evicted):
+                return self._since, None
+            rows = [row for row in self._changes if row[self.change_key] >= since]
+            # Another process's feed may be ahead of this one; keep the reader's position
+            return max(since, self._since), rows
@@ -0,0 +1,253 @@
+"""
+Rate Limiter - Token buckets for per-second and per-hour pacing, plus a persisted daily cap
+One limiter is shared by every campaign that sends from the same account. The daily cap counts sends
+per account and calendar day in SQLite (next to the sent index), so it holds across runs, restarts and
+every process sharing the file.
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sent_index import DEFAULT_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` tokens, refilled at `rate` tokens per second"""
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available (0 if available now)"""
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def reconfigure(self, rate: float, capacity: float):
+        """Change limits while keeping the tokens already spent"""
+        used = self.capacity - self.tokens
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = max(0.0, min(capacity, capacity - used))
+
+
+class DailyQuota:
+    """Sends per account and calendar day (local time), shared through SQLite by every process using db_path"""
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_send_count (
+                    account TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (account, day)
+                ) WITHOUT ROWID
+            """)
+
+    def used(self, account: str) -> int:
+        """Sends counted for account today"""
+        with self._lock:
+            row = self._conn.execute('SELECT count FROM daily_send_count WHERE account = ? AND day = ?',
+                                     (account, date.today().isoformat())).fetchone()
+        return row[0] if row else 0
+
+    def try_take(self, account: str, limit: int) -> bool:
+        """Count one send for account today unless that would exceed limit (atomic across processes)"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                day = date.today().isoformat()
+                row = self._conn.execute('SELECT count FROM daily_send_count WHERE account = ? AND day = ?',
+                                         (account, day)).fetchone()
+                if row and row[0] >= limit:
+                    return False
+                self._conn.execute("""
+                    INSERT INTO daily_send_count (account, day, count) VALUES (?, ?, 1)
+                    ON CONFLICT(account, day) DO UPDATE SET count = count + 1
+                """, (account, day))
+                return True
+            finally:
+                self._conn.execute('COMMIT')
+
+    @staticmethod
+    def seconds_until_reset() -> float:
+        now = datetime.now()
+        return (datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) - now).total_seconds()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RateLimiter:
+    """
+    Combination of token buckets, and optionally a daily quota; a send must take a token from every
+    bucket and fit in the account's count for the day
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], jitter: float = 0.0,
+                 quota: Optional[DailyQuota] = None, account: str = '', per_day: int = 0):
+        """
+        Args:
+            limits: bucket name -> (rate per second, capacity)
+            jitter: Maximum random extra delay (seconds) added after each acquire
+            quota: Where the daily count of account is kept (per_day 0 = no daily cap)
+        """
+        self._lock = threading.Lock()
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.jitter = jitter
+        self.account = account
+        self.quota: Optional[DailyQuota] = None
+        self.per_day = 0
+        self.configure(limits, jitter, quota, per_day)
+
+    def configure(self, limits: Dict[str, Tuple[float, float]], jitter: float = 0.0,
+                  quota: Optional[DailyQuota] = None, per_day: int = 0):
+        with self._lock:
+            self.quota = quota
+            self.per_day = per_day if quota is not None else 0
+            now = time.monotonic()
+            for name in list(self.buckets):
+                if name not in limits:
+                    del self.buckets[name]
+            for name, (rate, capacity) in limits.items():
+                bucket = self.buckets.get(name)
+                if bucket is None:
+                    self.buckets[name] = TokenBucket(name, rate, capacity)
+                else:
+                    bucket.refill(now)
+                    bucket.reconfigure(rate, capacity)
+            self.jitter = jitter
+
+    def try_acquire(self) -> Tuple[bool, float, Optional[str]]:
+        """
+        Take a token from every bucket if all have one
+
+        Returns:
+            tuple: (acquired, seconds to wait otherwise, name of the limiting bucket)
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait, limiting = 0.0, None
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+                bucket_wait = bucket.wait_time()
+                if bucket_wait > wait:
+                    wait, limiting = bucket_wait, bucket.name
+            if wait > 0:
+                return False, wait, limiting
+            # Counted when a send is allowed, so failed attempts use up the day's budget too
+            if self.per_day and not self.quota.try_take(self.account, self.per_day):
+                return False, self.quota.seconds_until_reset(), 'day'
+            for bucket in self.buckets.values():
+                bucket.tokens -= 1
+            return True, 0.0, None
+
+    def acquire(self, max_wait: Optional[float] = None, wait_fn: Callable[[float], None] = time.sleep) -> bool:
+        """
+        Block until a send is allowed
+
+        Args:
+            max_wait: Give up (return False) if the next token is further away than this
+            wait_fn: Called with the number of seconds to wait; may return early to re-check
+                (the send loop uses this to handle finished sends while it waits)
+
+        Returns:
+            bool: True if a token was taken
+        """
+        while True:
+            acquired, wait, limiting = self.try_acquire()
+            if acquired:
+                if self.jitter > 0:
+                    wait_fn(random.uniform(0, self.jitter))
+                return True
+            if max_wait is not None and wait > max_wait:
+                logger.warning(f"Rate limit '{limiting}' exhausted: next send allowed in {wait:.0f}s")
+                return False
+            wait_fn(min(wait, 1.0))
+
+    def next_send_in(self) -> float:
+        """Seconds until try_acquire could succeed (0 if it could now), without taking anything"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time())
+            if self.per_day and self.quota.used(self.account) >= self.per_day:
+                wait = max(wait, self.quota.seconds_until_reset())
+            return wait
+
+    def get_stats(self) -> Dict[str, float]:
+        """Tokens currently available per bucket, and sends left today under 'day'"""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+            stats = {name: round(bucket.tokens, 2) for name, bucket in self.buckets.items()}
+            if self.per_day:
+                stats['day'] = max(0, self.per_day - self.quota.used(self.account))
+            return stats
+
+
+def limits_from_config(config: Dict) -> Dict[str, Tuple[float, float]]:
+    """Build pacing bucket limits from the automation config (the daily cap is a DailyQuota instead)"""
+    limits = {}
+    per_second = config.get('max_emails_per_second')
+    if not per_second:
+        delay = float(config.get('delay_between_emails', 30) or 0)
+        per_second = 1.0 / delay if delay > 0 else 0
+    if per_second:
+        limits['second'] = (float(per_second), 1.0)
+    per_hour = config.get('max_emails_per_hour')
+    if per_hour:
+        limits['hour'] = (float(per_hour) / 3600, float(per_hour))
+    return limits
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_quotas: Dict[str, DailyQuota] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Dict) -> RateLimiter:
+    """Get the limiter shared by every campaign sending from the account in config"""
+    key = f"{config.get('email_provider') or 'smtp'}:{(config.get('sender_email') or '').lower()}"
+    limits = limits_from_config(config)
+    jitter = float(config.get('send_jitter_seconds', 0) or 0)
+    per_day = int(config.get('max_emails_per_day') or 0)
+    with _limiters_lock:
+        quota = None
+        if per_day:
+            quota_path = config.get('sent_index_db', DEFAULT_INDEX_PATH)
+            quota = _quotas.get(quota_path)
+            if quota is None:
+                quota = _quotas[quota_path] = DailyQuota(quota_path)
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(limits, jitter, quota=quota, account=key, per_day=per_day)
+            _limiters[key] = limiter
+        else:
+            limiter.configure(limits, jitter, quota, per_day)
+        return limiter
@@ -0,0 +1,297 @@
+"""
+Recipient Cache - Recipient lists imported once into an indexed SQLite table
+A list is imported on first use and again only when its file changes (size or mtime). Rows are stored
+already filtered (ACTIVE, with an email and a company name) and numbered in file order, so a campaign reads
+its [offset, limit) window as a range of the primary key, and the already-sent check runs as a join against
+the sent index instead of one lookup per row.
+
+Imports commit every IMPORT_CHUNK_SIZE rows and hash the file as it is read. Readers of a list that is still
+being imported receive rows as they are committed and wait for more until the import completes, so sending
+starts as soon as the first chunk is in. Uploaded lists are imported the same way by a background parser
+(import_stream); get_list imports on a thread of its own.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import IO, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = 'recipients.db'
+FIELDS = ('company_name', 'founder_email', 'founder_name', 'website', 'industry', 'notes')
+FETCH_SIZE = 500  # Rows per query while streaming a list
+IMPORT_CHUNK_SIZE = 1000  # Rows per transaction while importing
+FOLLOW_INTERVAL = 1.0  # Seconds between checks for new rows of a list that is still being imported
+# An import that has committed nothing for this long is taken to have died with its process. Longer than
+# the web app's list lease timeout, so a crashed parser is replaced before readers give up on the list.
+IMPORT_STALE_AFTER = 120  # seconds
+
+
+class HashingReader(io.RawIOBase):
+    """Binary file wrapper that hashes (and counts) the bytes read through it"""
+
+    def __init__(self, f: IO[bytes]):
+        self._f = f
+        self._digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._f.readinto(buffer)
+        if n:
+            self._digest.update(memoryview(buffer)[:n])
+            self.bytes_read += n
+        return n
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def open_hashed(f: IO[bytes]) -> Tuple[IO[str], HashingReader]:
+    """A UTF-8 text stream over a binary CSV file, and the reader hashing it"""
+    reader = HashingReader(f)
+    return io.TextIOWrapper(io.BufferedReader(reader), encoding='utf-8', newline=''), reader
+
+
+class RecipientCache:
+    """Parsed recipient lists, keyed by absolute file path"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS recipient_list (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    complete INTEGER NOT NULL DEFAULT 1,  -- 0 while an import runs, -1 if it failed
+                    imported_at TEXT DEFAULT CURRENT_TIMESTAMP  -- Last commit of the import
+                );
+                CREATE TABLE IF NOT EXISTS recipient (
+                    list_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    email_key TEXT NOT NULL,
+                    {', '.join(f'{field} TEXT NOT NULL' for field in FIELDS)},
+                    PRIMARY KEY (list_id, seq)
+                ) WITHOUT ROWID;
+            """)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(recipient_list)')}
+            if 'complete' not in columns:  # Cache files written before uploads existed
+                self._conn.execute('ALTER TABLE recipient_list ADD COLUMN complete INTEGER NOT NULL DEFAULT 1')
+            self._conn.commit()
+
+    def _claim(self, path: str, stat: Optional[os.stat_result]) -> Tuple[int, bool]:
+        """
+        (list id, whether the caller is to import it). With stat, a list that matches the file or is being
+        imported by someone else is left alone; without, the list is always claimed. A claimed list is
+        emptied and marked incomplete, in one transaction so only one connection wins.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT id, mtime, size, complete, imported_at > datetime('now', ?) FROM recipient_list "
+                    "WHERE path = ?", (f'-{IMPORT_STALE_AFTER} seconds', path)
+                ).fetchone()
+                if stat is not None and row and (
+                        (row[3] == 1 and (row[1], row[2]) == (stat.st_mtime, stat.st_size))
+                        or (row[3] == 0 and row[4])):
+                    return row[0], False
+                # mtime -1 until the import finishes, so a partial import is never taken for a fresh one
+                self._conn.execute("""
+                    INSERT INTO recipient_list (path, mtime, size, sha256, rows, complete) VALUES (?, -1, 0, '', 0, 0)
+                    ON CONFLICT(path) DO UPDATE SET mtime = -1, size = 0, sha256 = '', rows = 0, complete = 0,
+                        imported_at = CURRENT_TIMESTAMP
+                """, (path,))
+                list_id = self._conn.execute('SELECT id FROM recipient_list WHERE path = ?', (path,)).fetchone()[0]
+                self._conn.execute('DELETE FROM recipient WHERE list_id = ?', (list_id,))
+                return list_id, True
+            finally:
+                self._conn.commit()
+
+    def _import(self, list_id: int, path: str, companies: Iterable[Dict], reader: HashingReader,
+                on_chunk: Optional[Callable[[int], None]] = None) -> int:
+        """Fill a claimed list from companies, read through reader, committing every IMPORT_CHUNK_SIZE rows"""
+        insert = (f"INSERT INTO recipient (list_id, seq, email_key, {', '.join(FIELDS)}) "
+                  f"VALUES ({list_id}, ?, ?, {', '.join('?' * len(FIELDS))})")
+        seq, chunk = 0, []
+
+        def flush():
+            with self._lock:
+                self._conn.executemany(insert, chunk)
+                self._conn.execute('UPDATE recipient_list SET rows = ?, imported_at = CURRENT_TIMESTAMP WHERE id = ?',
+                                   (seq, list_id))
+                self._conn.commit()
+            chunk.clear()
+            if on_chunk is not None:
+                on_chunk(seq)
+
+        try:
+            # Stat before reading: a file changed during the import then looks stale and is imported again
+            stat = os.stat(path)
+            for company in companies:
+                chunk.append((seq, company['founder_email'].lower(), *(company.get(field) or '' for field in FIELDS)))
+                seq += 1
+                if len(chunk) >= IMPORT_CHUNK_SIZE:
+                    flush()
+            flush()
+            with self._lock:
+                self._conn.execute('UPDATE recipient_list SET mtime = ?, size = ?, sha256 = ?, complete = 1 WHERE id = ?',
+                                   (stat.st_mtime, stat.st_size, reader.hexdigest(), list_id))
+                self._conn.commit()
+        except Exception:
+            with self._lock:
+                self._conn.rollback()
+                self._conn.execute('UPDATE recipient_list SET complete = -1 WHERE id = ?', (list_id,))
+                self._conn.commit()
+            raise
+        logger.info(f"Imported {seq} recipients from {path} into {self.db_path}")
+        return seq
+
+    def get_list(self, csv_file: str, parse: Callable[[IO[str]], Iterable[Dict]]) -> int:
+        """
+        Id of csv_file's cached list. A new or changed file is imported with parse(text stream) on a
+        background thread; this returns once the first rows are in (iter_companies follows the rest).
+
+        Raises:
+            OSError: The file cannot be read
+            Exception: Whatever parse raised, if the import failed before its first rows were in
+        """
+        path = os.path.abspath(csv_file)
+        list_id, claimed = self._claim(path, os.stat(path))
+        if not claimed:
+            return list_id
+
+        started = threading.Event()
+        errors = []  # Only failures before the first chunk; later ones reach readers through iter_companies
+
+        def run():
+            try:
+                with open(path, 'rb') as f:
+                    text, reader = open_hashed(f)
+                    self._import(list_id, path, parse(text), reader, on_chunk=lambda rows: started.set())
+            except Exception as e:
+                if not started.is_set():
+                    errors.append(e)
+                logger.error(f"Importing {csv_file} into the recipient cache failed: {e}")
+            finally:
+                started.set()
+
+        threading.Thread(target=run, daemon=True, name='recipient-import').start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        return list_id
+
+    def import_stream(self, csv_file: str, companies: Iterable[Dict], reader: HashingReader,
+                      on_chunk: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Import csv_file from companies parsed off reader (see open_hashed) on the calling thread, replacing
+        any earlier import. If companies raises, the list is marked failed and readers following it get a
+        RuntimeError instead of a silently truncated list.
+
+        Args:
+            on_chunk: Called with the number of rows imported so far after each commit
+
+        Returns:
+            int: Number of rows imported
+        """
+        path = os.path.abspath(csv_file)
+        list_id, _ = self._claim(path, None)
+        return self._import(list_id, path, companies, reader, on_chunk)
+
+    def drop(self, csv_file: str):
+        """Forget a list (e.g. when its file is deleted)"""
+        path = os.path.abspath(csv_file)
+        with self._lock:
+            row = self._conn.execute('SELECT id FROM recipient_list WHERE path = ?', (path,)).fetchone()
+            if row:
+                self._conn.execute('DELETE FROM recipient WHERE list_id = ?', (row[0],))
+                self._conn.execute('DELETE FROM recipient_list WHERE id = ?', (row[0],))
+                self._conn.commit()
+
+    def count(self, list_id: int, limit: int = 0) -> int:
+        """Recipients in the list so far (at most limit, when given)"""
+        with self._lock:
+            rows = self._conn.execute('SELECT rows FROM recipient_list WHERE id = ?', (list_id,)).fetchone()
+        rows = rows[0] if rows else 0
+        return min(rows, limit) if limit and limit > 0 else rows
+
+    def iter_companies(self, list_id: int, offset: int = 0, limit: int = 0, exclude_db: Optional[str] = None,
+                       include_dry_run: bool = True) -> Iterator[Dict]:
+        """
+        Stream companies [offset, limit) of a list in file order (limit 0 = to the end), waiting for
+        more rows while the list is still being imported
+
+        Raises:
+            RuntimeError: The list's import failed part way through, or stalled
+
+        Args:
+            exclude_db: Sent index database (see sent_index.py) whose addresses are left out before
+                offset and limit apply, as iter_companies_from_csv(skip_sent=True) does
+            include_dry_run: Also leave out addresses that were only dry-run
+        """
+        stop = limit if limit and limit > 0 else None
+        if stop is not None and stop <= offset:
+            return
+        select = f"SELECT seq, {', '.join(FIELDS)} FROM recipient WHERE list_id = ? AND seq > ?"
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if exclude_db is None:
+                # The window is a primary key range
+                if stop is not None:
+                    select += f" AND seq < {int(stop)}"
+                query, skip, remaining = select + " ORDER BY seq LIMIT ?", 0, None
+                last = offset - 1
+            else:
+                # Rows before offset are counted after exclusion, so the window is found by skipping
+                conn.execute('ATTACH DATABASE ? AS sent', (exclude_db,))
+                statuses = "('sent', 'dry_run')" if include_dry_run else "('sent')"
+                query = (select + " AND NOT EXISTS (SELECT 1 FROM sent.sent_email s WHERE s.email = email_key "
+                         f"AND s.status IN {statuses}) ORDER BY seq LIMIT ?")
+                skip, remaining, last = offset, None if stop is None else stop - offset, -1
+            while True:
+                state = conn.execute(
+                    "SELECT complete, imported_at > datetime('now', ?) FROM recipient_list WHERE id = ?",
+                    (f'-{IMPORT_STALE_AFTER} seconds', list_id)
+                ).fetchone()
+                rows = conn.execute(query, (list_id, last, FETCH_SIZE)).fetchall()
+                if not rows:
+                    if state is None or state[0] == 1:
+                        return
+                    if state[0] < 0:
+                        raise RuntimeError(f"Import of recipient list {list_id} failed")
+                    if not state[1]:
+                        raise RuntimeError(f"Import of recipient list {list_id} stopped making progress")
+                    time.sleep(FOLLOW_INTERVAL)
+                    continue
+                last = rows[-1][0]
+                for row in rows:
+                    if skip:
+                        skip -= 1
+                        continue
+                    if remaining is not None:
+                        if remaining <= 0:
+                            return
+                        remaining -= 1
+                    yield dict(zip(FIELDS, row[1:]))
+        finally:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
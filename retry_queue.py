@@ -0,0 +1,102 @@
+"""
+Retry Queue - Delayed, in-run retries for sends that failed for a temporary reason
+Temporary failures (4xx replies, timeouts, dropped connections) are retried later in the same run with
+exponential backoff and jitter, while the send loop moves on; permanent ones (5xx replies, rejected
+logins, refused messages) are recorded as failed straight away.
+
+Config:
+    max_send_attempts  Attempts per recipient, including the first (default 3; 1 disables retries)
+    retry_base_delay   Seconds before the first retry, doubling for each further one (default 30)
+    retry_max_delay    Upper bound for the delay between attempts (default 600)
+"""
+
+import heapq
+import random
+import smtplib
+import socket
+import time
+from itertools import count
+from typing import Dict, Hashable, List, Optional, Tuple
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+
+def classify_failure(error: Exception) -> str:
+    """TRANSIENT if sending again later may succeed, otherwise PERMANENT"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.timeout, ConnectionError)):
+        return TRANSIENT
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return TRANSIENT if codes and all(400 <= code < 500 for code in codes) else PERMANENT
+    if isinstance(error, smtplib.SMTPResponseException):
+        return TRANSIENT if 400 <= error.smtp_code < 500 else PERMANENT
+    if isinstance(error, smtplib.SMTPException):
+        return PERMANENT
+    if isinstance(error, OSError):
+        return TRANSIENT
+    return PERMANENT
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Delay after the given failed attempt: base * 2^(attempt-1), capped, then jittered to 50-100%"""
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class RetryQueue:
+    """Recipients waiting for another attempt, ordered by due time. Used from the dispatching thread only."""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 30.0, max_delay: float = 600.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap: List[Tuple[float, int, object]] = []
+        self._order = count()
+        self._attempts: Dict[Hashable, int] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> 'RetryQueue':
+        return cls(max_attempts=int(config.get('max_send_attempts', 3)),
+                   base_delay=float(config.get('retry_base_delay', 30)),
+                   max_delay=float(config.get('retry_max_delay', 600)))
+
+    def attempts(self, key: Hashable) -> int:
+        """Attempts made so far for key (1 until it has been retried)"""
+        return self._attempts.get(key, 1)
+
+    def schedule(self, key: Hashable, item) -> Optional[float]:
+        """
+        Queue item for another attempt after key's latest failure
+
+        Returns:
+            The delay in seconds, or None when key has used up its attempts
+        """
+        attempt = self.attempts(key)
+        if attempt >= self.max_attempts:
+            return None
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        self._attempts[key] = attempt + 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), item))
+        return delay
+
+    def pop_due(self):
+        """The next item whose delay has passed, or None"""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next item is due (None when the queue is empty)"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def drain(self) -> List:
+        """Remove and return every queued item, due or not"""
+        items = [item for _, _, item in sorted(self._heap)]
+        self._heap.clear()
+        return items
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -4,5 +4,7 @@ $env:FLASK_ENV="development"
 Write-Host "Starting Email Automation Website..."
 Write-Host "Open your browser to: http://localhost:5000"
 Write-Host ""
+# Campaigns are run by a separate worker process
+Start-Process python -ArgumentList "-m", "worker" -NoNewWindow
 python app.py
 
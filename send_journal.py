@@ -0,0 +1,127 @@
+"""
+Send Journal - Crash-safe, append-only record of every send outcome
+Each result is written as one JSON line as soon as it is known, fsync'd in batches,
+and the active file is rotated once it grows past a size limit.
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = 'journal'
+JOURNAL_PATTERN = 'send_journal_*.jsonl'
+
+
+class SendJournal:
+    """Append-only JSON-lines journal with batched fsync and size-based rotation"""
+
+    def __init__(self, directory: str = DEFAULT_JOURNAL_DIR, max_bytes: int = 10 * 1024 * 1024,
+                 fsync_every: int = 50, fsync_interval: float = 1.0):
+        """
+        Args:
+            directory: Where journal files live
+            max_bytes: Rotate to a new file once the active one is larger than this
+            fsync_every: fsync after this many records...
+            fsync_interval: ...or after this many seconds, whichever comes first
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._open(self._latest_index() or 1)
+
+    def _path(self, index: int) -> str:
+        return os.path.join(self.directory, f'send_journal_{index:06d}.jsonl')
+
+    def _latest_index(self) -> int:
+        files = journal_files(self.directory)
+        if not files:
+            return 0
+        return int(os.path.basename(files[-1])[len('send_journal_'):-len('.jsonl')])
+
+    def _open(self, index: int):
+        self._index = index
+        path = self._path(index)
+        torn = False
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        self._file = open(path, 'a', encoding='utf-8')
+        if torn:
+            # A crash mid-write left a partial last line; end it so the next record stays readable
+            self._file.write('\n')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record: Dict):
+        """Write one record. It reaches the OS immediately and the disk within the fsync batch window."""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            if self._file.tell() >= self.max_bytes:
+                self._sync()
+                self._file.close()
+                self._open(self._index + 1)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._sync()
+                self._file.close()
+
+
+def journal_files(directory: str = DEFAULT_JOURNAL_DIR) -> List[str]:
+    """Journal files in write order"""
+    return sorted(glob.glob(os.path.join(directory, JOURNAL_PATTERN)))
+
+
+def read_journal(directory: str = DEFAULT_JOURNAL_DIR) -> Iterator[Dict]:
+    """Yield every record in the journal, skipping a torn final line left by a crash"""
+    for path in journal_files(directory):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.debug(f"Skipping unreadable journal line in {path}")
+        except OSError as e:
+            logger.debug(f"Error reading journal file {path}: {e}")
+
+
+def load_unfinished_results(directory: str = DEFAULT_JOURNAL_DIR) -> List[Dict]:
+    """
+    Results of runs that never reached save_results (e.g. the process was killed)
+
+    Runs that finished normally end with a 'run_end' record and their results are
+    already in a results_*.csv file, so they are left out to avoid double counting.
+    """
+    by_run: Dict[str, List[Dict]] = {}
+    finished = set()
+    for record in read_journal(directory):
+        run_id = record.get('run_id', '')
+        if record.get('event') == 'run_end':
+            finished.add(run_id)
+        elif 'status' in record:
+            by_run.setdefault(run_id, []).append(record)
+    return [record for run_id, records in by_run.items() if run_id not in finished for record in records]
@@ -0,0 +1,206 @@
+"""
+Sender Accounts - Spread one campaign over several sending accounts
+Each account keeps its own transport (and so its own SMTP connections), its own rate limiter and its
+own health. The dispatcher hands each recipient to a healthy account that has budget right now,
+preferring the one with the most daily quota left, so throughput grows with the number of accounts.
+
+Configured with a `sender_accounts` list in config; each entry overrides the top-level settings:
+
+    "sender_accounts": [
+        {"sender_email": "a@example.com", "sender_password": "...", "max_emails_per_day": 400},
+        {"sender_email": "b@example.com", "sender_password": "...", "smtp_server": "smtp.example.com"}
+    ]
+"""
+
+import logging
+import random
+import smtplib
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from rate_limiter import get_rate_limiter
+from transports import Transport, create_transport
+
+logger = logging.getLogger(__name__)
+
+# Back-off after consecutive temporary failures: 30s, 60s, 120s ... up to 15 minutes
+COOLDOWN_BASE = 30.0
+COOLDOWN_MAX = 900.0
+# Rejected logins and exhausted provider quotas bench the account for longer (or until its password changes)
+SUSPEND_SECONDS = 3600.0
+
+
+def failure_kind(error: Exception) -> Optional[str]:
+    """
+    What a send failure says about the account that sent it:
+    'auth' / 'quota' (suspend the account), 'throttled' / 'connection' (back off),
+    or None when the recipient or message was at fault
+    """
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return 'auth'
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return None
+    code = getattr(error, 'smtp_code', None)
+    detail = str(getattr(error, 'smtp_error', b'') or error).lower()
+    if '5.4.5' in detail or (isinstance(code, int) and code >= 500 and ('quota' in detail or 'limit exceeded' in detail)):
+        return 'quota'
+    if isinstance(code, int) and 400 <= code < 500:
+        return 'throttled'
+    if isinstance(error, smtplib.SMTPSenderRefused):
+        return 'auth'
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)):
+        return 'connection'
+    return None
+
+
+class SenderAccount:
+    """One sending identity: transport, pacing and health"""
+
+    def __init__(self, config: Dict):
+        self._lock = threading.Lock()
+        self._transport: Optional[Transport] = None
+        self.failures = 0  # Consecutive temporary failures
+        self.cooldown_until = 0.0
+        self.suspended: Optional[str] = None  # 'auth' or 'quota' while suspended
+        self.stats = {'sent': 0, 'failed': 0}
+        self.config: Dict = {}
+        self.update(config)
+
+    def update(self, config: Dict):
+        if self.suspended == 'auth' and config.get('sender_password') != self.config.get('sender_password'):
+            self.suspended, self.cooldown_until = None, 0.0  # New credentials deserve a new try
+        self.config = config
+        self.email = config['sender_email']
+        self.limiter = get_rate_limiter(config)
+
+    def get_transport(self) -> Transport:
+        with self._lock:
+            if self._transport is None:
+                self._transport = create_transport(self.config)
+            return self._transport
+
+    def send(self, to_email: str, subject: str, body: str):
+        """Send with this account's transport, updating its health"""
+        try:
+            self.get_transport().send(to_email, subject, body)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def remaining_quota(self) -> float:
+        """Sends left today (unlimited without max_emails_per_day)"""
+        return self.limiter.get_stats().get('day', float('inf'))
+
+    def record_success(self):
+        with self._lock:
+            self.stats['sent'] += 1
+            self.failures = 0
+            self.suspended = None
+
+    def record_failure(self, error: Exception):
+        kind = failure_kind(error)
+        with self._lock:
+            self.stats['failed'] += 1
+            if kind in ('auth', 'quota'):
+                if self.suspended is None:
+                    logger.warning(f"Sender {self.email} suspended for {SUSPEND_SECONDS:.0f}s ({kind}): {error}")
+                self.suspended = kind
+                self.cooldown_until = time.monotonic() + SUSPEND_SECONDS
+            elif kind is not None:
+                self.failures += 1
+                pause = min(COOLDOWN_MAX, COOLDOWN_BASE * 2 ** (self.failures - 1))
+                self.cooldown_until = time.monotonic() + pause
+                logger.warning(f"Sender {self.email} paused for {pause:.0f}s after {self.failures} {kind} failure(s)")
+
+    def close(self):
+        with self._lock:
+            transport, self._transport = self._transport, None
+        if transport is not None:
+            transport.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats, suspended=self.suspended)
+        stats['budget'] = self.limiter.get_stats()
+        return stats
+
+
+class SenderRotation:
+    """Chooses the account for each recipient"""
+
+    def __init__(self, accounts: List[SenderAccount]):
+        self.accounts = accounts
+
+    def acquire(self, max_wait: Optional[float] = None,
+                wait_fn: Callable[[float], None] = time.sleep) -> Optional[SenderAccount]:
+        """
+        Block until some account may send, and take one token from its limiter
+
+        Args:
+            max_wait: Give up (return None) if no account can send within this many seconds
+            wait_fn: Called with the number of seconds to wait (see RateLimiter.acquire)
+
+        Returns:
+            The account to send with, or None when every account is out of budget or unusable
+        """
+        while True:
+            now = time.monotonic()
+            ready = [account for account in self.accounts if account.available(now)]
+            wait, limiting = float('inf'), None
+            for account in sorted(ready, key=lambda a: a.remaining_quota(), reverse=True):
+                acquired, account_wait, bucket = account.limiter.try_acquire()
+                if acquired:
+                    if account.limiter.jitter > 0:
+                        wait_fn(random.uniform(0, account.limiter.jitter))
+                    return account
+                if account_wait < wait:
+                    wait, limiting = account_wait, f"{account.email} {bucket}"
+            for account in self.accounts:
+                if now < account.cooldown_until and account.cooldown_until - now < wait:
+                    wait, limiting = account.cooldown_until - now, f"{account.email} {account.suspended or 'cooldown'}"
+            if max_wait is not None and wait > max_wait:
+                logger.warning(f"All sender accounts are out of budget: next send allowed in {wait:.0f}s ({limiting})")
+                return None
+            wait_fn(min(wait, 1.0))
+
+    def next_send_in(self) -> float:
+        """Seconds until some account could send (see RateLimiter.next_send_in), without taking anything"""
+        now = time.monotonic()
+        return min(max(account.cooldown_until - now, account.limiter.next_send_in()) for account in self.accounts)
+
+    def close(self):
+        for account in self.accounts:
+            account.close()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {account.email: account.get_stats() for account in self.accounts}
+
+
+_accounts: Dict[str, SenderAccount] = {}
+_accounts_lock = threading.Lock()
+
+
+def get_sender_account(config: Dict) -> SenderAccount:
+    """The process-wide account for config's sender, so campaigns sharing it share health and budget"""
+    key = f"{config.get('email_provider') or 'smtp'}:{config['sender_email'].lower()}"
+    with _accounts_lock:
+        account = _accounts.get(key)
+        if account is None:
+            account = _accounts[key] = SenderAccount(config)
+        else:
+            account.update(config)
+        return account
+
+
+def create_rotation(config: Dict) -> Optional[SenderRotation]:
+    """A rotation over config['sender_accounts'], or None when none are configured"""
+    entries = [entry for entry in config.get('sender_accounts') or [] if entry.get('sender_email')]
+    if not entries:
+        return None
+    base = {key: value for key, value in config.items() if key != 'sender_accounts'}
+    return SenderRotation([get_sender_account(dict(base, **entry)) for entry in entries])
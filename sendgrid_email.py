@@ -2,12 +2,35 @@
 SendGrid Email Sender - Works on Railway and other platforms that block SMTP
 """
 
+import json
 import logging
+import re
+from typing import Dict, List, Set, Tuple
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
 logger = logging.getLogger(__name__)
 
+# SendGrid v3 accepts at most this many personalizations in one mail/send request
+MAX_PERSONALIZATIONS = 1000
+
+_PERSONALIZATION_FIELD = re.compile(r'^personalizations\.(\d+)\.')
+
+
+def rejected_personalizations(error) -> Set[int]:
+    """Indexes of the personalizations a 400 response complains about (empty if it names none)"""
+    try:
+        body = error.body.decode() if isinstance(error.body, bytes) else error.body
+        errors = json.loads(body).get('errors', [])
+    except (AttributeError, TypeError, ValueError):
+        return set()
+    indexes = set()
+    for item in errors:
+        match = _PERSONALIZATION_FIELD.match(item.get('field') or '')
+        if match:
+            indexes.add(int(match.group(1)))
+    return indexes
+
 
 class SendGridEmailSender:
     """Send emails using SendGrid API (no SMTP needed)"""
@@ -59,6 +82,57 @@ class SendGridEmailSender:
         except Exception as e:
             logger.error(f"❌ SendGrid error sending to {to_email}: {str(e)}")
             return False
+    
+    def send_batch(self, recipients: List[Tuple[str, Dict[str, str]]], subject: str, body: str) -> List[bool]:
+        """
+        Send one message to up to MAX_PERSONALIZATIONS recipients in a single API call
+        
+        SendGrid fills in each recipient's copy using their substitutions, which are applied to
+        both the subject and the body.
+        
+        Args:
+            recipients: (to_email, substitutions) pairs, e.g. ('a@b.com', {'{company_name}': 'Acme'})
+            subject: Subject template
+            body: Body template (plain text)
+            
+        Returns:
+            list: True for each recipient SendGrid accepted, in the same order as recipients
+        """
+        if len(recipients) > MAX_PERSONALIZATIONS:
+            raise ValueError(f"At most {MAX_PERSONALIZATIONS} recipients per batch, got {len(recipients)}")
+        outcomes = [False] * len(recipients)
+        remaining = list(range(len(recipients)))
+        
+        # If SendGrid rejects specific recipients, drop them and retry the rest once
+        for attempt in range(2):
+            message = {
+                'from': {'email': self.from_email, 'name': self.from_name},
+                'subject': subject,
+                'content': [{'type': 'text/plain', 'value': body}],
+                'personalizations': [
+                    {'to': [{'email': recipients[index][0]}], 'substitutions': recipients[index][1]}
+                    for index in remaining
+                ],
+            }
+            try:
+                logger.info(f"📤 Sending batch of {len(remaining)} via SendGrid")
+                response = self.client.send(message)
+            except Exception as e:
+                rejected = rejected_personalizations(e) if getattr(e, 'status_code', None) == 400 else set()
+                if attempt == 0 and rejected and len(rejected) < len(remaining):
+                    logger.warning(f"⚠️ SendGrid rejected {len(rejected)} recipient(s) in batch, retrying the rest: {e}")
+                    remaining = [index for position, index in enumerate(remaining) if position not in rejected]
+                    continue
+                logger.error(f"❌ SendGrid batch of {len(remaining)} failed: {str(e)}")
+                return outcomes
+            
+            if response.status_code in [200, 201, 202]:
+                logger.info(f"✅ SendGrid: Batch of {len(remaining)} accepted (Status: {response.status_code})")
+                for index in remaining:
+                    outcomes[index] = True
+            else:
+                logger.error(f"❌ SendGrid returned status {response.status_code} for batch of {len(remaining)}")
+            return outcomes
 
 
 def test_sendgrid_connection(api_key, from_email):
@@ -0,0 +1,149 @@
+"""
+Sent Recipient Index - Persistent suppression list of already-emailed addresses
+Backed by SQLite so duplicate checks are O(1) lookups instead of re-reading every results_*.csv
+"""
+
+import csv
+import glob
+import logging
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = 'sent_emails.db'
+
+
+class SentEmailIndex:
+    """Lower-cased recipient addresses with the status they were processed with"""
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sent_email (
+                    email TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS imported_file (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def contains(self, email: str, include_dry_run: bool = True) -> bool:
+        """Check whether an address was already sent to (or dry-run, if include_dry_run)"""
+        if not email:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status FROM sent_email WHERE email = ?', (email.strip().lower(),)
+            ).fetchone()
+        if row is None:
+            return False
+        return row[0] == 'sent' or (include_dry_run and row[0] == 'dry_run')
+
+    def add(self, email: str, status: str):
+        """Record a processed address. A 'sent' status is never downgraded to 'dry_run'."""
+        self.add_many([(email, status)])
+
+    def add_many(self, records: Iterable):
+        """Record many (email, status) pairs in one transaction"""
+        rows = [(email.strip().lower(), status) for email, status in records
+                if email and status in ('sent', 'dry_run')]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO sent_email (email, status) VALUES (?, ?)
+                ON CONFLICT(email) DO UPDATE SET status = excluded.status, updated_at = CURRENT_TIMESTAMP
+                WHERE sent_email.status != 'sent'
+            """, rows)
+            self._conn.commit()
+
+    def emails(self, include_dry_run: bool = True) -> set:
+        """All indexed addresses as a set"""
+        statuses = ('sent', 'dry_run') if include_dry_run else ('sent',)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT email FROM sent_email WHERE status IN ({','.join('?' * len(statuses))})", statuses
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM sent_email').fetchone()[0]
+
+    def import_results_files(self, pattern: str = 'results_*.csv') -> int:
+        """
+        Import sent/dry_run rows from results CSV files not yet seen (or changed since last import)
+
+        Returns:
+            int: Number of files imported
+        """
+        imported = 0
+        for path in sorted(glob.glob(pattern)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = os.path.abspath(path)
+            with self._lock:
+                seen = self._conn.execute(
+                    'SELECT mtime, size FROM imported_file WHERE path = ?', (key,)
+                ).fetchone()
+            if seen and seen[0] == stat.st_mtime and seen[1] == stat.st_size:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    reader = csv.DictReader(f)
+                    self.add_many(
+                        (row.get('email', ''), row.get('status', '').lower()) for row in reader
+                    )
+            except Exception as e:
+                logger.debug(f"Error reading result file {path}: {e}")
+                continue
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO imported_file (path, mtime, size) VALUES (?, ?, ?)',
+                    (key, stat.st_mtime, stat.st_size)
+                )
+                self._conn.commit()
+            imported += 1
+        if imported:
+            logger.info(f"Imported {imported} results file(s) into sent index {self.db_path}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    """Rebuild / refresh the index from existing results files"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sent recipient index maintenance')
+    parser.add_argument('--db', type=str, default=DEFAULT_INDEX_PATH, help='Path to the index database')
+    parser.add_argument('--pattern', type=str, default='results_*.csv', help='Results files to import')
+    args = parser.parse_args()
+
+    index = SentEmailIndex(args.db)
+    files = index.import_results_files(args.pattern)
+    print(f"Imported {files} file(s). Index now holds {index.count()} addresses.")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+SMTP Connection Pool - Reuses authenticated SMTP sessions across messages
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """An authenticated SMTP session plus bookkeeping used by the pool"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.message_count = 0
+
+
+class SMTPConnectionPool:
+    """Pool of logged-in SMTP sessions for a single sender account"""
+
+    def __init__(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str,
+                 max_connections: int = 2, max_messages_per_connection: int = 100,
+                 noop_interval: float = 30.0, timeout: float = 30.0, use_tls: bool = True):
+        """
+        Initialize the pool
+
+        Args:
+            smtp_server: SMTP host
+            smtp_port: SMTP port (465 uses implicit SSL, anything else uses STARTTLS)
+            sender_email: Login / envelope sender
+            sender_password: App password
+            max_connections: Upper bound on idle sessions kept open
+            max_messages_per_connection: Recycle a session after this many messages
+            noop_interval: Idle seconds after which a session is checked with NOOP before reuse
+            timeout: Socket timeout for new sessions
+            use_tls: Use SSL/STARTTLS (turn off only for local test servers)
+        """
+        self.smtp_server = smtp_server
+        self.smtp_port = int(smtp_port)
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.max_connections = max(1, int(max_connections))
+        self.max_messages_per_connection = max(1, int(max_messages_per_connection))
+        self.noop_interval = noop_interval
+        self.timeout = timeout
+        self.use_tls = use_tls
+
+        self._idle: List[PooledConnection] = []
+        self._lock = threading.Lock()
+        self.stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'connections_reused': 0,
+            'messages_sent': 0,
+            'noop_checks': 0,
+            'noop_failures': 0,
+            'reconnects': 0,
+        }
+
+    def _connect(self) -> PooledConnection:
+        """Open, secure and authenticate a new SMTP session"""
+        logger.info(f"Connecting to SMTP server: {self.smtp_server}:{self.smtp_port}")
+        with time_stage('smtp_connect'):
+            if self.use_tls and self.smtp_port == 465:
+                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+        try:
+            if self.use_tls and self.smtp_port != 465:
+                with time_stage('smtp_tls'):
+                    server.starttls()
+            if self.sender_password:
+                with time_stage('smtp_login'):
+                    server.login(self.sender_email, self.sender_password)
+        except Exception:
+            self._quit(server)
+            raise
+        logger.info(f"✅ SMTP session opened for {self.sender_email}")
+        with self._lock:
+            self.stats['connections_opened'] += 1
+        return PooledConnection(server)
+
+    def _quit(self, server: smtplib.SMTP):
+        """Close a session, ignoring errors from already-dead sockets"""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _discard(self, conn: PooledConnection):
+        self._quit(conn.server)
+        with self._lock:
+            self.stats['connections_closed'] += 1
+
+    def _is_alive(self, conn: PooledConnection) -> bool:
+        """Check an idle session with NOOP"""
+        with self._lock:
+            self.stats['noop_checks'] += 1
+        try:
+            code, _ = conn.server.noop()
+            if code == 250:
+                return True
+        except Exception:
+            pass
+        with self._lock:
+            self.stats['noop_failures'] += 1
+        return False
+
+    def acquire(self) -> PooledConnection:
+        """Get a healthy session, reusing an idle one when possible"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if time.monotonic() - conn.last_used >= self.noop_interval and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            with self._lock:
+                self.stats['connections_reused'] += 1
+            return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a session to the pool, or close it if it is spent"""
+        conn.last_used = time.monotonic()
+        if conn.message_count >= self.max_messages_per_connection:
+            self._discard(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_connections:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def sendmail(self, from_addr: str, to_addrs, msg: Union[str, bytes]):
+        """Send one message over a pooled session, reconnecting once if the server dropped it"""
+        conn = self.acquire()
+        try:
+            conn.server.sendmail(from_addr, to_addrs, msg)
+        except smtplib.SMTPServerDisconnected:
+            self._discard(conn)
+            with self._lock:
+                self.stats['reconnects'] += 1
+            conn = self._connect()
+            try:
+                conn.server.sendmail(from_addr, to_addrs, msg)
+            except Exception:
+                self._discard(conn)
+                raise
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # The session itself is still usable after a per-message rejection
+            conn.message_count += 1
+            self.release(conn)
+            raise
+        except Exception:
+            self._discard(conn)
+            raise
+        conn.message_count += 1
+        with self._lock:
+            self.stats['messages_sent'] += 1
+        self.release(conn)
+
+    def close(self):
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def get_stats(self) -> Dict:
+        """Snapshot of pool counters"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle_connections'] = len(self._idle)
+        return stats
+
+
+_pools: Dict[Tuple[str, int, str], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: Dict) -> SMTPConnectionPool:
+    """Get (or create) the shared pool for the sender account described by config"""
+    smtp_server = config.get('smtp_server', 'smtp.gmail.com')
+    smtp_port = int(config.get('smtp_port', 587))
+    sender_email = config['sender_email']
+    key = (smtp_server, smtp_port, sender_email)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.sender_password != config.get('sender_password'):
+            if pool is not None:
+                pool.close()
+            pool = SMTPConnectionPool(
+                smtp_server,
+                smtp_port,
+                sender_email,
+                config.get('sender_password'),
+                max_connections=config.get('smtp_pool_size', 2),
+                max_messages_per_connection=config.get('max_messages_per_connection', 100),
+                noop_interval=config.get('smtp_noop_interval', 30),
+                use_tls=config.get('smtp_use_tls', True),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close idle sessions in every pool (e.g. at the end of a run)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def get_all_pool_stats() -> Dict[str, Dict]:
+    """Stats for every pool keyed by sender"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {f"{email} via {server}:{port}": pool.get_stats() for (server, port, email), pool in pools}
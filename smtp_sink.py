@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+SMTP Sink - Local mail server that accepts every message, for load and soak tests
+No TLS, no auth and no real delivery: messages are counted and optionally appended to an mbox file.
+
+Usage:
+    python smtp_sink.py --port 1025 --mbox sink/outbox.mbox
+"""
+
+import logging
+import os
+import re
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_FROM_LINE = re.compile(rb'^(>*From )', re.MULTILINE)
+
+
+class MboxWriter:
+    """Appends messages to an mbox file; safe to share between threads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        self.count = 0
+
+    def write(self, sender: str, message: bytes):
+        """Append one message (CRLF or LF line endings); it is in the file when this returns"""
+        body = _FROM_LINE.sub(rb'>\1', message.replace(b'\r\n', b'\n')).rstrip(b'\n')
+        envelope = f"From {sender or 'MAILER-DAEMON'} {time.asctime()}\n".encode()
+        with self._lock:
+            self._file.write(envelope + body + b'\n\n')
+            # Flushed per message: the local sink is never stopped at exit, and a sender that got
+            # its 250 OK must find the message in the file
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def read_data(self) -> Optional[bytes]:
+        lines = []
+        for raw in self.rfile:
+            if raw in (b'.\r\n', b'.\n'):
+                return b''.join(lines)
+            lines.append(raw[1:] if raw.startswith(b'.') else raw)
+        return None
+
+    def handle(self):
+        sink = self.server.sink
+        self.reply('220 localhost SMTP sink ready')
+        mail_from, recipients = None, []
+        for raw in self.rfile:
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = line[:4].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250-8BITMIME\r\n250 PIPELINING\r\n')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                mail_from, recipients = _address(line), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(_address(line))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                if not recipients:
+                    self.reply('503 Need RCPT command')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = self.read_data()
+                if data is None:
+                    return
+                sink.deliver(mail_from, recipients, data)
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                mail_from, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+def _address(line: str) -> str:
+    """Address from 'MAIL FROM:<a@b> SIZE=1' / 'RCPT TO:<a@b>'"""
+    value = line.split(':', 1)[1].strip() if ':' in line else ''
+    return value.split(' ', 1)[0].strip('<>')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """In-process SMTP server on a background thread"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, mbox_path: Optional[str] = None):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free one; see .port)
+            mbox_path: Append received messages here (None = only count them)
+        """
+        self.host = host
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        self.mbox = MboxWriter(mbox_path) if mbox_path else None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'messages': 0, 'recipients': 0, 'bytes': 0}
+
+    def deliver(self, mail_from: str, recipients: List[str], data: bytes):
+        if self.mbox is not None:
+            self.mbox.write(mail_from, data)
+        with self._lock:
+            self.stats['messages'] += 1
+            self.stats['recipients'] += len(recipients)
+            self.stats['bytes'] += len(data)
+
+    def start(self) -> 'SMTPSink':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name='smtp-sink')
+        self._thread.start()
+        logger.info(f"SMTP sink listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.mbox is not None:
+            self.mbox.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local SMTP sink for load testing')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=1025, help='Port to listen on')
+    parser.add_argument('--mbox', type=str, default=None, help='Append received messages to this mbox file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sink = SMTPSink(args.host, args.port, args.mbox).start()
+    print(f"Accepting mail on {args.host}:{sink.port} (point smtp_server/smtp_port here and set smtp_use_tls to false)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"Received: {sink.get_stats()}")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,11 @@ if ! command -v gunicorn &> /dev/null; then
     pip install -r requirements.txt
 fi
 
-# Run migrations/create database
-python -c "from app import app, db; app.app_context().push(); db.create_all()"
+# Apply database migrations (once per deploy)
+python migrations.py
+
+# Start the campaign worker (web requests only queue campaigns)
+python -m worker &
 
 # Start the application
 if [ "$FLASK_ENV" = "production" ]; then
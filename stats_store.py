@@ -0,0 +1,253 @@
+"""
+Stats Store - Persistent, incrementally maintained send statistics
+Totals, per-day and per-run counters and unique email/company counts live in SQLite. Each refresh only
+reads journal lines and results files it has not seen before, so reading the statistics costs the same
+however much history there is.
+
+Sources:
+    journal/send_journal_*.jsonl  every outcome as it happens, counted under its run_id
+    results_*.csv                 runs from before the journal existed (files a journaled run wrote are skipped)
+"""
+
+import csv
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from send_journal import DEFAULT_JOURNAL_DIR, journal_files
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATS_PATH = 'email_stats.db'
+
+
+class StatsStore:
+    """Aggregated send outcomes by status, day and source (run id or legacy results file)"""
+
+    def __init__(self, db_path: str = DEFAULT_STATS_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS source_count (
+                    source TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (source, day, status)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS day_count (
+                    day TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (day, status)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS total (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS seen_email (email TEXT PRIMARY KEY) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS seen_company (name TEXT PRIMARY KEY) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS results_file (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    journaled INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS journal_position (
+                    path TEXT PRIMARY KEY,
+                    offset INTEGER NOT NULL
+                );
+            """)
+            self._conn.commit()
+
+    def _bump(self, name: str, amount: int):
+        self._conn.execute("""
+            INSERT INTO total (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """, (name, amount))
+
+    def _add(self, source: str, records: Iterable[Dict]):
+        """Count result records under source (caller holds the lock and commits)"""
+        counts: Dict[Tuple[str, str], int] = {}
+        emails, companies = set(), set()
+        for record in records:
+            status = (record.get('status') or '').lower()
+            day = (record.get('timestamp') or '').split('T')[0]
+            counts[(day, status)] = counts.get((day, status), 0) + 1
+            if record.get('email'):
+                emails.add(record['email'].strip().lower())
+            if record.get('company'):
+                companies.add(record['company'])
+        for (day, status), count in counts.items():
+            self._conn.execute("""
+                INSERT INTO source_count (source, day, status, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT(source, day, status) DO UPDATE SET count = count + excluded.count
+            """, (source, day, status, count))
+            self._conn.execute("""
+                INSERT INTO day_count (day, status, count) VALUES (?, ?, ?)
+                ON CONFLICT(day, status) DO UPDATE SET count = count + excluded.count
+            """, (day, status, count))
+            self._bump('total', count)
+            self._bump(f'status:{status}', count)
+        for table, column, name, values in (('seen_email', 'email', 'unique_emails', emails),
+                                            ('seen_company', 'name', 'unique_companies', companies)):
+            before = self._conn.total_changes
+            self._conn.executemany(f'INSERT OR IGNORE INTO {table} ({column}) VALUES (?)', ((v,) for v in values))
+            self._bump(name, self._conn.total_changes - before)
+
+    def _drop_source(self, source: str):
+        """Remove a source's counters (unique email/company sets only ever grow)"""
+        rows = self._conn.execute(
+            'SELECT day, status, count FROM source_count WHERE source = ?', (source,)
+        ).fetchall()
+        for day, status, count in rows:
+            self._conn.execute('UPDATE day_count SET count = count - ? WHERE day = ? AND status = ?',
+                               (count, day, status))
+            self._bump('total', -count)
+            self._bump(f'status:{status}', -count)
+        self._conn.execute('DELETE FROM source_count WHERE source = ?', (source,))
+
+    def _mark_journaled(self, results_file: str):
+        """A journaled run wrote this results file: its rows are already counted under the run id"""
+        path = os.path.abspath(results_file)
+        seen = self._conn.execute('SELECT journaled FROM results_file WHERE path = ?', (path,)).fetchone()
+        if seen and not seen[0]:
+            self._drop_source(os.path.basename(path))
+        self._conn.execute("""
+            INSERT INTO results_file (path, mtime, size, journaled) VALUES (?, 0, 0, 1)
+            ON CONFLICT(path) DO UPDATE SET journaled = 1
+        """, (path,))
+
+    def ingest_journal(self, directory: str = DEFAULT_JOURNAL_DIR) -> int:
+        """
+        Count journal lines written since the last call
+
+        Returns:
+            int: Number of result records added
+        """
+        added = 0
+        for path in journal_files(directory):
+            key = os.path.abspath(path)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            with self._lock:
+                row = self._conn.execute('SELECT offset FROM journal_position WHERE path = ?', (key,)).fetchone()
+            offset = row[0] if row else 0
+            if offset > size:
+                logger.warning(f"Journal file {path} shrank; counting it again from the start")
+                offset = 0
+            if offset == size:
+                continue
+
+            by_run: Dict[str, List[Dict]] = {}
+            finished = []
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Still being written; picked up next time
+                    offset += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.debug(f"Skipping unreadable journal line in {path}")
+                        continue
+                    if record.get('event') == 'run_end':
+                        if record.get('results_file'):
+                            finished.append(record['results_file'])
+                    elif 'status' in record:
+                        by_run.setdefault(record.get('run_id', ''), []).append(record)
+
+            with self._lock:
+                for run_id, records in by_run.items():
+                    self._add(run_id, records)
+                    added += len(records)
+                for results_file in finished:
+                    self._mark_journaled(results_file)
+                self._conn.execute('INSERT OR REPLACE INTO journal_position (path, offset) VALUES (?, ?)',
+                                   (key, offset))
+                self._conn.commit()
+        return added
+
+    def import_results_files(self, pattern: str = 'results_*.csv') -> int:
+        """
+        Count results files not seen before (or changed since) that no journaled run accounts for
+
+        Returns:
+            int: Number of files imported
+        """
+        with self._lock:
+            known = {path: (mtime, size, journaled) for path, mtime, size, journaled
+                     in self._conn.execute('SELECT path, mtime, size, journaled FROM results_file')}
+        imported = 0
+        for path in sorted(glob.glob(pattern)):
+            key = os.path.abspath(path)
+            seen = known.get(key)
+            if seen and seen[2]:
+                continue
+            try:
+                stat = os.stat(path)
+                if seen and seen[0] == stat.st_mtime and seen[1] == stat.st_size:
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    records = list(csv.DictReader(f))
+            except Exception as e:
+                logger.debug(f"Error reading result file {path}: {e}")
+                continue
+            source = os.path.basename(key)
+            with self._lock:
+                if seen:
+                    self._drop_source(source)
+                self._add(source, records)
+                self._conn.execute('INSERT OR REPLACE INTO results_file (path, mtime, size, journaled) VALUES (?, ?, ?, 0)',
+                                   (key, stat.st_mtime, stat.st_size))
+                self._conn.commit()
+            imported += 1
+        return imported
+
+    def refresh(self, pattern: str = 'results_*.csv', journal_dir: str = DEFAULT_JOURNAL_DIR):
+        """Catch up on new journal lines, then on results files (so journaled runs' files are skipped)"""
+        self.ingest_journal(journal_dir)
+        self.import_results_files(pattern)
+
+    def totals(self) -> Dict[str, int]:
+        """Counters such as 'total', 'unique_emails', 'unique_companies' and 'status:<status>'"""
+        with self._lock:
+            return dict(self._conn.execute('SELECT name, value FROM total'))
+
+    def by_date(self, statuses: Tuple[str, ...] = ('sent', 'failed')) -> Dict[str, Dict[str, int]]:
+        """{day: {status: count}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT day, status, count FROM day_count WHERE day != '' AND count > 0 "
+                f"AND status IN ({','.join('?' * len(statuses))})", statuses
+            ).fetchall()
+        days: Dict[str, Dict[str, int]] = {}
+        for day, status, count in rows:
+            days.setdefault(day, dict.fromkeys(statuses, 0))[status] = count
+        return days
+
+    def by_source(self) -> Dict[str, Dict[str, int]]:
+        """{run id or results file: {status: count}}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT source, status, SUM(count) FROM source_count GROUP BY source, status'
+            ).fetchall()
+        sources: Dict[str, Dict[str, int]] = {}
+        for source, status, count in rows:
+            sources.setdefault(source, {})[status] = count
+        return sources
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,85 @@
+"""
+Template Engine - Compiles email templates once and renders each recipient with a single join
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+# Placeholders that personalize_email knows how to fill
+PLACEHOLDERS = (
+    'company_name',
+    'founder_name',
+    'founder_email',
+    'website',
+    'industry',
+    'sender_name',
+    'github_profile',
+)
+
+PLACEHOLDER_PATTERN = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+
+class TemplateError(ValueError):
+    """Raised when a template uses placeholders that cannot be filled"""
+
+    def __init__(self, unknown: Iterable[str]):
+        self.unknown = sorted(set(unknown))
+        names = ', '.join(f'{{{name}}}' for name in self.unknown)
+        super().__init__(f"Unknown placeholder(s) in template: {names}. "
+                         f"Allowed: {', '.join(f'{{{name}}}' for name in PLACEHOLDERS)}")
+
+
+class CompiledTemplate:
+    """A template split into literal chunks and placeholder slots"""
+
+    __slots__ = ('source', 'parts', 'slots', 'placeholders')
+
+    def __init__(self, source: str, parts: List[str], slots: List[Tuple[int, str]]):
+        self.source = source
+        self.parts = parts
+        self.slots = slots
+        self.placeholders = frozenset(name for _, name in slots)
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Fill every slot from values (which must hold a string for each placeholder used)"""
+        if not self.slots:
+            return self.source
+        parts = self.parts.copy()
+        for index, name in self.slots:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    """
+    Parse a template into literal chunks and placeholder slots (cached per template content)
+
+    Raises:
+        TemplateError: if the template contains placeholders outside PLACEHOLDERS
+    """
+    parts: List[str] = []
+    slots: List[Tuple[int, str]] = []
+    unknown = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(source):
+        name = match.group(1)
+        if name not in PLACEHOLDERS:
+            unknown.append(name)
+            continue
+        if match.start() > position:
+            parts.append(source[position:match.start()])
+        slots.append((len(parts), name))
+        parts.append('')
+        position = match.end()
+    if unknown:
+        raise TemplateError(unknown)
+    if position < len(source):
+        parts.append(source[position:])
+    return CompiledTemplate(source, parts, slots)
+
+
+def validate_template(source: str):
+    """Raise TemplateError if source has unknown placeholders"""
+    compile_template(source)
@@ -0,0 +1,73 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The web app binds its database when imported, so point it at a scratch file before any test imports it
+_database_dir = tempfile.mkdtemp(prefix='email-app-tests-')
+atexit.register(shutil.rmtree, _database_dir, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_database_dir, 'app.db')
+
+
+class RecordingTransport:
+    """Stands in for SMTP in app tests: accepts every message and remembers the recipients"""
+    name = 'recording'
+    batch_size = 0
+    sent = []
+
+    def __init__(self, config):
+        self.config = config
+
+    def send(self, to_email, subject, body):
+        RecordingTransport.sent.append(to_email)
+
+    def get_stats(self):
+        return {'sent': len(self.sent)}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    """The web app module with empty tables, working in tmp_path, sending through RecordingTransport"""
+    monkeypatch.chdir(tmp_path)
+    import app as web
+    import rate_limiter
+    import sender_accounts
+    import transports
+
+    # Process-wide limiters and accounts would carry state (and the previous test's files) across tests
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(rate_limiter, '_quotas', {})
+    monkeypatch.setattr(sender_accounts, '_accounts', {})
+    monkeypatch.setitem(transports.TRANSPORTS, 'smtp', RecordingTransport)
+    monkeypatch.setattr(RecordingTransport, 'sent', [])
+    monkeypatch.setattr(web, '_initialized', True)
+
+    web.create_directories()
+    with web.app.app_context():
+        web.db.drop_all()
+        web.db.create_all()
+    yield web
+    with web.app.app_context():
+        web.db.session.remove()
+
+
+@pytest.fixture
+def client(web):
+    """A test client logged in as a user with SMTP settings"""
+    client = web.app.test_client()
+    client.post('/signup', json={'username': 'ada', 'email': 'ada@example.com', 'password': 'secret'})
+    client.post('/login', json={'username': 'ada', 'password': 'secret'})
+    with web.app.app_context():
+        user = web.User.query.filter_by(username='ada').one()
+        user.smtp_email, user.smtp_password = 'ada@example.com', 'app-password'
+        web.db.session.commit()
+    return client
@@ -0,0 +1,328 @@
+import base64
+import csv
+import datetime
+import functools
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import email_automation
+import rate_limiter
+from conftest import RecordingTransport
+
+
+def write_companies(path, emails):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['company_name', 'founder_email', 'founder_name'])
+        for n, email in enumerate(emails):
+            writer.writerow([f'Company {n}', email, f'Founder {n}'])
+
+
+@pytest.fixture
+def campaign(web, client):
+    """Id of a pending campaign to companies.csv for the logged-in user"""
+    def make(emails, **user_settings):
+        write_companies('companies.csv', emails)
+        with web.app.app_context():
+            user = web.User.query.filter_by(username='ada').one()
+            for name, value in dict({'delay_between_emails': 0}, **user_settings).items():
+                setattr(user, name, value)
+            row = web.Campaign(user_id=user.id, name='Launch', email_list_type='business_emails',
+                               custom_template_content='Hi {founder_name}', custom_subject_template='Hello')
+            web.db.session.add(row)
+            web.db.session.commit()
+            return row.id
+    return make
+
+
+def load(web, campaign_id):
+    with web.app.app_context():
+        row = web.db.session.get(web.Campaign, campaign_id)
+        web.db.session.expunge(row)
+        return row
+
+
+def test_daily_limit_pauses_the_campaign_until_the_next_day(web, campaign, monkeypatch):
+    emails = [f'founder{n}@example.com' for n in range(5)]
+    campaign_id = campaign(emails, max_emails_per_day=3)
+
+    web.run_campaign(campaign_id)
+
+    paused = load(web, campaign_id)
+    assert paused.status == 'paused'
+    assert (paused.sent_emails, paused.failed_emails, paused.checkpoint_offset) == (3, 0, 3)
+    assert paused.resume_at > datetime.datetime.utcnow() + datetime.timedelta(seconds=web.CAMPAIGN_PAUSE_MIN - 5)
+    # Not claimable until the limit lifts
+    assert web.claim_next_campaign('worker-1') is None
+
+    class Tomorrow(datetime.date):
+        @classmethod
+        def today(cls):
+            return datetime.date.today() + datetime.timedelta(days=1)
+
+    monkeypatch.setattr(rate_limiter, 'date', Tomorrow)
+    with web.app.app_context():
+        web.Campaign.query.filter_by(id=campaign_id).update({'resume_at': datetime.datetime.utcnow()})
+        web.db.session.commit()
+    assert web.claim_next_campaign('worker-1') == (campaign_id, True)
+    web.run_campaign(campaign_id, resume=True)
+
+    finished = load(web, campaign_id)
+    assert finished.status == 'completed'
+    assert (finished.sent_emails, finished.failed_emails) == (5, 0)
+    assert RecordingTransport.sent == emails
+
+
+def test_sending_limits_come_from_the_user_settings(web, client):
+    settings = client.get('/api/settings').get_json()['settings']
+    assert (settings['max_emails_per_day'], settings['delay_between_emails']) == (50, 5)
+
+    response = client.post('/api/settings', json={'max_emails_per_day': 200, 'delay_between_emails': 2})
+    assert response.get_json()['success']
+    settings = client.get('/api/settings').get_json()['settings']
+    assert (settings['max_emails_per_day'], settings['delay_between_emails']) == (200, 2)
+
+    assert client.post('/api/settings', json={'max_emails_per_day': -1}).status_code == 400
+    assert client.post('/api/settings', json={'delay_between_emails': 'soon'}).status_code == 400
+
+
+def test_invalid_template_fails_the_campaign_with_the_error(web, campaign):
+    campaign_id = campaign(['founder@example.com'])
+    with web.app.app_context():
+        web.db.session.get(web.Campaign, campaign_id).custom_template_content = 'Hi {founder_nickname}'
+        web.db.session.commit()
+
+    web.run_campaign(campaign_id)
+
+    failed = load(web, campaign_id)
+    assert failed.status == 'failed'
+    assert 'founder_nickname' in failed.error
+    assert (failed.sent_emails, failed.failed_emails) == (0, 0)
+    assert RecordingTransport.sent == []
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def deliveries(web, campaign_id):
+    with web.app.app_context():
+        return sorted(row.email for row in web.CampaignDelivery.query.filter_by(campaign_id=campaign_id))
+
+
+def test_progress_is_written_in_batches(web, campaign):
+    campaign_id = campaign(['founder@example.com'])
+    with web.app.app_context():
+        web.db.session.get(web.Campaign, campaign_id).status = 'running'
+        web.db.session.commit()
+        progress = web.CampaignProgressWriter(campaign_id, interval=3600, max_pending=3).start()
+
+    progress.add_delivery('founder0@example.com')
+    progress.update(1, 0, 1)
+    progress.update(1, 1, 2)
+    time.sleep(0.1)
+    assert load(web, campaign_id).sent_emails == 0
+    assert deliveries(web, campaign_id) == []
+
+    # The batch is full: the writer thread writes the latest counters and the deliveries in one go
+    progress.update(2, 1, 3)
+    wait_for(lambda: load(web, campaign_id).sent_emails == 2)
+    row = load(web, campaign_id)
+    assert (row.failed_emails, row.checkpoint_offset) == (1, 3)
+    assert deliveries(web, campaign_id) == ['founder0@example.com']
+
+    progress.update(3, 1, 4)
+    progress.close()
+    assert load(web, campaign_id).sent_emails == 3
+
+
+@pytest.mark.parametrize('crash', [False, True])
+def test_last_progress_is_written_when_the_run_ends(web, campaign, monkeypatch, crash):
+    emails = [f'founder{n}@example.com' for n in range(3)]
+    campaign_id = campaign(emails)
+    # Nothing is written before the run ends except by the final flush
+    monkeypatch.setattr(web, 'CampaignProgressWriter', functools.partial(web.CampaignProgressWriter, interval=3600))
+    if crash:
+        def save_results(self):
+            raise OSError('disk full')
+        monkeypatch.setattr(email_automation.EmailAutomation, 'save_results', save_results)
+
+    web.run_campaign(campaign_id)
+
+    row = load(web, campaign_id)
+    assert row.status == ('failed' if crash else 'completed')
+    assert (row.sent_emails, row.checkpoint_offset) == (3, 3)
+    # Checkpointed recipients: a resume after the crash would not send to them again
+    assert deliveries(web, campaign_id) == emails
+
+
+@pytest.fixture
+def campaigns(web, client):
+    """Adds campaigns for the logged-in user with the given created_at times; returns their ids"""
+    def add(*created):
+        with web.app.app_context():
+            user = web.User.query.filter_by(username='ada').one()
+            rows = [web.Campaign(user_id=user.id, name=f'Campaign {n}', email_list_type='business_emails',
+                                 created_at=created_at) for n, created_at in enumerate(created)]
+            web.db.session.add_all(rows)
+            web.db.session.commit()
+            return [row.id for row in rows]
+    return add
+
+
+def pages(client, limit, cursor=None):
+    """Campaign ids page by page until next_cursor runs out"""
+    while True:
+        query = f'/api/campaigns?fields=id&limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(query).get_json()
+        yield [row['id'] for row in body['campaigns']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            return
+
+
+def test_campaign_pages_are_newest_first_and_break_ties_by_id(client, campaigns):
+    base = datetime.datetime(2024, 5, 1, 9)
+    ids = campaigns(base, base + datetime.timedelta(minutes=1), base + datetime.timedelta(minutes=1),
+                    base + datetime.timedelta(minutes=1), base + datetime.timedelta(minutes=2))
+    newest_first = [ids[4], ids[3], ids[2], ids[1], ids[0]]
+
+    assert list(pages(client, 2)) == [newest_first[:2], newest_first[2:4], newest_first[4:]]
+    assert list(pages(client, 5)) == [newest_first]
+    assert list(pages(client, 200)) == [newest_first]
+
+
+def test_rows_added_between_pages_do_not_shift_later_pages(client, campaigns):
+    base = datetime.datetime(2024, 5, 1, 9)
+    ids = campaigns(*(base + datetime.timedelta(minutes=n) for n in range(4)))
+    body = client.get('/api/campaigns?fields=id&limit=2').get_json()
+    assert [row['id'] for row in body['campaigns']] == [ids[3], ids[2]]
+
+    # Both sort before the cursor: one is newer, the other ties with the last row shown but has a higher id
+    campaigns(base + datetime.timedelta(hours=1), base + datetime.timedelta(minutes=2))
+
+    # The next page starts right after the last row shown: nothing repeated or skipped
+    assert list(pages(client, 2, body['next_cursor'])) == [[ids[1], ids[0]]]
+
+
+def test_invalid_cursor_is_rejected(client, campaigns):
+    campaigns(datetime.datetime(2024, 5, 1, 9))
+    for cursor in ('not-base64!', base64.urlsafe_b64encode(b'yesterday|1').decode(),
+                   base64.urlsafe_b64encode(b'2024-05-01T09:00:00').decode()):
+        response = client.get(f'/api/campaigns?cursor={cursor}')
+        assert response.status_code == 400
+        assert response.get_json()['message'].startswith('Invalid request')
+
+
+LIST_CSV = 'company_name,founder_email,founder_name\n' + ''.join(
+    f'Company {n},founder{n}@example.com,Founder {n}\n' for n in range(3))
+
+
+def upload(client, body, filename='leads.csv', multipart=False):
+    if multipart:
+        return client.post('/api/lists', data={'file': (io.BytesIO(body), filename)},
+                           content_type='multipart/form-data')
+    return client.post(f'/api/lists?filename={filename}', data=body, content_type='text/csv')
+
+
+def load_list(web, list_id):
+    with web.app.app_context():
+        row = web.db.session.get(web.RecipientList, list_id)
+        web.db.session.expunge(row)
+        return row
+
+
+@pytest.mark.parametrize('multipart', [False, True])
+def test_uploaded_list_is_saved_and_parsed(web, client, multipart):
+    response = upload(client, LIST_CSV.encode(), multipart=multipart)
+
+    assert response.status_code == 200
+    list_id = response.get_json()['list']['id']
+    saved = load_list(web, list_id)
+    assert (saved.status, saved.name, saved.size_bytes) == ('uploaded', 'leads.csv', len(LIST_CSV))
+    with open(saved.path, encoding='utf-8') as f:
+        assert f.read() == LIST_CSV
+
+    assert web.claim_next_recipient_list('worker-1') == list_id
+    web.parse_recipient_list(list_id)
+    parsed = load_list(web, list_id)
+    assert (parsed.status, parsed.valid_rows, parsed.skipped_rows, parsed.error) == ('ready', 3, 0, None)
+
+
+@pytest.mark.parametrize('filename, body, message', [
+    ('', b'a,b\n', 'No file provided'),
+    ('leads.txt', b'a,b\n', 'must be CSV files'),
+    ('leads.csv', b'', 'is empty'),
+])
+def test_upload_without_a_csv_is_rejected(web, client, filename, body, message):
+    response = upload(client, body, filename)
+
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
+    assert os.listdir(web.app.config['LIST_FOLDER']) == []
+
+
+@pytest.mark.parametrize('body, error', [
+    (b'name,phone\nAcme,555\n', 'needs an email column and a company name column'),
+    (b'company_name,founder_email\nCaf\xe9,a@example.com\n', 'not UTF-8'),
+])
+def test_list_that_cannot_be_parsed_is_marked_failed(web, client, body, error):
+    list_id = upload(client, body).get_json()['list']['id']
+
+    web.parse_recipient_list(list_id)
+
+    failed = load_list(web, list_id)
+    assert failed.status == 'failed' and error in failed.error
+    response = client.post('/api/campaigns', json={'email_list_type': f'list:{list_id}', 'custom_template': 'Hi'})
+    assert response.status_code == 400
+
+
+def test_list_uploads_have_their_own_size_limit(web, client, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'MAX_CONTENT_LENGTH', 64)
+    monkeypatch.setitem(web.app.config, 'MAX_LIST_UPLOAD_LENGTH', 1024)
+
+    assert upload(client, LIST_CSV.encode()).status_code == 200
+    assert upload(client, LIST_CSV.encode(), multipart=True).status_code == 200
+    # Other requests keep the general limit
+    assert client.post('/api/templates', json={'name': 'x' * 100, 'template_content': 'Hi'}).status_code == 413
+
+    big = LIST_CSV.encode() * 20
+    assert upload(client, big).status_code == 413
+    assert upload(client, big, multipart=True).status_code == 413
+    # Nothing is left behind from the refused uploads
+    assert len(os.listdir(web.app.config['LIST_FOLDER'])) == 2
+
+
+def test_campaign_started_before_the_import_finishes_sends_to_the_whole_list(web, client, monkeypatch):
+    monkeypatch.setattr(web, 'wait_for_recipient_list',
+                        functools.partial(web.wait_for_recipient_list, poll_interval=0.01))
+    with web.app.app_context():
+        user = web.User.query.filter_by(username='ada').one()
+        user.delay_between_emails = 0
+        web.db.session.commit()
+    list_id = upload(client, LIST_CSV.encode()).get_json()['list']['id']
+    assert web.claim_next_recipient_list('worker-1') == list_id
+
+    response = client.post('/api/campaigns', json={'email_list_type': f'list:{list_id}',
+                                                   'custom_template': 'Hi {founder_name}'})
+    campaign_id = response.get_json()['campaign_id']
+    assert load(web, campaign_id).recipient_list_id == list_id
+    # The campaign waits for the parser's first rows instead of failing
+    sender = threading.Thread(target=web.run_campaign, args=(campaign_id,))
+    sender.start()
+    time.sleep(0.1)
+    assert sender.is_alive() and RecordingTransport.sent == []
+
+    web.parse_recipient_list(list_id)
+    sender.join(10)
+
+    finished = load(web, campaign_id)
+    assert (finished.status, finished.sent_emails, finished.total_emails) == ('completed', 3, 3)
+    assert RecordingTransport.sent == [f'founder{n}@example.com' for n in range(3)]
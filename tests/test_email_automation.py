@@ -0,0 +1,244 @@
+import csv
+import json
+import smtplib
+import threading
+
+import pytest
+
+import email_automation
+from conftest import RecordingTransport
+from email_automation import EmailAutomation
+from send_journal import read_journal
+from transports import Transport
+
+
+class BatchTransport(Transport):
+    """Accepts every recipient, a few per send_batch() call"""
+    name = 'fake_batch'
+    batch_size = 3
+
+    def __init__(self):
+        super().__init__({'sender_email': 'sender@example.com'})
+        self.batches = []
+
+    def send_batch(self, recipients, subject, body):
+        self.batches.append([email for email, _ in recipients])
+        return [True] * len(recipients)
+
+
+class DisconnectingTransport(Transport):
+    """Fails every send with a temporary error"""
+    name = 'fake_disconnecting'
+
+    def __init__(self):
+        super().__init__({'sender_email': 'sender@example.com'})
+        self.attempts = 0
+
+    def send(self, to_email, subject, body):
+        self.attempts += 1
+        raise smtplib.SMTPServerDisconnected('connection dropped')
+
+
+class LimitedLimiter:
+    """Grants the first `grants` sends, then refuses"""
+    jitter = 0.0
+
+    def __init__(self, grants):
+        self.grants = grants
+
+    def acquire(self, max_wait=None, wait_fn=None):
+        self.grants -= 1
+        return self.grants >= 0
+
+    def next_send_in(self):
+        return 3600.0
+
+
+@pytest.fixture
+def make_automation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def make(recipients, emails=None, **config):
+        emails = emails or [f'founder{n}@example.com' for n in range(recipients)]
+        with open('companies.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['company_name', 'founder_email', 'founder_name'])
+            for n, email in enumerate(emails):
+                writer.writerow([f'Company {n}', email, f'Founder {n}'])
+        with open('config.json', 'w') as f:
+            json.dump(dict({
+                'sender_email': 'sender@example.com',
+                'delay_between_emails': 0,
+                'email_subject_template': 'Hello {company_name}',
+                'csv_file': 'companies.csv',
+            }, **config), f)
+        automation = EmailAutomation('config.json')
+        automation.load_email_template = lambda: 'Hi {founder_name} at {company_name}'
+        return automation
+
+    return make
+
+
+def test_batched_transport_sends_every_recipient(make_automation):
+    automation = make_automation(7)
+    transport = automation._transport = BatchTransport()
+
+    automation.run(skip_sent=False)
+
+    assert [len(batch) for batch in transport.batches] == [3, 3, 1]
+    assert sorted(email for batch in transport.batches for email in batch) == \
+        sorted(f'founder{n}@example.com' for n in range(7))
+    assert automation.sent_count == 7
+    assert automation.checkpoint_offset == 7
+
+
+def test_refused_last_retry_is_recorded_as_failed(make_automation, monkeypatch):
+    automation = make_automation(1, max_send_attempts=2, retry_base_delay=0, retry_max_delay=0)
+    transport = automation._transport = DisconnectingTransport()
+    monkeypatch.setattr(email_automation, 'get_rate_limiter', lambda config: LimitedLimiter(grants=1))
+
+    automation.run(skip_sent=False)
+
+    # First attempt fails temporarily; the limiter refuses the only retry it has left
+    assert transport.attempts == 1
+    assert automation.rate_limited and automation.resume_in == 3600.0
+    assert [(result['email'], result['status']) for result in automation.results] == \
+        [('founder0@example.com', 'failed')]
+    assert automation.failed_count == 1
+    assert automation.checkpoint_offset == 1
+
+
+class StoppingTransport(Transport):
+    """Accepts recipients, asking the run to stop after a few"""
+    name = 'fake_stopping'
+
+    def __init__(self, automation, after):
+        super().__init__({'sender_email': 'sender@example.com'})
+        self.automation = automation
+        self.after = after
+        self.sent = []
+
+    def send(self, to_email, subject, body):
+        self.sent.append(to_email)
+        if len(self.sent) == self.after:
+            self.automation.stop_event.set()
+
+
+def test_stop_event_finishes_in_flight_sends_and_keeps_the_checkpoint(make_automation):
+    automation = make_automation(20, max_concurrent_sends=1)
+    transport = automation._transport = StoppingTransport(automation, after=4)
+
+    automation.run(skip_sent=False)
+
+    assert len(transport.sent) == 4
+    assert [result['email'] for result in automation.results] == transport.sent
+    assert automation.failed_count == 0
+    assert automation.checkpoint_offset == 4
+    assert not automation.rate_limited
+
+
+class GatedTransport(Transport):
+    """Holds every send until `release` is set, so several are in flight together"""
+    name = 'fake_gated'
+
+    def __init__(self):
+        super().__init__({'sender_email': 'sender@example.com'})
+        self.release = threading.Event()
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to_email, subject, body):
+        with self._lock:
+            self.sent.append(to_email)
+            if len(self.sent) >= 3:
+                self.release.set()
+        assert self.release.wait(5)
+
+
+@pytest.mark.parametrize('skip_sent', [True, False])
+def test_repeated_address_in_flight_is_sent_once(make_automation, skip_sent):
+    emails = ['dup@example.com', 'other@example.com', 'DUP@example.com', 'last@example.com']
+    automation = make_automation(0, emails=emails, max_concurrent_sends=4)
+    transport = automation._transport = GatedTransport()
+
+    automation.run(skip_sent=skip_sent)
+
+    assert sorted(transport.sent) == ['dup@example.com', 'last@example.com', 'other@example.com']
+    assert [(result['email'], result['status']) for result in automation.results
+            if result['status'] != 'sent'] == [('DUP@example.com', 'skipped_duplicate')]
+    assert automation.checkpoint_offset == 4
+
+
+def test_repeated_address_is_tried_again_after_a_failed_send(make_automation):
+    # One worker keeps two sends queued, so the first failure is recorded before the repeated row
+    automation = make_automation(0, emails=['dup@example.com', 'other@example.com', 'dup@example.com'],
+                                 max_concurrent_sends=1, max_send_attempts=1)
+    transport = automation._transport = DisconnectingTransport()
+
+    automation.run(skip_sent=False)
+
+    assert transport.attempts == 3
+    assert [result['status'] for result in automation.results] == ['failed'] * 3
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_crashed_send_is_recorded_as_failed(make_automation, batched):
+    automation = make_automation(3, max_concurrent_sends=1)
+    if batched:
+        automation._transport = BatchTransport()
+        automation.process_batch = lambda *args: 1 / 0
+        expected = ['failed'] * 3
+    else:
+        automation._transport = RecordingTransport({})
+        process_company = automation.process_company
+        automation.process_company = lambda i, *args, **kwargs: (
+            1 / 0 if i == 2 else process_company(i, *args, **kwargs))
+        expected = ['sent', 'failed', 'sent']
+
+    automation.run(skip_sent=False)
+
+    assert [result['status'] for result in automation.results] == expected
+    assert [record['status'] for record in read_journal() if 'status' in record] == expected
+    assert automation.failed_count == expected.count('failed')
+    assert automation.checkpoint_offset == 3
+
+
+class ScriptedTransport(Transport):
+    """Fails the given recipients temporarily or permanently, and can ask the run to stop at one"""
+    name = 'fake_scripted'
+
+    def __init__(self, temporary=(), permanent=(), stop_at=None, automation=None):
+        super().__init__({'sender_email': 'sender@example.com'})
+        self.temporary, self.permanent = temporary, permanent
+        self.stop_at, self.automation = stop_at, automation
+
+    def send(self, to_email, subject, body):
+        if to_email == self.stop_at:
+            self.automation.stop_event.set()
+        if to_email in self.temporary:
+            raise smtplib.SMTPServerDisconnected('connection dropped')
+        if to_email in self.permanent:
+            raise smtplib.SMTPRecipientsRefused({to_email: (550, b'No such user')})
+
+
+def test_resume_counts_each_recipient_once(make_automation):
+    config = dict(max_concurrent_sends=1, retry_base_delay=3600, retry_max_delay=3600)
+    first = make_automation(5, **config)
+    # founder0 waits for a retry, holding the checkpoint at 0 while later recipients finish
+    first._transport = ScriptedTransport(temporary={'founder0@example.com'},
+                                         permanent={'founder1@example.com', 'founder3@example.com'},
+                                         stop_at='founder3@example.com', automation=first)
+    first.run(skip_sent=False)
+
+    assert first.checkpoint_offset == 0 and first.failed_count == 2
+    sent, failed, offset = first.checkpoint_counts()
+    assert (sent, failed, offset) == (first.sent_count, 0, 0)
+    delivered = {result['email'] for result in first.results if result['status'] == 'sent'}
+
+    second = make_automation(5, **config)
+    second._transport = ScriptedTransport(permanent={'founder1@example.com'})
+    second.sent_count, second.failed_count = sent, failed
+    second.run(skip_sent=False, start_offset=offset, skip_emails=delivered)
+
+    assert (second.sent_count, second.failed_count) == (4, 1)
+    assert second.checkpoint_counts() == (4, 1, 5)
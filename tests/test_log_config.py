@@ -0,0 +1,67 @@
+import json
+import logging
+import queue
+import threading
+
+from log_config import JsonFormatter, SamplingFilter, TracebackQueueHandler
+
+
+def record(name='smtp_pool', level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1, 'connected', None, None)
+
+
+def test_sampling_keeps_one_in_every_n_across_threads():
+    sampler = SamplingFilter(10)
+    kept = []
+
+    def log():
+        kept.append(sum(sampler.filter(record()) for _ in range(1000)))
+
+    threads = [threading.Thread(target=log) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(kept) == 800
+
+
+def test_sampling_passes_warnings_and_other_loggers():
+    sampler = SamplingFilter(100)
+    assert sampler.filter(record())
+    assert not sampler.filter(record())
+    assert sampler.filter(record(level=logging.WARNING))
+    assert sampler.filter(record(name='worker'))
+
+
+def log_through_queue(log):
+    records = queue.SimpleQueue()
+    logger = logging.getLogger('test_log_config')
+    logger.propagate = False
+    logger.handlers = [TracebackQueueHandler(records)]
+    try:
+        log(logger)
+    finally:
+        logger.handlers = []
+    return records.get_nowait()
+
+
+def failing(logger):
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception('send failed for %s', 'ada@example.com')
+
+
+def test_json_lines_keep_the_traceback_of_queued_exceptions():
+    entry = json.loads(JsonFormatter().format(log_through_queue(failing)))
+
+    assert entry['msg'] == 'send failed for ada@example.com'
+    assert 'ZeroDivisionError' in entry['exc']
+
+
+def test_text_lines_keep_the_traceback_of_queued_exceptions():
+    line = logging.Formatter('%(levelname)s - %(message)s').format(log_through_queue(failing))
+
+    assert line.startswith('ERROR - send failed for ada@example.com\nTraceback')
+    assert line.count('ZeroDivisionError') == 1
@@ -0,0 +1,55 @@
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from metrics import authorized, start_http_server
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        server = start_http_server(0, **kwargs)
+        servers.append(server)
+        host, port = server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def get(url, headers=None):
+    with urlopen(Request(url, headers=headers or {}), timeout=5) as response:
+        return response.status
+
+
+def test_listener_binds_to_localhost_by_default(serve):
+    url = serve()
+    assert url.startswith('http://127.0.0.1:')
+    assert get(url) == 200
+
+
+def test_listener_requires_the_token_when_set(serve):
+    url = serve(token='s3cret')
+
+    with pytest.raises(HTTPError) as error:
+        get(url)
+    assert error.value.code == 401
+    with pytest.raises(HTTPError):
+        get(url, {'Authorization': 'Bearer wrong'})
+    assert get(url, {'Authorization': 'Bearer s3cret'}) == 200
+    assert get(url + '?token=s3cret') == 200
+
+
+def test_exposed_listener_without_a_token_warns(serve, caplog):
+    serve(host='0.0.0.0')
+    assert 'METRICS_TOKEN' in caplog.text
+
+
+def test_no_token_authorizes_nothing():
+    assert not authorized(None, 'Bearer ', '')
+    assert not authorized('', None, None)
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import migrations
+from migrations import applied_versions, migrate, pending_versions
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engines = [create_engine(url), create_engine(url)]  # The second stands in for another process
+    metadata = MetaData()
+    Table('campaign', metadata, Column('id', Integer, primary_key=True))
+    yield engines, metadata
+    for engine in engines:
+        engine.dispose()
+
+
+def test_fresh_database_is_created_at_the_latest_version(database):
+    (engine, _), metadata = database
+
+    assert pending_versions(engine) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrate(engine, metadata) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert pending_versions(engine) == []
+    assert migrate(engine, metadata) == []
+
+
+def test_migration_applied_concurrently_by_another_process_is_skipped(database, monkeypatch):
+    (engine, other), metadata = database
+    migrate(engine, metadata)
+    latest = migrations.LATEST_VERSION
+
+    def apply(conn, metadata):
+        # The other process wins the race; our DDL then fails on the table it created
+        with other.begin() as other_conn:
+            other_conn.execute(text("CREATE TABLE extra (id INTEGER)"))
+            migrations._record(other_conn, latest + 1, 'extra table')
+        conn.execute(text("CREATE TABLE extra (id INTEGER)"))
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [(latest + 1, 'extra table', apply)])
+
+    assert migrate(engine, metadata) == []
+    assert latest + 1 in applied_versions(engine)
+
+
+def test_failed_migration_that_nobody_applied_is_raised(database, monkeypatch):
+    (engine, _), metadata = database
+    migrate(engine, metadata)
+    latest = migrations.LATEST_VERSION
+
+    def apply(conn, metadata):
+        conn.execute(text("CREATE TABLE campaign (id INTEGER)"))
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS + [(latest + 1, 'broken', apply)])
+
+    with pytest.raises(OperationalError):
+        migrate(engine, metadata)
+    assert pending_versions(engine) == [latest + 1]
+
+
+def test_web_startup_only_checks_the_version(web, caplog):
+    web.init_database()
+
+    assert 'pending' in caplog.text
+    with web.app.app_context():
+        assert applied_versions(web.db.engine) == set()
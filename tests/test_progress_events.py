@@ -0,0 +1,84 @@
+import time
+
+from progress_events import ChangeFeed
+
+
+class Table:
+    """Rows keyed by id, with an integer clock standing in for updated_at"""
+
+    def __init__(self):
+        self.rows = {}
+        self.clock = 0
+        self.fetches = 0
+
+    def update(self, row_id, **values):
+        self.clock += 1
+        self.rows[row_id] = dict(values, id=row_id, updated_at=self.clock)
+
+    def fetch(self, since):
+        self.fetches += 1
+        return sorted((dict(row) for row in self.rows.values() if row['updated_at'] >= since),
+                      key=lambda row: row['updated_at'])
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_reader_without_a_cursor_gets_a_snapshot_then_only_changes():
+    table = Table()
+    feed = ChangeFeed(table.fetch, start_from=lambda: table.clock, interval=0.01)
+
+    cursor, rows = feed.changes(None)
+    assert rows is None
+
+    table.update(1, sent=5)
+    table.update(2, sent=1)
+    wait_for(lambda: feed.changes(cursor)[1])
+    cursor, rows = feed.changes(cursor)
+    assert {row['id']: row['sent'] for row in rows} == {1: 5, 2: 1}
+
+    table.update(1, sent=6)
+    wait_for(lambda: any(row['sent'] == 6 for row in feed.changes(cursor)[1]))
+    cursor, rows = feed.changes(cursor)
+    # The newest row at the old cursor can repeat; applying rows is idempotent
+    assert [(row['id'], row['sent']) for row in rows if row['updated_at'] > 2] == [(1, 6)]
+
+
+def test_cursor_older_than_the_history_gets_a_snapshot():
+    table = Table()
+    feed = ChangeFeed(table.fetch, start_from=lambda: table.clock, interval=0.01, history=2)
+    cursor, _ = feed.changes(None)
+
+    for sent in range(3):
+        table.update(1, sent=sent)
+        wait_for(lambda: feed.changes(table.clock)[1])
+
+    assert feed.changes(cursor)[1] is None
+    assert feed.changes(table.clock)[1] is not None
+
+
+def test_cursor_from_another_process_ahead_of_this_feed_is_kept():
+    table = Table()
+    feed = ChangeFeed(table.fetch, start_from=lambda: table.clock, interval=3600)
+    feed.changes(None)
+
+    assert feed.changes(10) == (10, [])
+
+
+def test_polling_pauses_when_nobody_reads():
+    table = Table()
+    feed = ChangeFeed(table.fetch, start_from=lambda: table.clock, interval=0.01, idle_after=0.05)
+    feed.changes(None)
+    wait_for(lambda: table.fetches > 0)
+
+    time.sleep(0.2)
+    paused_at = table.fetches
+    time.sleep(0.2)
+    assert table.fetches == paused_at
+
+    feed.changes(None)
+    wait_for(lambda: table.fetches > paused_at)
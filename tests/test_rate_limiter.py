@@ -0,0 +1,147 @@
+import datetime
+
+import pytest
+
+import rate_limiter
+from rate_limiter import DailyQuota, RateLimiter, TokenBucket, get_rate_limiter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'sent_emails.db')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the time module seen by rate_limiter with a clock the test advances"""
+    class Clock:
+        now = 1000.0
+
+        def monotonic(self):
+            return self.now
+
+        def sleep(self, seconds):
+            self.now += seconds
+
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity(clock):
+    bucket = TokenBucket('hour', rate=2.0, capacity=3.0)
+    bucket.tokens = 0
+
+    assert bucket.wait_time() == 0.5
+    clock.now += 0.5
+    bucket.refill(clock.now)
+    assert (bucket.tokens, bucket.wait_time()) == (1.0, 0.0)
+    clock.now += 60
+    bucket.refill(clock.now)
+    assert bucket.tokens == 3.0
+
+
+def test_limiter_waits_for_the_slowest_bucket(clock):
+    limiter = RateLimiter({'second': (1.0, 1.0), 'hour': (0.25, 2.0)})
+
+    assert limiter.try_acquire()[0]
+    assert limiter.try_acquire() == (False, 1.0, 'second')
+    clock.now += 1
+    assert limiter.try_acquire()[0]
+    # Two sends used the hour bucket's burst; it refills one token per 4 s
+    clock.now += 1
+    acquired, wait, limiting = limiter.try_acquire()
+    assert (acquired, limiting, wait) == (False, 'hour', 2.0)
+    assert limiter.next_send_in() == 2.0
+    clock.now += 2
+    assert limiter.try_acquire()[0]
+
+
+def test_acquire_gives_up_when_the_wait_is_longer_than_max_wait(clock):
+    limiter = RateLimiter({'second': (0.5, 1.0)})
+    waits = []
+
+    def wait(seconds):
+        waits.append(seconds)
+        clock.now += seconds
+
+    assert limiter.acquire(max_wait=30, wait_fn=wait)
+    assert not limiter.acquire(max_wait=1, wait_fn=wait)
+    assert waits == []
+    assert limiter.acquire(max_wait=30, wait_fn=wait)
+    assert waits == [1.0, 1.0]
+
+
+def test_daily_cap_is_exact(db_path):
+    limiter = RateLimiter({}, quota=DailyQuota(db_path), account='smtp:a@example.com', per_day=3)
+
+    assert [limiter.try_acquire()[0] for _ in range(5)] == [True, True, True, False, False]
+    acquired, wait, limiting = limiter.try_acquire()
+    assert limiting == 'day' and 0 < wait <= 86400
+    assert limiter.get_stats()['day'] == 0
+
+
+def test_daily_cap_survives_restarts_and_is_per_account(db_path):
+    first = RateLimiter({}, quota=DailyQuota(db_path), account='smtp:a@example.com', per_day=2)
+    assert first.try_acquire()[0] and first.try_acquire()[0]
+
+    # A new process (fresh limiter and connection) sees the same count
+    restarted = RateLimiter({}, quota=DailyQuota(db_path), account='smtp:a@example.com', per_day=2)
+    assert not restarted.try_acquire()[0]
+    other = RateLimiter({}, quota=DailyQuota(db_path), account='smtp:b@example.com', per_day=2)
+    assert other.try_acquire()[0]
+
+
+def test_daily_cap_resets_on_the_next_day(db_path, monkeypatch):
+    limiter = RateLimiter({}, quota=DailyQuota(db_path), account='smtp:a@example.com', per_day=1)
+    assert limiter.try_acquire()[0]
+    assert not limiter.try_acquire()[0]
+    assert 0 < limiter.next_send_in() <= 86400
+
+    class Tomorrow(datetime.date):
+        @classmethod
+        def today(cls):
+            return datetime.date.today() + datetime.timedelta(days=1)
+
+    monkeypatch.setattr(rate_limiter, 'date', Tomorrow)
+    assert limiter.next_send_in() == 0
+    assert limiter.try_acquire()[0]
+
+
+def test_pacing_bucket_still_applies(db_path):
+    limiter = RateLimiter({'second': (1.0, 1.0)}, quota=DailyQuota(db_path), account='smtp:a@example.com', per_day=10)
+
+    assert limiter.try_acquire()[0]
+    acquired, wait, limiting = limiter.try_acquire()
+    assert not acquired and limiting == 'second'
+    # Refused by pacing: nothing counted against the day
+    assert limiter.get_stats()['day'] == 9
+
+
+def test_shared_limiter_uses_the_sent_index_database(db_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(rate_limiter, '_quotas', {})
+    config = {'sender_email': 'A@example.com', 'delay_between_emails': 0, 'max_emails_per_day': 1,
+              'sent_index_db': db_path}
+
+    assert get_rate_limiter(config).try_acquire()[0]
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(rate_limiter, '_quotas', {})
+    assert not get_rate_limiter(config).try_acquire()[0]
+
+
+def test_shared_limiters_are_keyed_by_provider_and_sender(db_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(rate_limiter, '_quotas', {})
+    config = {'sender_email': 'A@example.com', 'delay_between_emails': 0, 'max_emails_per_day': 1,
+              'sent_index_db': db_path}
+
+    smtp = get_rate_limiter(config)
+    assert smtp.account == 'smtp:a@example.com'
+    assert get_rate_limiter(dict(config, sender_email='a@EXAMPLE.com')) is smtp
+    sendgrid = get_rate_limiter(dict(config, email_provider='sendgrid'))
+    assert sendgrid is not smtp and sendgrid.account == 'sendgrid:a@example.com'
+
+    # Each key has its own daily count
+    assert smtp.try_acquire()[0] and not smtp.try_acquire()[0]
+    assert sendgrid.try_acquire()[0]
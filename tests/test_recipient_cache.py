@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+import recipient_cache
+from email_automation import parse_companies, read_companies
+from recipient_cache import IMPORT_CHUNK_SIZE, RecipientCache
+
+
+def write_list(path, rows, start=0):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('Company Name,Email,Status\n')
+        for n in range(start, start + rows):
+            f.write(f"Company {n},founder{n}@example.com,{'INACTIVE' if n % 7 == 0 else 'ACTIVE'}\n")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(recipient_cache, 'FOLLOW_INTERVAL', 0.01)
+    cache = RecipientCache(str(tmp_path / 'recipients.db'))
+    yield cache
+    cache.close()
+
+
+def test_get_list_returns_after_the_first_chunk_and_readers_follow_the_rest(tmp_path, cache):
+    csv_file = str(tmp_path / 'list.csv')
+    write_list(csv_file, 5000)
+    release = threading.Event()
+
+    def parse(text):
+        for n, company in enumerate(parse_companies(text)):
+            if n == 2 * IMPORT_CHUNK_SIZE:
+                assert release.wait(10)
+            yield company
+
+    list_id = cache.get_list(csv_file, parse)
+    assert IMPORT_CHUNK_SIZE <= cache.count(list_id) < 2 * IMPORT_CHUNK_SIZE + 1
+
+    reader = cache.iter_companies(list_id)
+    first = [next(reader) for _ in range(10)]
+    release.set()
+    companies = first + list(reader)
+    assert companies == list(read_companies(csv_file))
+    assert cache.count(list_id) == len(companies)
+
+
+def test_unchanged_file_is_not_imported_again_and_a_changed_one_is(tmp_path, cache):
+    csv_file = str(tmp_path / 'list.csv')
+    write_list(csv_file, 50)
+    imports = []
+
+    def parse(text):
+        imports.append(1)
+        return parse_companies(text)
+
+    list_id = cache.get_list(csv_file, parse)
+    list(cache.iter_companies(list_id))
+    assert cache.get_list(csv_file, parse) == list_id
+    assert len(imports) == 1
+
+    write_list(csv_file, 80, start=100)
+    assert cache.get_list(csv_file, parse) == list_id
+    assert list(cache.iter_companies(list_id)) == list(read_companies(csv_file))
+    assert len(imports) == 2
+
+
+def test_windows_match_the_csv(tmp_path, cache):
+    csv_file = str(tmp_path / 'list.csv')
+    write_list(csv_file, 3000)
+    expected = list(read_companies(csv_file))
+    list_id = cache.get_list(csv_file, parse_companies)
+
+    for offset, limit in ((0, 0), (0, 10), (5, 1200), (1500, 0), (2500, 2600), (10, 10)):
+        assert list(cache.iter_companies(list_id, offset, limit)) == expected[offset:limit or None]
+
+
+def test_one_connection_imports_while_another_follows(tmp_path, cache):
+    csv_file = str(tmp_path / 'list.csv')
+    write_list(csv_file, 3000)
+    other = RecipientCache(cache.db_path)
+    release = threading.Event()
+    imports = []
+
+    def parse(text):
+        imports.append(1)
+        for n, company in enumerate(parse_companies(text)):
+            if n == IMPORT_CHUNK_SIZE + 1:
+                assert release.wait(10)
+            yield company
+
+    list_id = cache.get_list(csv_file, parse)
+    assert other.get_list(csv_file, parse) == list_id
+    release.set()
+    assert list(other.iter_companies(list_id)) == list(read_companies(csv_file))
+    assert len(imports) == 1
+    other.close()
+
+
+def test_failed_import_is_reported(tmp_path, cache):
+    early = str(tmp_path / 'early.csv')
+    with open(early, 'wb') as f:
+        f.write(b'Company Name,Email\nAcme,\xff@example.com\n')
+    with pytest.raises(UnicodeDecodeError):
+        cache.get_list(early, parse_companies)
+
+    late = str(tmp_path / 'late.csv')
+    write_list(late, 2 * IMPORT_CHUNK_SIZE)
+    with open(late, 'ab') as f:
+        f.write(b'Acme,\xff@example.com,ACTIVE\n')
+    list_id = cache.get_list(late, parse_companies)
+    with pytest.raises(RuntimeError):
+        list(cache.iter_companies(list_id))
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import send_journal
+from send_journal import SendJournal, journal_files, load_unfinished_results, read_journal
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock the test advances for the journal, counting the journal's fsync calls"""
+    class Clock:
+        now = 1000.0
+        fsyncs = 0
+
+        def monotonic(self):
+            return self.now
+
+        def fsync(self, fd):
+            self.fsyncs += 1
+
+    clock = Clock()
+    monkeypatch.setattr(send_journal, 'time', clock)
+    monkeypatch.setattr(send_journal.os, 'fsync', clock.fsync)
+    return clock
+
+
+def test_fsync_is_batched_by_count_and_by_time(tmp_path, clock):
+    journal = SendJournal(str(tmp_path), fsync_every=3, fsync_interval=5)
+
+    for n in range(7):
+        journal.append({'n': n})
+    assert clock.fsyncs == 2
+
+    clock.now += 5
+    journal.append({'n': 7})
+    assert clock.fsyncs == 3
+
+    journal.close()
+    assert clock.fsyncs == 4
+    # Records reach the file as they are appended, not only at fsync
+    assert [record['n'] for record in read_journal(str(tmp_path))] == list(range(8))
+
+
+def test_active_file_is_rotated_past_max_bytes(tmp_path):
+    journal = SendJournal(str(tmp_path), max_bytes=100)
+    for n in range(10):
+        journal.append({'email': f'founder{n}@example.com', 'status': 'sent'})
+    journal.close()
+
+    files = journal_files(str(tmp_path))
+    assert len(files) > 1
+    assert all(os.path.getsize(path) < 100 + 60 for path in files)
+    assert [record['email'] for record in read_journal(str(tmp_path))] == \
+        [f'founder{n}@example.com' for n in range(10)]
+
+    # A reopened journal appends to the newest file
+    SendJournal(str(tmp_path), max_bytes=100).close()
+    assert journal_files(str(tmp_path)) == files
+
+
+def test_torn_last_line_is_skipped_and_later_records_stay_readable(tmp_path):
+    journal = SendJournal(str(tmp_path))
+    journal.append({'run_id': 'a', 'email': 'one@example.com', 'status': 'sent'})
+    journal.close()
+    with open(journal_files(str(tmp_path))[-1], 'a', encoding='utf-8') as f:
+        f.write('{"run_id": "a", "email": "two@exa')  # Crashed mid-write
+
+    assert [record['email'] for record in read_journal(str(tmp_path))] == ['one@example.com']
+
+    journal = SendJournal(str(tmp_path))
+    journal.append({'run_id': 'a', 'email': 'three@example.com', 'status': 'failed'})
+    journal.close()
+
+    assert [(record['email'], record['status']) for record in load_unfinished_results(str(tmp_path))] == \
+        [('one@example.com', 'sent'), ('three@example.com', 'failed')]
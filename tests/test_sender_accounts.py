@@ -0,0 +1,116 @@
+import smtplib
+
+import pytest
+
+import rate_limiter
+import sender_accounts
+import transports
+from sender_accounts import SUSPEND_SECONDS, create_rotation, get_sender_account
+from transports import Transport
+
+
+class ScriptedTransport(Transport):
+    """Records (sender, recipient) for each send and raises the error set for its sender, if any"""
+    name = 'scripted'
+    sent = []
+    errors = {}
+
+    def send(self, to_email, subject, body):
+        error = self.errors.get(self.config['sender_email'])
+        if error is not None:
+            raise error
+        self.sent.append((self.config['sender_email'], to_email))
+
+
+@pytest.fixture
+def rotation(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiters', {})
+    monkeypatch.setattr(rate_limiter, '_quotas', {})
+    monkeypatch.setattr(sender_accounts, '_accounts', {})
+    monkeypatch.setitem(transports.TRANSPORTS, 'scripted', ScriptedTransport)
+    monkeypatch.setattr(ScriptedTransport, 'sent', [])
+    monkeypatch.setattr(ScriptedTransport, 'errors', {})
+
+    def make(*per_day):
+        return create_rotation({
+            'transport': 'scripted', 'delay_between_emails': 0, 'sent_index_db': str(tmp_path / 'sent_emails.db'),
+            'sender_accounts': [{'sender_email': f'{name}@example.com', 'sender_password': 'secret',
+                                 'max_emails_per_day': limit} for name, limit in zip('ab', per_day)],
+        })
+    return make
+
+
+def no_wait(seconds):
+    raise AssertionError(f'acquire waited {seconds}s')
+
+
+def send(rotation, count):
+    """Send count messages through whichever account the rotation picks; returns the senders used"""
+    senders = []
+    for n in range(count):
+        account = rotation.acquire(max_wait=60, wait_fn=no_wait)
+        if account is None:
+            senders.append(None)
+            continue
+        try:
+            account.send(f'founder{n}@example.com', 'Hello', 'Hi')
+        except smtplib.SMTPException:
+            pass
+        senders.append(account.email[0])
+    return senders
+
+
+def test_accounts_take_turns(rotation):
+    assert send(rotation(10, 10), 4) == ['a', 'b', 'a', 'b']
+    assert len(ScriptedTransport.sent) == 4
+
+
+def test_account_with_the_most_budget_left_goes_first_until_all_run_out(rotation):
+    assert send(rotation(1, 3), 5) == ['b', 'b', 'a', 'b', None]
+
+
+@pytest.mark.parametrize('error, kind', [
+    (smtplib.SMTPDataError(550, b'5.4.5 Daily user sending quota exceeded'), 'quota'),
+    (smtplib.SMTPAuthenticationError(535, b'5.7.8 Username and Password not accepted'), 'auth'),
+])
+def test_failing_account_is_suspended_and_the_others_take_over(rotation, error, kind):
+    senders = rotation(10, 10)
+    ScriptedTransport.errors['a@example.com'] = error
+
+    assert send(senders, 4) == ['a', 'b', 'b', 'b']
+    failed = senders.accounts[0]
+    assert failed.suspended == kind
+    assert failed.get_stats()['failed'] == 1
+    assert [sender for sender, _ in ScriptedTransport.sent] == ['b@example.com'] * 3
+
+
+def test_new_password_lifts_an_auth_suspension(rotation):
+    senders = rotation(10, 10)
+    ScriptedTransport.errors['a@example.com'] = smtplib.SMTPAuthenticationError(535, b'rejected')
+    send(senders, 1)
+    del ScriptedTransport.errors['a@example.com']
+
+    account = get_sender_account(dict(senders.accounts[0].config, sender_password='new-secret'))
+
+    assert account is senders.accounts[0] and account.suspended is None
+    # The failed attempt counted against a's budget, so b goes first
+    assert send(senders, 2) == ['b', 'a']
+
+
+def test_every_account_exhausted_gives_up_with_the_wait(rotation):
+    senders = rotation(1, 1)
+    assert send(senders, 2) == ['a', 'b']
+
+    assert send(senders, 1) == [None]
+    assert 0 < senders.next_send_in() <= 86400
+
+
+def test_every_account_suspended_gives_up_until_the_suspension_ends(rotation):
+    senders = rotation(10, 10)
+    for account in senders.accounts:
+        ScriptedTransport.errors[account.email] = smtplib.SMTPAuthenticationError(535, b'rejected')
+
+    assert send(senders, 2) == ['a', 'b']
+    assert send(senders, 1) == [None]
+    assert SUSPEND_SECONDS - 5 < senders.next_send_in() <= SUSPEND_SECONDS
+    assert ScriptedTransport.sent == []
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+pytest.importorskip('sendgrid')
+
+from sendgrid_email import SendGridEmailSender  # noqa: E402
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class BadRequest(Exception):
+    """Shaped like python_http_client's BadRequestsError"""
+    status_code = 400
+
+    def __init__(self, fields):
+        super().__init__('HTTP Error 400: Bad Request')
+        self.body = json.dumps({'errors': [{'field': field, 'message': 'Invalid email'} for field in fields]}).encode()
+
+
+class FakeClient:
+    """Rejects the personalizations whose address is in `invalid`, like the mail/send endpoint"""
+
+    def __init__(self, invalid=(), status_code=202):
+        self.invalid = set(invalid)
+        self.status_code = status_code
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+        fields = [f'personalizations.{position}.to' for position, item in enumerate(message['personalizations'])
+                  if item['to'][0]['email'] in self.invalid]
+        if fields:
+            raise BadRequest(fields)
+        return Response(self.status_code)
+
+
+def make_sender(client):
+    sender = SendGridEmailSender('SG.' + 'x' * 40, 'sender@example.com', 'Sender')
+    sender.client = client
+    return sender
+
+
+def recipients(*emails):
+    return [(email, {'{company_name}': f'Company {n}'}) for n, email in enumerate(emails)]
+
+
+def test_rejected_personalizations_fail_and_the_rest_are_resent():
+    client = FakeClient(invalid={'bad@example', 'worse@'})
+    sender = make_sender(client)
+
+    outcomes = sender.send_batch(recipients('a@example.com', 'bad@example', 'b@example.com', 'worse@'),
+                                 'Hello {company_name}', 'Hi')
+
+    assert outcomes == [True, False, True, False]
+    assert len(client.messages) == 2
+    retried = client.messages[1]['personalizations']
+    assert [p['to'][0]['email'] for p in retried] == ['a@example.com', 'b@example.com']
+    # Substitutions stay with their recipient after the rejected ones are dropped
+    assert [p['substitutions'] for p in retried] == [{'{company_name}': 'Company 0'}, {'{company_name}': 'Company 2'}]
+
+
+def test_batch_with_every_personalization_rejected_is_not_retried():
+    client = FakeClient(invalid={'bad@example', 'worse@'})
+
+    assert make_sender(client).send_batch(recipients('bad@example', 'worse@'), 'Hello', 'Hi') == [False, False]
+    assert len(client.messages) == 1
+
+
+def test_rejection_on_the_retry_fails_the_whole_batch():
+    class RejectsTwice(FakeClient):
+        def send(self, message):
+            self.messages.append(message)
+            raise BadRequest(['personalizations.0.to'])
+
+    client = RejectsTwice()
+
+    assert make_sender(client).send_batch(recipients('a@example.com', 'b@example.com'), 'Hello', 'Hi') == [False, False]
+    assert len(client.messages) == 2
+
+
+def test_unexpected_status_fails_every_recipient():
+    outcomes = make_sender(FakeClient(status_code=500)).send_batch(recipients('a@example.com', 'b@example.com'),
+                                                                    'Hello', 'Hi')
+    assert outcomes == [False, False]
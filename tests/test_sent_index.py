@@ -0,0 +1,75 @@
+import csv
+
+import pytest
+
+from sent_index import SentEmailIndex
+
+
+@pytest.fixture
+def open_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    indexes = []
+
+    def open_():
+        index = SentEmailIndex(str(tmp_path / 'sent_emails.db'))
+        indexes.append(index)
+        return index
+
+    yield open_
+    for index in indexes:
+        index.close()
+
+
+def write_results(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['company', 'email', 'status', 'timestamp'])
+        writer.writeheader()
+        for email, status in rows:
+            writer.writerow({'company': 'Acme', 'email': email, 'status': status, 'timestamp': ''})
+
+
+def test_legacy_results_files_are_imported_once(open_index):
+    write_results('results_20240101_090000.csv', [('sent@example.com', 'sent'), ('failed@example.com', 'failed'),
+                                                  ('dry@example.com', 'dry_run')])
+    index = open_index()
+
+    assert index.import_results_files() == 1
+    assert index.emails() == {'sent@example.com', 'dry@example.com'}
+    assert index.emails(include_dry_run=False) == {'sent@example.com'}
+    assert index.import_results_files() == 0
+
+    write_results('results_20240101_090000.csv', [('sent@example.com', 'sent'), ('late@example.com', 'SENT')])
+    assert index.import_results_files() == 1
+    assert index.contains('late@example.com')
+
+
+def test_recorded_addresses_survive_reopening(open_index):
+    index = open_index()
+    index.add('ada@example.com', 'sent')
+    index.add('grace@example.com', 'dry_run')
+    index.add('ignored@example.com', 'failed')
+    index.close()
+
+    index = open_index()
+    assert index.contains('ada@example.com')
+    assert index.contains('grace@example.com')
+    assert not index.contains('grace@example.com', include_dry_run=False)
+    assert not index.contains('ignored@example.com')
+    assert index.count() == 2
+
+
+def test_sent_is_never_downgraded_to_dry_run(open_index):
+    index = open_index()
+    index.add('ada@example.com', 'sent')
+    index.add('ada@example.com', 'dry_run')
+
+    assert index.contains('ada@example.com', include_dry_run=False)
+
+
+def test_addresses_match_case_insensitively(open_index):
+    index = open_index()
+    index.add(' Ada@Example.COM ', 'sent')
+
+    assert index.contains('ada@example.com')
+    assert index.contains('ADA@EXAMPLE.COM')
+    assert index.emails() == {'ada@example.com'}
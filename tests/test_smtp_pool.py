@@ -0,0 +1,84 @@
+import socket
+
+import pytest
+
+from smtp_pool import SMTPConnectionPool
+from smtp_sink import SMTPSink
+
+MESSAGE = b'Subject: Hello\r\n\r\nHi there\r\n'
+
+
+@pytest.fixture
+def sink():
+    sink = SMTPSink().start()
+    # Keep the server side of every session so a test can drop it
+    sink.accepted = []
+    sink._server.verify_request = lambda request, address: sink.accepted.append(request) or True
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def make_pool(sink):
+    pools = []
+
+    def make(**kwargs):
+        pool = SMTPConnectionPool('127.0.0.1', sink.port, 'sender@example.com', None, use_tls=False, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def send(pool, count):
+    for n in range(count):
+        pool.sendmail('sender@example.com', [f'founder{n}@example.com'], MESSAGE)
+
+
+def test_messages_reuse_one_session(sink, make_pool):
+    pool = make_pool()
+
+    send(pool, 5)
+
+    stats = pool.get_stats()
+    assert (stats['connections_opened'], stats['connections_reused'], stats['messages_sent']) == (1, 4, 5)
+    assert stats['idle_connections'] == 1
+    assert sink.get_stats()['messages'] == 5
+    assert len(sink.accepted) == 1
+
+
+def test_dropped_session_is_replaced_and_the_message_resent(sink, make_pool):
+    pool = make_pool(noop_interval=3600)  # Reuse the dead session without checking it first
+    send(pool, 1)
+
+    sink.accepted[0].shutdown(socket.SHUT_RDWR)
+    send(pool, 1)
+
+    stats = pool.get_stats()
+    assert (stats['reconnects'], stats['connections_opened'], stats['messages_sent']) == (1, 2, 2)
+    assert sink.get_stats()['messages'] == 2
+
+
+def test_dropped_idle_session_is_caught_by_noop(sink, make_pool):
+    pool = make_pool(noop_interval=0)
+    send(pool, 1)
+
+    sink.accepted[0].shutdown(socket.SHUT_RDWR)
+    send(pool, 1)
+
+    stats = pool.get_stats()
+    assert (stats['noop_failures'], stats['reconnects'], stats['connections_opened']) == (1, 0, 2)
+    assert sink.get_stats()['messages'] == 2
+
+
+def test_session_is_recycled_after_its_message_limit(sink, make_pool):
+    pool = make_pool(max_messages_per_connection=2)
+
+    send(pool, 5)
+
+    stats = pool.get_stats()
+    assert (stats['connections_opened'], stats['connections_closed'], stats['messages_sent']) == (3, 2, 5)
+    assert stats['idle_connections'] == 1
+    assert sink.get_stats()['messages'] == 5
@@ -0,0 +1,105 @@
+import csv
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from email_stats import load_all_results
+from send_journal import SendJournal
+from stats_store import StatsStore
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def result(n, status, day='2024-05-01', run_id='run-a'):
+    return {'company': f'Company {n}', 'email': f'founder{n}@example.com', 'status': status,
+            'timestamp': f'{day}T09:00:00', 'run_id': run_id}
+
+
+def write_results(path, records):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['company', 'email', 'status', 'timestamp'])
+        writer.writeheader()
+        for record in records:
+            writer.writerow({key: record[key] for key in writer.fieldnames})
+
+
+@pytest.fixture
+def stores():
+    opened = []
+
+    def open_(path):
+        opened.append(StatsStore(str(path)))
+        return opened[-1]
+
+    yield open_
+    for store in opened:
+        store.close()
+
+
+def test_journal_is_ingested_from_the_last_offset(workdir, stores):
+    store = stores(workdir / 'email_stats.db')
+    journal = SendJournal('journal')
+    journal.append(result(0, 'sent'))
+    journal.append(result(1, 'failed'))
+    journal.close()
+
+    assert store.ingest_journal() == 2
+    assert store.ingest_journal() == 0
+
+    path = os.path.join('journal', os.listdir('journal')[0])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result(2, 'sent')) + '\n')
+        f.write(json.dumps(result(3, 'sent'))[:20])  # Still being written
+    assert store.ingest_journal() == 1
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result(3, 'sent'))[20:] + '\n')
+    assert store.ingest_journal() == 1
+
+    totals = store.totals()
+    assert (totals['total'], totals['status:sent'], totals['status:failed']) == (4, 3, 1)
+    assert store.by_source() == {'run-a': {'sent': 3, 'failed': 1}}
+    # A reopened store carries on from the saved offset
+    assert stores(workdir / 'email_stats.db').ingest_journal() == 0
+
+
+def test_rebuild_matches_incremental_counts_and_email_stats(workdir, stores):
+    # A run from before the journal existed
+    write_results('results_20240430_090000.csv', [result(0, 'sent', '2024-04-30'), result(1, 'failed', '2024-04-30')])
+    incremental = stores(workdir / 'incremental.db')
+    incremental.refresh()
+
+    # A journaled run that finished and wrote its own results file...
+    journal = SendJournal('journal')
+    finished = [result(n, 'sent') for n in range(2, 5)] + [result(5, 'failed')]
+    for record in finished:
+        journal.append(record)
+    incremental.refresh()
+    write_results('results_20240501_090000.csv', finished)
+    journal.append({'event': 'run_end', 'run_id': 'run-a', 'results_file': 'results_20240501_090000.csv'})
+    # ...and one that was interrupted before writing it
+    journal.append(result(6, 'sent', '2024-05-02', run_id='run-b'))
+    journal.append(result(0, 'dry_run', '2024-05-02', run_id='run-b'))
+    journal.close()
+    incremental.refresh()
+    incremental.refresh()
+
+    rebuilt = stores(workdir / 'rebuilt.db')
+    rebuilt.refresh()
+
+    assert rebuilt.totals() == incremental.totals()
+    assert rebuilt.by_date() == incremental.by_date()
+    assert rebuilt.by_source() == incremental.by_source()
+
+    rows = load_all_results()
+    totals = rebuilt.totals()
+    assert totals['total'] == len(rows) == 8
+    assert {name[len('status:'):]: count for name, count in totals.items() if name.startswith('status:')} == \
+        dict(Counter(row['status'] for row in rows))
+    assert totals['unique_emails'] == len({row['email'] for row in rows}) == 7
+    assert totals['unique_companies'] == len({row['company'] for row in rows}) == 7
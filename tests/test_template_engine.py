@@ -0,0 +1,49 @@
+import csv
+import json
+
+import pytest
+
+from email_automation import EmailAutomation
+from template_engine import TemplateError, compile_template, validate_template
+
+
+def test_unknown_placeholders_raise_template_error():
+    with pytest.raises(TemplateError) as error:
+        compile_template('Hi {founder_nickname}, about {company_name} and {budget} {budget}')
+
+    assert error.value.unknown == ['budget', 'founder_nickname']
+    assert '{budget}, {founder_nickname}' in str(error.value)
+    # Failed compiles aren't cached: the next attempt raises again
+    with pytest.raises(TemplateError):
+        validate_template('Hi {founder_nickname}')
+
+
+def test_render_fills_placeholders_and_keeps_other_text():
+    template = compile_template('Hi {founder_name}, {company_name} {  } {} rocks. {founder_name}!')
+
+    assert template.placeholders == {'founder_name', 'company_name'}
+    assert template.render({'founder_name': 'Ada', 'company_name': 'Acme'}) == 'Hi Ada, Acme {  } {} rocks. Ada!'
+    assert compile_template('No placeholders').render({}) == 'No placeholders'
+
+
+def test_compiled_templates_are_reused_across_recipients(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('companies.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['company_name', 'founder_email', 'founder_name'])
+        for n in range(5):
+            writer.writerow([f'Company {n}', f'founder{n}@example.com', f'Founder {n}'])
+    with open('config.json', 'w') as f:
+        json.dump({'sender_email': 'sender@example.com', 'delay_between_emails': 0,
+                   'email_subject_template': 'Hello {company_name}', 'csv_file': 'companies.csv'}, f)
+    automation = EmailAutomation('config.json')
+    automation.load_email_template = lambda: 'Hi {founder_name} at {company_name}'
+    compile_template.cache_clear()
+
+    automation.run(dry_run=True, skip_sent=False)
+
+    assert automation.results and all(result['status'] == 'dry_run' for result in automation.results)
+    info = compile_template.cache_info()
+    # Body and subject are each parsed once; every recipient reuses them
+    assert info.misses == 2
+    assert info.hits >= 2 * 5
@@ -0,0 +1,95 @@
+import random
+from email import message_from_bytes
+from email.generator import Generator
+
+import pytest
+
+from transports import MessageBuilder, _crlf, build_message
+
+CONFIG = {'sender_email': 'sender@example.com', 'sender_name': 'Outreach Team'}
+
+BODIES = {
+    'ascii': 'Hi Acme,\n\nWe would love to talk.\n\nBest,\nOutreach Team\n',
+    'ascii_no_trailing_newline': 'Hi Acme, we would love to talk.',
+    'non_ascii': 'Grüße an Ørsted — 你好!\nBis bald.\n',
+    'non_ascii_long': 'Café crème. ' * 200,
+    'bare_lf': 'one\ntwo\n\nthree',
+    'bare_cr': 'one\rtwo\r\rthree\r',
+    'mixed_line_endings': 'one\r\ntwo\rthree\nfour',
+    'non_ascii_bare_cr': 'naïve\rline\r\n',
+    'long_line': 'x' * 2000,
+    'empty': '',
+    'leading_from': 'From the team\n.\n..\n',
+}
+
+SUBJECTS = {
+    'ascii': 'Partnership with Acme',
+    'long': 'A partnership proposal for Acme Corporation and every one of its subsidiaries ' * 3,
+    'unicode': 'Grüße aus München',
+    'long_unicode': 'Partnerschaft mit Müller & Söhne — ' * 6,
+    'padded': '  leading and trailing spaces  ',
+    'empty': '',
+}
+
+SENDER_NAMES = {
+    'ascii': 'Outreach Team',
+    'unicode': 'Zoë Ångström',
+    'long': 'The Partnerships and Business Development Team at Example Incorporated ' * 2,
+    'none': '',
+}
+
+
+@pytest.fixture
+def pinned_boundary(monkeypatch):
+    """Make build_message(...).as_string() use the builder's boundary instead of a random one"""
+    def make(builder):
+        monkeypatch.setattr(Generator, '_make_boundary', classmethod(lambda cls, text=None: builder.boundary))
+        return builder
+    return make
+
+
+def expected(config, to_email, subject, body):
+    return _crlf(build_message(config, to_email, subject, body).as_string()).encode('ascii')
+
+
+@pytest.mark.parametrize('body', BODIES.values(), ids=BODIES.keys())
+def test_body_matches_build_message(pinned_boundary, body):
+    builder = pinned_boundary(MessageBuilder(CONFIG))
+    assert builder.build('to@example.com', 'Hello', body) == expected(CONFIG, 'to@example.com', 'Hello', body)
+
+
+@pytest.mark.parametrize('subject', SUBJECTS.values(), ids=SUBJECTS.keys())
+@pytest.mark.parametrize('sender_name', SENDER_NAMES.values(), ids=SENDER_NAMES.keys())
+def test_headers_match_build_message(pinned_boundary, sender_name, subject):
+    config = dict(CONFIG, sender_name=sender_name)
+    builder = pinned_boundary(MessageBuilder(config))
+    body = BODIES['ascii']
+    assert builder.build('to@example.com', subject, body) == expected(config, 'to@example.com', subject, body)
+
+
+def test_ascii_body_containing_the_boundary_gets_a_new_one():
+    builder = MessageBuilder(CONFIG)
+    body = f"{BODIES['ascii']}--{builder.boundary}\n{builder.boundary}--\n"
+
+    random.seed(1)
+    data = builder.build('to@example.com', 'Hello', body)
+    random.seed(1)
+    assert data == expected(CONFIG, 'to@example.com', 'Hello', body)
+
+    message = message_from_bytes(data)
+    assert message.get_boundary() != builder.boundary
+    [part] = message.get_payload()
+    assert part.get_payload() == _crlf(body)
+
+
+def test_non_ascii_body_containing_the_boundary_keeps_it(pinned_boundary):
+    # The body is base64-encoded, so its text can never end the part
+    builder = pinned_boundary(MessageBuilder(CONFIG))
+    body = f"{BODIES['non_ascii']}--{builder.boundary}\n{builder.boundary}--\n"
+
+    data = builder.build('to@example.com', 'Hello', body)
+    assert data == expected(CONFIG, 'to@example.com', 'Hello', body)
+
+    message = message_from_bytes(data)
+    [part] = message.get_payload()
+    assert part.get_payload(decode=True).decode('utf-8') == body
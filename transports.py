@@ -0,0 +1,242 @@
+"""
+Transports - Pluggable delivery backends for EmailAutomation
+Selected with the `transport` config key:
+    smtp        Pooled SMTP sessions (default)
+    sendgrid    SendGrid API, with bulk batches (default when email_provider is 'sendgrid')
+    mbox        Append every message to a local mbox file (no network)
+    local_smtp  Full SMTP path against an in-process sink server (no network or credentials)
+Each backend's modules (smtp_pool, sendgrid_email, smtp_sink) are imported only when it is created.
+"""
+
+import base64
+import logging
+import random
+import re
+import sys
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.policy import compat32
+from typing import Dict, List, Optional, Tuple
+
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SINK_PATH = 'sink/outbox.mbox'
+LOCAL_SENDER = 'sender@localhost'  # Envelope sender for the local sinks when none is configured
+
+
+class TransportError(Exception):
+    """Raised when a transport is misconfigured or the backend refuses a message"""
+
+
+def build_message(config: Dict, to_email: str, subject: str, body: str) -> MIMEMultipart:
+    """The MIME message sent to one recipient"""
+    msg = MIMEMultipart()
+    sender_name = config.get('sender_name', '')
+    sender_email = config['sender_email']
+    msg['From'] = f"{sender_name} <{sender_email}>" if sender_name else sender_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+# The policy Message.as_string() generates with (no header folding), writing SMTP line endings
+_WIRE_POLICY = compat32.clone(linesep='\r\n', max_line_length=0)
+_NEWLINES = re.compile(r'\r\n|\r|\n')
+# Header values that need no encoding are written as they are
+_PLAIN_HEADER = re.compile(r'[ -~]*')
+
+
+def _crlf(text: str) -> str:
+    return text.replace('\n', '\r\n') if '\r' not in text else _NEWLINES.sub('\r\n', text)
+
+
+def _header(name: str, value: str) -> str:
+    if _PLAIN_HEADER.fullmatch(value) and value.strip() == value:
+        return f"{name}: {value}\r\n"
+    return _WIRE_POLICY.fold(name, value)
+
+
+class MessageBuilder:
+    """
+    Wire-format bytes (CRLF line endings) of build_message(...).as_string() for one sender.
+    The sender headers and the multipart framing are prepared once; each message only formats To,
+    Subject and the body.
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        sender_name = config.get('sender_name', '')
+        sender_email = config['sender_email']
+        # Same format as the email package's own boundaries; a body that contains it falls back to build_message
+        self.boundary = '=' * 15 + f'{random.randrange(sys.maxsize):0{len(repr(sys.maxsize - 1))}d}' + '=='
+        self._head = (f'Content-Type: multipart/mixed; boundary="{self.boundary}"\r\n'
+                      'MIME-Version: 1.0\r\n'
+                      + _header('From', f"{sender_name} <{sender_email}>" if sender_name else sender_email))
+        part = f'\r\n--{self.boundary}\r\nContent-Type: text/plain; charset="%s"\r\nMIME-Version: 1.0\r\n' \
+               'Content-Transfer-Encoding: %s\r\n\r\n'
+        self._ascii_part = part % ('us-ascii', '7bit')
+        self._utf8_part = part % ('utf-8', 'base64')
+        self._tail = f'\r\n--{self.boundary}--\r\n'
+
+    def build(self, to_email: str, subject: str, body: str) -> bytes:
+        if body.isascii():
+            if self.boundary in body:
+                return _crlf(build_message(self.config, to_email, subject, body).as_string()).encode('ascii')
+            part, payload = self._ascii_part, _crlf(body)
+        else:
+            part, payload = self._utf8_part, _crlf(base64.encodebytes(body.encode('utf-8')).decode('ascii'))
+        return ''.join((self._head, _header('To', to_email), _header('Subject', subject),
+                        part, payload, self._tail)).encode('ascii')
+
+
+class Transport:
+    """Delivers personalized messages. send() raises on failure."""
+
+    name = 'base'
+    batch_size = 0  # Recipients per send_batch() call; 0 = one message at a time only
+
+    def __init__(self, config: Dict):
+        self.config = config
+
+    def send(self, to_email: str, subject: str, body: str):
+        raise NotImplementedError
+
+    def send_batch(self, recipients: List[Tuple[str, Dict[str, str]]], subject: str, body: str) -> List[bool]:
+        """Send subject/body templates to many recipients, each with its own substitutions"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        return {}
+
+    def close(self):
+        pass
+
+
+class SMTPTransport(Transport):
+    name = 'smtp'
+
+    def __init__(self, config: Dict, require_login: bool = True):
+        super().__init__(config)
+        if not config.get('sender_email'):
+            raise TransportError("Missing sender_email in config")
+        if require_login and not config.get('sender_password'):
+            raise TransportError("Missing sender_password in config")
+        from smtp_pool import get_pool
+        self.pool = get_pool(config)
+        self.builder = MessageBuilder(config)
+
+    def send(self, to_email: str, subject: str, body: str):
+        with time_stage('mime'):
+            data = self.builder.build(to_email, subject, body)
+        with time_stage('smtp_send'):
+            self.pool.sendmail(self.config['sender_email'], to_email, data)
+
+    def get_stats(self) -> Dict:
+        return self.pool.get_stats()
+
+    def close(self):
+        self.pool.close()
+
+
+class SendGridTransport(Transport):
+    name = 'sendgrid'
+
+    def __init__(self, config: Dict):
+        super().__init__(config)
+        if not config.get('sendgrid_api_key') or not config.get('sender_email'):
+            raise TransportError("Missing sendgrid_api_key or sender_email in config")
+        # Imported here so the sendgrid package is only needed when it is used
+        from sendgrid_email import MAX_PERSONALIZATIONS, SendGridEmailSender
+        self.sender = SendGridEmailSender(config['sendgrid_api_key'], config['sender_email'], config.get('sender_name'))
+        self.batch_size = max(1, min(int(config.get('sendgrid_batch_size', MAX_PERSONALIZATIONS)), MAX_PERSONALIZATIONS))
+
+    def send(self, to_email: str, subject: str, body: str):
+        if not self.sender.send_email(to_email, subject, body):
+            raise TransportError(f"SendGrid did not accept the message to {to_email}")
+
+    def send_batch(self, recipients: List[Tuple[str, Dict[str, str]]], subject: str, body: str) -> List[bool]:
+        return self.sender.send_batch(recipients, subject, body)
+
+
+class MboxTransport(Transport):
+    name = 'mbox'
+
+    def __init__(self, config: Dict):
+        super().__init__(dict(config, sender_email=config.get('sender_email') or LOCAL_SENDER))
+        from smtp_sink import MboxWriter
+        self.writer = MboxWriter(config.get('sink_path') or DEFAULT_SINK_PATH)
+        self.builder = MessageBuilder(self.config)
+
+    def send(self, to_email: str, subject: str, body: str):
+        with time_stage('mime'):
+            data = self.builder.build(to_email, subject, body)
+        with time_stage('mbox_write'):
+            self.writer.write(self.config.get('sender_email', ''), data)
+
+    def get_stats(self) -> Dict:
+        return {'messages_written': self.writer.count, 'path': self.writer.path}
+
+    def close(self):
+        self.writer.close()
+
+
+_local_sink = None
+_local_sink_lock = threading.Lock()
+
+
+def get_local_sink(mbox_path: Optional[str]):
+    """The process-wide in-process SMTP sink (started on first use)"""
+    global _local_sink
+    with _local_sink_lock:
+        if _local_sink is None:
+            from smtp_sink import SMTPSink
+
+            _local_sink = SMTPSink(mbox_path=mbox_path).start()
+        return _local_sink
+
+
+class LocalSMTPTransport(SMTPTransport):
+    name = 'local_smtp'
+
+    def __init__(self, config: Dict):
+        self.sink = get_local_sink(config.get('sink_path') or DEFAULT_SINK_PATH)
+        config = dict(config, smtp_server=self.sink.host, smtp_port=self.sink.port, smtp_use_tls=False,
+                      sender_password=None, sender_email=config.get('sender_email') or LOCAL_SENDER)
+        super().__init__(config, require_login=False)
+
+    def get_stats(self) -> Dict:
+        return dict(super().get_stats(), sink=self.sink.get_stats())
+
+
+TRANSPORTS = {
+    'smtp': SMTPTransport,
+    'sendgrid': SendGridTransport,
+    'mbox': MboxTransport,
+    'local_smtp': LocalSMTPTransport,
+}
+
+
+def transport_name(config: Dict) -> str:
+    """Configured transport, defaulting to the one that matches email_provider"""
+    name = config.get('transport')
+    if name:
+        return name
+    return 'sendgrid' if config.get('email_provider') == 'sendgrid' else 'smtp'
+
+
+def create_transport(config: Dict) -> Transport:
+    """
+    Build the transport selected in config
+
+    Raises:
+        TransportError: for an unknown transport or missing settings
+    """
+    name = transport_name(config)
+    transport_class = TRANSPORTS.get(name)
+    if transport_class is None:
+        raise TransportError(f"Unknown transport '{name}'. Available: {', '.join(TRANSPORTS)}")
+    return transport_class(config)
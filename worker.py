@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Campaign Worker - Runs queued campaigns outside the web server
+Leases campaigns from the database (no external broker needed) and runs a limited number at once.
+A separate thread parses uploaded recipient lists, so campaigns waiting for a list never hold up its parsing.
+
+Usage:
+    python -m worker                  # uses WORKER_CONCURRENCY (default 2)
+    python -m worker --concurrency 4
+    python -m worker --metrics-port 9101  # Prometheus metrics (WORKER_METRICS_PORT, 0 = off)
+    python -m worker --metrics-host 0.0.0.0  # Expose metrics beyond localhost (set METRICS_TOKEN too)
+
+On SIGTERM/SIGINT the worker stops leasing, lets running campaigns finish the sends already under way and
+write their progress, and hands them back to the queue; other workers resume them from their checkpoints.
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from app import (claim_next_campaign, claim_next_recipient_list, init_app, parse_recipient_list,
+                 release_campaign_leases, run_campaign)
+from metrics import start_http_server
+
+logger = logging.getLogger(__name__)
+
+
+class CampaignWorker:
+    """Polls the campaign queue and runs up to `concurrency` campaigns in parallel"""
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 2.0, shutdown_timeout: float = 30.0):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._stop = threading.Event()
+
+    def _run(self, campaign_id: int, resume: bool):
+        try:
+            run_campaign(campaign_id, resume=resume, stop=self._stop)
+        finally:
+            self._slots.release()
+
+    def _parse_lists(self):
+        """Parse uploaded recipient lists one at a time, outside the campaign slots"""
+        while not self._stop.is_set():
+            try:
+                list_id = claim_next_recipient_list(self.worker_id)
+            except Exception as e:
+                logger.error(f"❌ Failed to poll recipient list queue: {e}")
+                list_id = None
+            if list_id is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            logger.info(f"📄 Worker {self.worker_id} parsing recipient list {list_id}")
+            parse_recipient_list(list_id)
+
+    def stop(self, *_):
+        logger.info(f"🛑 Worker {self.worker_id} stopping")
+        self._stop.set()
+
+    def run_forever(self):
+        logger.info(f"👷 Worker {self.worker_id} started (concurrency {self.concurrency})")
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='campaign')
+        threading.Thread(target=self._parse_lists, daemon=True, name='list-parser').start()
+        running = set()
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                job = claim_next_campaign(self.worker_id)
+            except Exception as e:
+                logger.error(f"❌ Failed to poll campaign queue: {e}")
+                job = None
+            if job is None:
+                self._slots.release()
+                self._stop.wait(self.poll_interval)
+                continue
+            campaign_id, resume = job
+            logger.info(f"📤 Worker {self.worker_id} leased campaign {campaign_id}" + (" (resume)" if resume else ""))
+            running = {future for future in running if not future.done()}
+            running.add(executor.submit(self._run, campaign_id, resume))
+
+        # Campaigns see the stop flag: they finish in-flight sends, write their progress and hand themselves
+        # over. Don't wait for the whole campaign, and not forever for a stuck send either.
+        _, unfinished = wait(running, timeout=self.shutdown_timeout)
+        if unfinished:
+            logger.warning(f"⚠️ {len(unfinished)} campaign(s) did not stop within {self.shutdown_timeout:.0f}s; "
+                           f"their unwritten progress is lost")
+        release_campaign_leases(self.worker_id)
+        executor.shutdown(wait=False)
+        os._exit(0)
+
+
+def main():
+    """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Campaign worker')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('WORKER_CONCURRENCY', 2)),
+                        help='Campaigns to run at the same time')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between queue polls when idle')
+    parser.add_argument('--shutdown-timeout', type=float, default=float(os.environ.get('WORKER_SHUTDOWN_TIMEOUT', 30)),
+                        help='Seconds to wait on shutdown for running campaigns to finish in-flight sends')
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('WORKER_METRICS_PORT', 9101)),
+                        help='Serve Prometheus metrics on this port (0 = off)')
+    parser.add_argument('--metrics-host', default=os.environ.get('WORKER_METRICS_HOST', '127.0.0.1'),
+                        help='Address the metrics port listens on (scrapes must send METRICS_TOKEN when it is set)')
+    args = parser.parse_args()
+    # The single worker entrypoint applies migrations, in case the deploy has no release step
+    init_app(migrate_schema=True)
+    
+    if args.metrics_port:
+        start_http_server(args.metrics_port, host=args.metrics_host, token=os.environ.get('METRICS_TOKEN'))
+
+    worker = CampaignWorker(concurrency=args.concurrency, poll_interval=args.poll_interval,
+                            shutdown_timeout=args.shutdown_timeout)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run_forever()
+
+
+if __name__ == '__main__':
+    main()